@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:39:45 krylon>
+#
+# /data/code/python/pythia/bench.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.bench
+
+(c) 2026 Benjamin Walkenhorst
+
+Benchmarks for the parts of Pythia where performance matters, run against a
+synthetic corpus. The corpus only depends on its parameters and the random
+seed, so results from different versions can be compared.
+
+Run it as python -m pythia.bench, the results are printed as JSON.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Final, Optional
+
+from pythia import common
+from pythia.crawler import Crawler
+from pythia.data import Blacklist, File, FileType, Folder
+from pythia.database import Database
+
+# All files get the same modification time, so the corpus is identical
+# every time.
+MTIME: Final[int] = int(datetime(2024, 2, 26).timestamp())
+
+SYLLABLES: Final[tuple[str, ...]] = (
+    "ka", "lo", "mi", "nu", "pe", "ra", "si", "to", "ve", "xo", "an", "el",
+    "in", "or", "us", "dra", "kel", "mon", "pyth", "zar", "ith", "ul", "bo",
+)
+
+# The directories with these names are created in the corpus, and skipped by
+# the Crawler.
+BLACKLISTED: Final[tuple[str, ...]] = (".git", "__pycache__", "node_modules")
+
+BLACKLIST_PATTERNS: Final[tuple[str, ...]] = (
+    "^[.]git$",
+    "^__pycache__$",
+    "^node_modules$",
+    "[.]o$",
+    "[.]pyc$",
+    "~$",
+    "^[.]#",
+    "^#.*#$",
+    "(?i)^thumbs[.]db$",
+    "^[.]cache$",
+)
+
+
+@dataclass(slots=True, kw_only=True)
+class CorpusSpec:  # pylint: disable-msg=R0902
+    """CorpusSpec describes the synthetic directory tree to generate."""
+
+    seed: int = 42
+    depth: int = 3
+    fanout: int = 4
+    files: int = 16
+    text: float = 0.6
+    pdf: float = 0.1
+    audio: float = 0.2
+    duplicates: float = 0.1
+    vocabulary: int = 2000
+    words: int = 400
+
+
+@dataclass(slots=True, kw_only=True)
+class CorpusStats:
+    """CorpusStats counts what ended up in a generated corpus."""
+
+    folders: int = 0
+    files: int = 0
+    blacklisted: int = 0
+    size: int = 0
+    kinds: dict[str, int] = field(default_factory=dict)
+
+
+class Corpus:
+    """Corpus generates a deterministic directory tree of text, PDF, and
+    audio files, some of them duplicates, plus directories that should be
+    blacklisted."""
+
+    __slots__ = [
+        "spec",
+        "rng",
+        "vocabulary",
+        "weights",
+        "texts",
+        "stats",
+    ]
+
+    spec: CorpusSpec
+    rng: random.Random
+    vocabulary: list[str]
+    weights: list[float]
+    texts: list[str]
+    stats: CorpusStats
+
+    def __init__(self, spec: CorpusSpec) -> None:
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        words: set[str] = set()
+        while len(words) < spec.vocabulary:
+            words.add("".join(self.rng.choice(SYLLABLES)
+                              for _ in range(self.rng.randint(2, 4))))
+        self.vocabulary = sorted(words)
+        self.rng.shuffle(self.vocabulary)
+        # Word frequencies in natural language roughly follow Zipf's law.
+        self.weights = [1.0 / (i + 1) for i in range(len(self.vocabulary))]
+        self.texts = []
+        self.stats = CorpusStats()
+
+    def sentence(self, n: int) -> str:
+        """Return n random words."""
+        return " ".join(self.rng.choices(self.vocabulary, self.weights, k=n))
+
+    def generate(self, root: str) -> CorpusStats:
+        """Create the corpus in the directory root."""
+        self.__tree(root, self.spec.depth)
+        return self.stats
+
+    def __tree(self, folder: str, depth: int) -> None:
+        os.makedirs(folder, exist_ok=True)
+        self.stats.folders += 1
+        for i in range(self.spec.files):
+            self.__file(folder, i)
+        if depth == self.spec.depth:
+            for name in BLACKLISTED:
+                junk = os.path.join(folder, name)
+                os.makedirs(junk, exist_ok=True)
+                for i in range(self.spec.files):
+                    self.__write(os.path.join(junk, f"junk{i:03d}.txt"),
+                                 self.sentence(50).encode("utf-8"))
+                    self.stats.blacklisted += 1
+        if depth > 0:
+            for i in range(self.spec.fanout):
+                self.__tree(os.path.join(folder, f"dir{depth}_{i:02d}"), depth - 1)
+
+    def __file(self, folder: str, i: int) -> None:
+        spec = self.spec
+        r: float = self.rng.random()
+        kind: str
+        if r < spec.duplicates and len(self.texts) > 0:
+            kind = "duplicate"
+            data = self.rng.choice(self.texts).encode("utf-8")
+            name = f"copy{i:03d}.txt"
+        elif r < spec.duplicates + spec.pdf:
+            kind = "pdf"
+            data = _pdf(self.sentence(8), self.sentence(spec.words))
+            name = f"doc{i:03d}.pdf"
+        elif r < spec.duplicates + spec.pdf + spec.audio:
+            kind = "audio"
+            data = _mp3(self.sentence(2), self.sentence(3), self.sentence(4), i + 1)
+            name = f"track{i:03d}.mp3"
+        elif r < spec.duplicates + spec.pdf + spec.audio + spec.text:
+            kind = "text"
+            text = "\n".join(self.sentence(20) for _ in range(spec.words // 20))
+            self.texts.append(text)
+            data = text.encode("utf-8")
+            name = f"note{i:03d}.txt"
+        else:
+            kind = "binary"
+            data = self.rng.randbytes(4096)
+            name = f"blob{i:03d}"
+        self.__write(os.path.join(folder, name), data)
+        self.stats.files += 1
+        self.stats.kinds[kind] = self.stats.kinds.get(kind, 0) + 1
+
+    def __write(self, path: str, data: bytes) -> None:
+        with open(path, "wb") as fh:
+            fh.write(data)
+        os.utime(path, (MTIME, MTIME))
+        self.stats.size += len(data)
+
+
+def _pdf(title: str, text: str) -> bytes:
+    """Build a minimal PDF document with one page of text."""
+    text = text.replace("\\", "").replace("(", "").replace(")", "")
+    stream = f"BT /F1 10 Tf 36 756 Td ({text}) Tj ET".encode("latin-1")
+    objects: list[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R " +
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        f"<< /Title ({title}) /Author (Pythia) >>".encode("latin-1"),
+    ]
+    out: bytes = b"%PDF-1.4\n"
+    offsets: list[int] = []
+    for num, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (num, obj)
+    xref: int = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R /Info 6 0 R >>\n" % (len(objects) + 1)
+    out += b"startxref\n%d\n%%%%EOF\n" % xref
+    return out
+
+
+def _mp3(artist: str, album: str, title: str, track: int) -> bytes:
+    """Build an ID3v2.3 tag, followed by a few bytes that look like MPEG
+    audio frames."""
+    frames: bytes = b""
+    for fid, val in (("TPE1", artist), ("TALB", album), ("TIT2", title), ("TRCK", str(track))):
+        body = b"\x00" + val.encode("latin-1")
+        frames += fid.encode() + struct.pack(">I", len(body)) + b"\0\0" + body
+    frames += b"\0" * 256
+    size = bytes(((len(frames) >> s) & 0x7f) for s in (21, 14, 7, 0))
+    return b"ID3\x03\x00\x00" + size + frames + (b"\xff\xfb\x90\x00" + b"\0" * 412) * 8
+
+
+def timed(fn: Callable[[], Any], repeat: int = 1) -> float:
+    """Run fn repeat times, return the best time in seconds."""
+    best: float = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+class Bench:
+    """Bench runs the benchmarks and collects the results."""
+
+    __slots__ = [
+        "spec",
+        "repeat",
+        "procs",
+        "workdir",
+        "corpus",
+        "stats",
+        "results",
+    ]
+
+    spec: CorpusSpec
+    repeat: int
+    procs: int
+    workdir: str
+    corpus: Corpus
+    stats: CorpusStats
+    results: dict[str, dict[str, Any]]
+
+    def __init__(self, spec: CorpusSpec, workdir: str, repeat: int = 3, procs: int = 0) -> None:
+        self.spec = spec
+        self.repeat = repeat
+        self.procs = procs
+        self.workdir = workdir
+        self.corpus = Corpus(spec)
+        self.stats = CorpusStats()
+        self.results = {}
+
+    def record(self, name: str, ops: int, seconds: float) -> None:
+        """Record the result of a benchmark."""
+        self.results[name] = {
+            "ops": ops,
+            "seconds": round(seconds, 6),
+            "us_per_op": round(seconds * 1e6 / max(ops, 1), 3),
+        }
+
+    def run(self, only: Optional[set[str]] = None) -> dict[str, Any]:
+        """Generate the corpus, and run all benchmarks, or those in only."""
+        tree = os.path.join(self.workdir, "corpus")
+        t0 = time.perf_counter()
+        self.stats = self.corpus.generate(tree)
+        self.record("generate", self.stats.files, time.perf_counter() - t0)
+
+        benchmarks: dict[str, Callable[[str], None]] = {
+            "crawl": self.bench_crawl,
+            "blacklist": self.bench_blacklist,
+            "database": self.bench_database,
+        }
+        # The workdir is removed once we are done, so we must not leave the
+        # base directory, and the log file, pointing there.
+        basedir: Final[str] = common.path.base()
+        common.set_basedir(os.path.join(self.workdir, "base"))
+        try:
+            for name, fn in benchmarks.items():
+                if only is None or name in only:
+                    fn(tree)
+        finally:
+            common.set_basedir(basedir)
+
+        return {
+            "timestamp": datetime.now().strftime(common.TIME_FMT),
+            "version": common.APP_VERSION,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "spec": asdict(self.spec),
+            "corpus": asdict(self.stats),
+            "results": self.results,
+        }
+
+    def bench_crawl(self, tree: str) -> None:
+        """Crawl the corpus twice: Once into an empty database, then again
+        with nothing changed."""
+        for name in ("crawl", "crawl_rescan"):
+            crawler = Crawler(tree, procs=self.procs)
+            crawler.blacklist = Blacklist(*BLACKLIST_PATTERNS)
+            t0 = time.perf_counter()
+            crawler.traverse()
+            crawler.wait()
+            self.record(name, self.stats.files, time.perf_counter() - t0)
+            crawler.pool.close()
+
+    def bench_blacklist(self, tree: str) -> None:
+        """Match all names in the corpus against the Blacklist."""
+        names: list[str] = []
+        for _, dirs, files in os.walk(tree):
+            names.extend(dirs)
+            names.extend(files)
+        bl = Blacklist(*BLACKLIST_PATTERNS)
+
+        def match() -> None:
+            for n in names:
+                bl.match(n)
+
+        self.record("blacklist_match", len(names), timed(match, self.repeat))
+
+    def bench_database(self, _tree: str) -> None:
+        """Add Files to a fresh database, one at a time and in bulk, then
+        look them up and search for them."""
+        rng = random.Random(self.spec.seed)
+        n: int = max(self.stats.files, 1000)
+        path = os.path.join(self.workdir, "bench.db")
+        db = Database(path)
+        folder = Folder(path="/bench")
+        with db:
+            db.folder_add(folder)
+
+        def files(prefix: str) -> list[File]:
+            return [File(f"/bench/{prefix}/file{i:06d}.txt",
+                         {"folder_id": folder.fid,
+                          "content_type": FileType.Text,
+                          "content": self.corpus.sentence(self.spec.words)})
+                    for i in range(n)]
+
+        single = files("single")
+        t0 = time.perf_counter()
+        for f in single:
+            with db:
+                db.file_add(f)
+        self.record("file_add", n, time.perf_counter() - t0)
+
+        bulk = files("bulk")
+        t0 = time.perf_counter()
+        with db:
+            db.file_add_many(bulk)
+        self.record("file_add_many", n, time.perf_counter() - t0)
+
+        paths = [f.path for f in rng.sample(single + bulk, min(n, 1000))]
+        self.record("file_get_by_path", len(paths),
+                    timed(lambda: [db.file_get_by_path(p) for p in paths], self.repeat))
+        self.record("file_get_stat_by_folder", 2 * n,
+                    timed(lambda: db.file_get_stat_by_folder(folder), self.repeat))
+
+        queries = [self.corpus.sentence(rng.randint(1, 2)) for _ in range(100)]
+        self.record("search", len(queries),
+                    timed(lambda: [db.search(q) for q in queries], self.repeat))
+        self.record("search_snippets", len(queries),
+                    timed(lambda: [db.search_snippets(q) for q in queries], self.repeat))
+        db.close()
+
+
+def main() -> None:
+    """Parse the command line and run the benchmarks."""
+    defaults = CorpusSpec()
+    argp = argparse.ArgumentParser(description="Run Pythia's benchmarks")
+    argp.add_argument("-s", "--seed", type=int, default=defaults.seed)
+    argp.add_argument("-d", "--depth", type=int, default=defaults.depth,
+                      help="Depth of the directory tree")
+    argp.add_argument("-f", "--fanout", type=int, default=defaults.fanout,
+                      help="Subdirectories per directory")
+    argp.add_argument("-n", "--files", type=int, default=defaults.files,
+                      help="Files per directory")
+    argp.add_argument("-r", "--repeat", type=int, default=3,
+                      help="How often to repeat the short benchmarks, the best run counts")
+    argp.add_argument("-p", "--procs", type=int, default=0,
+                      help="Number of Extractor processes for the crawl, default one per CPU")
+    argp.add_argument("-b", "--bench", action="append",
+                      choices=("crawl", "blacklist", "database"),
+                      help="Run only the given benchmark, may be given more than once")
+    argp.add_argument("-o", "--output", default="-",
+                      help="File to write the results to, default is stdout")
+    argp.add_argument("-k", "--keep", action="store_true",
+                      help="Do not delete the corpus and databases afterwards")
+    args = argp.parse_args()
+
+    spec = CorpusSpec(seed=args.seed, depth=args.depth, fanout=args.fanout, files=args.files)
+    workdir = tempfile.mkdtemp(prefix="pythia_bench_")
+    try:
+        bench = Bench(spec, workdir, args.repeat, args.procs)
+        report = bench.run(set(args.bench) if args.bench else None)
+    finally:
+        if args.keep:
+            print(f"Corpus and databases are in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
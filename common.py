@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-02-21 05:37:02 krylon>
+# Time-stamp: <2026-10-18 07:52:01 krylon>
 #
 # /data/code/python/pythia/common.py
 # created on 21. 02. 2024
@@ -17,17 +17,26 @@ pythia.common
 (c) 2024 Benjamin Walkenhorst
 """
 
+import atexit
 import logging
 import logging.handlers
 import os
-from typing import Final
+import sys
+import tomllib
+from queue import SimpleQueue
 from threading import Lock
+from typing import Any, Final, Optional
 
 APP_NAME: Final[str] = "Pythia"
 APP_VERSION: Final[str] = "0.0.1"
 DEBUG: Final[bool] = True
 TIME_FMT: Final[str] = "%Y-%m-%d %H:%M:%S"
 
+LOG_FORMAT: Final[str] = "%(asctime)s (%(name)-16s / line %(lineno)-4d) " + \
+    "- %(levelname)-8s %(message)s"
+MAX_LOG_SIZE: Final[int] = 256 * 2**20
+MAX_LOG_COUNT: Final[int] = 4
+
 
 class Path:
     """Holds the paths of folders and files used by the application"""
@@ -70,45 +79,237 @@ _cache: Final[dict[str, logging.Logger]] = {}  # pylint: disable-msg=C0103
 def set_basedir(folder: str) -> None:
     """Set the base dir to the speficied path."""
     path.base(folder)
+    with _lock:
+        if _backend.running():
+            # The log file and the settings live in the base directory.
+            _backend.stop()
+            _backend.start()
+            for name, log_obj in _cache.items():
+                log_obj.setLevel(_backend.level(name))
     init_app()
 
 
 def init_app() -> None:
-    """Initialize the application environment"""
-    print(f"Create base directory {path.base()}")
+    """Initialize the application environment: Create the base directory,
+    and turn on metrics and profiling if the settings file asks for them."""
+    _create_basedir()
+    # Both modules import this one, and they may log, so we cannot do this
+    # while the log backend is being set up.
+    from pythia import metrics, profiler  # pylint: disable-msg=C0415
+    metrics.configure()
+    profiler.configure()
+
+
+def _create_basedir() -> None:
     if not os.path.isdir(path.base()):
+        # The log file lives in the base directory, so we cannot log this.
+        # It goes to stderr, so it does not get mixed up with the output of
+        # scripts like the benchmarks.
+        print(f"Create base directory {path.base()}", file=sys.stderr)
         os.mkdir(path.base())
 
 
+def load_log_levels(config: str) -> tuple[int, dict[str, int]]:
+    """Read the log levels from the given configuration file.
+
+    The default level goes in the log table, levels for individual loggers
+    in log.levels, like so:
+
+    [log]
+    level = "INFO"
+
+    [log.levels]
+    crawler = "WARNING"
+    database = "DEBUG"
+
+    Returns the default level and the levels by logger name."""
+    default: int = logging.DEBUG if DEBUG else logging.INFO
+    levels: dict[str, int] = {}
+    try:
+        with open(config, "rb") as fh:
+            settings: dict[str, Any] = tomllib.load(fh)
+    except FileNotFoundError:
+        return default, levels
+    except (OSError, tomllib.TOMLDecodeError) as err:
+        print(f"Cannot read log levels from {config}: {err}", file=sys.stderr)
+        return default, levels
+
+    cfg: dict[str, Any] = settings.get("log", {})
+    if "level" in cfg:
+        default = _parse_level(cfg["level"], default)
+    for name, lvl in cfg.get("levels", {}).items():
+        levels[name] = _parse_level(lvl, default)
+    return default, levels
+
+
+def _parse_level(lvl: Any, default: int) -> int:
+    if isinstance(lvl, int):
+        return lvl
+    num = logging.getLevelName(str(lvl).upper())
+    if isinstance(num, int):
+        return num
+    print(f"Invalid log level {lvl!r}", file=sys.stderr)
+    return default
+
+
+class _Quiet(logging.Filter):  # pylint: disable-msg=R0903
+    """Marks records that should not go to the terminal."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.terminal = False
+        return True
+
+
+class _Terminal(logging.Filter):  # pylint: disable-msg=R0903
+    """Drops records that should not go to the terminal."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return getattr(record, "terminal", True)
+
+
+class LogBackend:
+    """LogBackend owns the handlers that actually write log messages.
+
+    Loggers only put their records in a queue, and a background thread takes
+    them from there and writes them to the log file and the terminal, so
+    logging never makes the caller wait for the disk or the terminal.
+
+    In a worker process, the background thread passes the records on to the
+    parent process instead, through remote, so only one process writes to the
+    log file."""
+
+    __slots__ = [
+        "queue",
+        "handlers",
+        "listener",
+        "default",
+        "levels",
+        "remote",
+    ]
+
+    queue: SimpleQueue
+    handlers: dict[bool, logging.Handler]
+    listener: Optional[logging.handlers.QueueListener]
+    default: int
+    levels: dict[str, int]
+    # A multiprocessing Queue, if the records go to another process.
+    remote: Any
+
+    def __init__(self) -> None:
+        self.queue = SimpleQueue()
+        self.handlers = {
+            True: logging.handlers.QueueHandler(self.queue),
+            False: logging.handlers.QueueHandler(self.queue),
+        }
+        self.handlers[False].addFilter(_Quiet())
+        self.listener = None
+        self.default = logging.DEBUG
+        self.levels = {}
+        self.remote = None
+
+    def running(self) -> bool:
+        """Return True if the background thread is running."""
+        return self.listener is not None
+
+    def start(self) -> None:
+        """Open the log file, load the log levels, and start the background
+        thread."""
+        _create_basedir()
+        self.default, self.levels = load_log_levels(path.config())
+        if self.remote is not None:
+            self.listener = logging.handlers.QueueListener(
+                self.queue,
+                logging.handlers.QueueHandler(self.remote))
+            self.listener.start()
+            return
+        fmt = logging.Formatter(LOG_FORMAT)
+        file_handler = logging.handlers.RotatingFileHandler(path.log(),
+                                                            'a',
+                                                            MAX_LOG_SIZE,
+                                                            MAX_LOG_COUNT)
+        file_handler.setFormatter(fmt)
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(fmt)
+        console_handler.addFilter(_Terminal())
+        self.listener = logging.handlers.QueueListener(self.queue,
+                                                       file_handler,
+                                                       console_handler,
+                                                       respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self) -> None:
+        """Write out all pending records, stop the background thread, and
+        close the log file."""
+        if self.listener is None:
+            return
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+        self.listener = None
+
+    def level(self, name: str) -> int:
+        """Return the log level for the logger with the given name."""
+        return self.levels.get(name, self.default)
+
+    def handler(self, terminal: bool) -> logging.Handler:
+        """Return the handler for loggers that do or do not want their
+        messages to show up on the terminal."""
+        return self.handlers[terminal]
+
+
+_backend: Final[LogBackend] = LogBackend()  # pylint: disable-msg=C0103
+
+
+@atexit.register
+def stop_logging() -> None:
+    """Write out all pending log records and stop the background thread.
+    This happens at exit, but worker processes do not run atexit handlers,
+    so they have to call it themselves."""
+    with _lock:
+        _backend.stop()
+
+
+def forward_logs(remote: Any) -> None:
+    """Send the log records of this process to another one, that receives
+    them with receive_logs. This is meant for worker processes, and it should
+    be called before they create their loggers."""
+    with _lock:
+        _backend.stop()
+        _backend.remote = remote
+        _backend.start()
+        for name, log_obj in _cache.items():
+            log_obj.setLevel(_backend.level(name))
+
+
+def receive_logs(remote: Any) -> logging.handlers.QueueListener:
+    """Start a thread that takes the log records other processes send with
+    forward_logs and writes them to our log. Stop the listener it returns
+    once those processes have finished."""
+    with _lock:
+        if not _backend.running():
+            _backend.start()
+    listener = logging.handlers.QueueListener(remote, _backend.handler(True))
+    listener.start()
+    return listener
+
+
 def get_logger(name: str, terminal: bool = True) -> logging.Logger:
     """Create and return a logger with the given name"""
-    with _lock:
-        init_app()
+    # Most of the time, the logger already exists, and we do not need to
+    # bother with the lock.
+    log_obj: Optional[logging.Logger] = _cache.get(name)
+    if log_obj is not None:
+        return log_obj
 
+    with _lock:
         if name in _cache:
             return _cache[name]
-
-        log_format = "%(asctime)s (%(name)-16s / line %(lineno)-4d) " + \
-            "- %(levelname)-8s %(message)s"
-        max_log_size = 256 * 2**20
-        max_log_count = 4
+        if not _backend.running():
+            _backend.start()
 
         log_obj = logging.getLogger(name)
-        log_obj.setLevel(logging.DEBUG)
-        log_file_handler = logging.handlers.RotatingFileHandler(path.log(),
-                                                                'a',
-                                                                max_log_size,
-                                                                max_log_count)
-
-        log_fmt = logging.Formatter(log_format)
-        log_file_handler.setFormatter(log_fmt)
-        log_obj.addHandler(log_file_handler)
-
-        if terminal:
-            log_console_handler = logging.StreamHandler()
-            log_console_handler.setFormatter(log_fmt)
-            log_console_handler.setLevel(logging.DEBUG)
-            log_obj.addHandler(log_console_handler)
+        log_obj.setLevel(_backend.level(name))
+        log_obj.addHandler(_backend.handler(terminal))
 
         _cache[name] = log_obj
         return log_obj
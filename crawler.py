@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-02-24 18:40:00 krylon>
+# Time-stamp: <2026-10-18 07:53:10 krylon>
 #
 # /data/code/python/pythia/crawler.py
 # created on 22. 02. 2024
@@ -19,92 +19,646 @@ pythia.crawler
 
 import logging
 import os
+import sqlite3
+import time
 from datetime import datetime
-from queue import SimpleQueue
+from queue import Empty, Queue
 from threading import Lock, Thread
+from typing import Final, Optional, Union
 
-from pythia import common, database
-from pythia.data import Blacklist, File, Folder
+from pythia import common, database, inspector, metrics, profiler, walker
+from pythia.data import Blacklist, Checkpoint, Failure, File, Folder
+from pythia.sandbox import Sandbox
 
+# The WriteBuffer flushes its contents to the database when it holds this many
+# Files, or when the last flush was at least this many seconds ago, whichever
+# comes first.
+FLUSH_COUNT: Final[int] = 1024
+FLUSH_INTERVAL: Final[float] = 0.5
 
-class Crawler:
-    """Crawler traverses directory trees and inspects files."""
+# The stages of the Crawler's pipeline are connected by bounded queues, so a
+# fast stage cannot run arbitrarily far ahead of a slow one.
+QUEUE_SIZE: Final[int] = 4096
+# How often the dispatcher checks for results while the Sandbox is busy.
+POLL_INTERVAL: Final[float] = 0.05
+# How many IDs of Files found on disk a walk collects before it sends them to
+# the database.
+SEEN_BATCH: Final[int] = 4096
+
+
+def unchanged(st: os.stat_result, prev: Optional[tuple[int, int, int]]) -> bool:
+    """Return True if a File has the same mtime and size as when it was last
+    scanned. prev is the File's ID and stat data from the database, see
+    Database.file_get_stat_by_paths, or None if the File is not there."""
+    if prev is None:
+        return False
+    _, mtime, size = prev
+    return int(st.st_mtime) == mtime and st.st_size == size
+
+
+class WriteBuffer:
+    """WriteBuffer collects new and modified Files and writes them to the
+    database in batches, one transaction per batch.
+
+    Checkpoints are written in the same transaction as the Files that were
+    found before them. When the final Checkpoint of a walk asks for it, Files
+    that have disappeared from disk are removed in that transaction, too, at
+    which point every File the walk found is in the database.
+
+    Shared Files refer to a blob that was there when they were inspected. If
+    it has been purged since, they are held back in orphans, to be run
+    through the Extractors again, rather than being written without their
+    text."""
+
+    __slots__ = [
+        "pool",
+        "log",
+        "added",
+        "updated",
+        "failures",
+        "checkpoints",
+        "orphans",
+        "max_count",
+        "max_delay",
+        "last_flush",
+        "written",
+        "deleted",
+        "flush_time",
+    ]
+
+    pool: database.DatabasePool
+    log: logging.Logger
+    added: list[File]
+    updated: list[File]
+    failures: list[Failure]
+    checkpoints: dict[int, Checkpoint]
+    orphans: list[File]
+    max_count: int
+    max_delay: float
+    last_flush: float
+    written: metrics.MetricHandle
+    deleted: metrics.MetricHandle
+    flush_time: metrics.MetricHandle
+
+    def __init__(self,
+                 pool: database.DatabasePool,
+                 max_count: int = FLUSH_COUNT,
+                 max_delay: float = FLUSH_INTERVAL) -> None:
+        self.pool = pool
+        self.log = common.get_logger("crawler")
+        self.added = []
+        self.updated = []
+        self.failures = []
+        self.checkpoints = {}
+        self.orphans = []
+        self.max_count = max_count
+        self.max_delay = max_delay
+        self.last_flush = time.monotonic()
+        self.written = metrics.registry.counter("pythia_files_written_total",
+                                                "Files written to the database")
+        self.deleted = metrics.registry.counter("pythia_files_deleted_total",
+                                                "Files removed from the database "
+                                                "because they are gone")
+        self.flush_time = metrics.registry.histogram("pythia_flush_seconds",
+                                                     "Time to write a batch of Files")
+
+    def add(self, f: File) -> None:
+        """Queue a new File to be added to the database."""
+        self.added.append(f)
+        self.__check()
+
+    def update(self, f: File) -> None:
+        """Queue a File that is already in the database to be updated."""
+        self.updated.append(f)
+        self.__check()
+
+    def put(self, f: File) -> None:
+        """Queue a File to be added or updated, depending on whether it
+        already has a database ID."""
+        if f.fid == 0:
+            self.add(f)
+        else:
+            self.update(f)
+
+    def fail(self, failure: Failure) -> None:
+        """Queue a Failure to be recorded in the database."""
+        self.failures.append(failure)
+        metrics.registry.counter("pythia_failures_total",
+                                 "Files that could not be processed",
+                                 kind=failure.kind.name).inc()
+        self.__check()
+
+    def checkpoint(self, cp: Checkpoint) -> None:
+        """Queue a Checkpoint to be saved, replacing any earlier one of the
+        same Folder that is still pending."""
+        self.checkpoints[cp.folder.fid] = cp
+
+    def __hold_orphans(self, db: database.Database) -> None:
+        """Move shared Files whose blob is missing to orphans."""
+        shared: set[str] = {f.hash for f in self.added if f.shared} | \
+            {f.hash for f in self.updated if f.shared}
+        if len(shared) == 0:
+            return
+        missing: set[str] = db.blob_get_missing(shared)
+        # Files in the same batch that carry the text bring their own blob.
+        missing -= {f.hash for f in self.added if not f.shared}
+        missing -= {f.hash for f in self.updated if not f.shared}
+        if len(missing) == 0:
+            return
+        for files in (self.added, self.updated):
+            self.orphans.extend(f for f in files if f.shared and f.hash in missing)
+            files[:] = [f for f in files if not (f.shared and f.hash in missing)]
+
+    def __check(self) -> None:
+        if len(self.added) + len(self.updated) + len(self.failures) >= self.max_count or \
+           time.monotonic() - self.last_flush >= self.max_delay:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all pending Files to the database."""
+        if len(self.added) > 0 or len(self.updated) > 0 or len(self.failures) > 0 or \
+           len(self.checkpoints) > 0:
+            try:
+                t0: float = time.perf_counter()
+                swept: list[tuple[Folder, int, int]] = []
+                with self.pool.writer() as db:
+                    self.__hold_orphans(db)
+                    db.file_add_many(self.added)
+                    db.file_update_many(self.updated)
+                    db.failure_add_many(self.failures)
+                    for cp in self.checkpoints.values():
+                        if len(cp.frontier) > 0:
+                            db.checkpoint_set(cp)
+                            continue
+                        db.checkpoint_delete(cp.folder)
+                        db.folder_update_scan(cp.folder, cp.timestamp)
+                        if cp.sweep is not None:
+                            cnt: int = db.file_delete_unseen(cp.folder, cp.sweep)
+                            if cnt > 0:
+                                swept.append((cp.folder, cnt, db.blob_purge()))
+                self.flush_time.observe(time.perf_counter() - t0)
+                self.written.inc(len(self.added) + len(self.updated))
+                for fldr, cnt, blobs in swept:
+                    self.deleted.inc(cnt)
+                    self.log.info("Removed %d deleted Files and %d unused blobs in %s",
+                                  cnt,
+                                  blobs,
+                                  fldr.path)
+            except sqlite3.Error as err:
+                self.log.error("Failed to write %d Files to the database: %s",
+                               len(self.added) + len(self.updated),
+                               err)
+            self.added.clear()
+            self.updated.clear()
+            self.failures.clear()
+            self.checkpoints.clear()
+        self.last_flush = time.monotonic()
+
+
+class CrawlMetrics:  # pylint: disable-msg=R0903
+    """CrawlMetrics holds the metrics the Crawler's walkers update."""
+
+    __slots__ = [
+        "queued",
+        "unchanged",
+    ]
+
+    queued: metrics.MetricHandle
+    unchanged: metrics.MetricHandle
+
+    def __init__(self) -> None:
+        reg = metrics.registry
+        self.queued = reg.counter("pythia_files_queued_total",
+                                  "New or changed Files queued for processing")
+        self.unchanged = reg.counter("pythia_files_unchanged_total",
+                                     "Files skipped because they did not change")
+
+
+class Crawler:  # pylint: disable-msg=R0902
+    """Crawler traverses directory trees and inspects files.
+
+    The work is done by a pipeline of three stages: A Walker per directory
+    tree, with several threads, puts new and changed Files into fileq. The dispatcher thread
+    hands them to the Sandbox, whose worker processes run the Extractors, and
+    passes the results on to resultq. The writer thread takes them from there and writes
+    them to the database in batches.
+
+    The pipeline shuts down once all producers - the walkers, and whoever
+    called start() - are done.
+
+    Every so often, the walkers send a Checkpoint down the pipeline along
+    with the Files. The dispatcher holds it back until all Files before it
+    are through the Sandbox, and the writer saves it together with them.
+    So a saved Checkpoint never claims more than what is in the database,
+    and an interrupted walk is resumed from the last one."""
 
     __slots__ = [
         "log",
-        "db",
+        "pool",
         "blacklist",
         "folders",
         "fileq",
+        "resultq",
         "lock",
         "active",
         "workers",
+        "producers",
+        "external",
+        "procs",
+        "walk_threads",
+        "dispatcher",
+        "writer",
+        "stats",
     ]
 
     log: logging.Logger
-    db: database.Database
+    pool: database.DatabasePool
     blacklist: Blacklist
     folders: list[str]
-    fileq: SimpleQueue
+    fileq: Queue
+    resultq: Queue
     lock: Lock
     active: bool
     workers: list[Thread]
+    producers: int
+    external: bool
+    procs: int
+    walk_threads: int
+    dispatcher: Optional[Thread]
+    writer: Optional[Thread]
+    stats: CrawlMetrics
+
+    def __init__(self,
+                 *folders: str,
+                 procs: int = 0,
+                 walk_threads: int = walker.WALK_THREADS) -> None:
+        """Create a Crawler for the given directory trees.
 
-    def __init__(self, *folders: str) -> None:
+        procs is the number of processes to run Extractors in, the default is
+        to use one per CPU. walk_threads is the number of threads that walk
+        each tree."""
         self.log = common.get_logger("crawler")
-        self.db = database.Database()
+        self.pool = database.DatabasePool()
+        self.blacklist = Blacklist()
         self.folders = list(folders)
-        self.fileq = SimpleQueue()
+        self.fileq = Queue(QUEUE_SIZE)
+        self.resultq = Queue(QUEUE_SIZE)
         self.lock = Lock()
         self.active = False
         self.workers = []
+        self.producers = 0
+        self.external = False
+        self.procs = procs if procs > 0 else (os.cpu_count() or 1)
+        self.walk_threads = walk_threads
+        self.dispatcher = None
+        self.writer = None
+        self.stats = CrawlMetrics()
+        metrics.registry.gauge("pythia_queue_depth",
+                               "Files waiting in the Crawler's queues",
+                               self.fileq.qsize,
+                               queue="files")
+        metrics.registry.gauge("pythia_queue_depth",
+                               "Files waiting in the Crawler's queues",
+                               self.resultq.qsize,
+                               queue="results")
 
     def is_active(self) -> bool:
         """Returns the Crawler's active flag."""
         with self.lock:
             return self.active
 
+    def is_walking(self) -> bool:
+        """Returns True if a walk of the directory trees is in progress."""
+        with self.lock:
+            return any(w.is_alive() for w in self.workers)
+
     def stop(self) -> None:
-        """Tell the Crawler to stop."""
+        """Tell the Crawler to stop, and wait for it to shut down.
+
+        The walkers stop at the next directory, Files that are queued but not
+        yet processed are dropped, but anything that has already been handed
+        to an Extractor is still written to the database."""
         with self.lock:
             self.active = False
+            external: bool = self.external
+            self.external = False
+        if external:
+            self.__producer_done()
+        self.wait()
+
+    def drain(self) -> None:
+        """Tell the Crawler that no more Files will be handed to enqueue(),
+        and wait until all Files in the pipeline are written to the database.
+
+        Unlike stop(), this lets walks in progress finish."""
+        with self.lock:
+            external: bool = self.external
+            self.external = False
+        if external:
+            self.__producer_done()
+        self.wait()
+
+    def wait(self) -> None:
+        """Wait for the Crawler to finish.
+
+        If the pipeline was started with start(), this does not return before
+        stop() or drain() is called."""
+        for worker in self.workers:
+            worker.join()
+        if self.dispatcher is not None:
+            self.dispatcher.join()
+        if self.writer is not None:
+            self.writer.join()
+
+    def start(self) -> None:
+        """Start the pipeline without walking any directory trees, so Files
+        can be handed to enqueue(). It keeps running until stop() is called."""
+        with self.lock:
+            if self.external:
+                return
+            self.external = True
+        self.__open(1)
+
+    def enqueue(self, f: File) -> None:
+        """Hand a File to the pipeline to be processed and written to the
+        database. Blocks if the pipeline is backed up."""
+        self.fileq.put(f)
 
     def traverse(self) -> None:
         """Start walking the directory tree(s)."""
+        # We register ourselves as a producer until all walkers are started,
+        # so the pipeline does not shut down prematurely.
+        self.__open(len(self.folders) + 1)
         with self.lock:
-            self.active = True
             for tree in self.folders:
                 worker: Thread = Thread(target=self.__worker, args=(tree, ))
                 worker.start()
                 self.workers.append(worker)
+        self.__producer_done()
+
+    def __open(self, producers: int) -> None:
+        """Register producers with the pipeline, starting it if necessary."""
+        with self.lock:
+            running: bool = self.producers > 0
+        if not running:
+            # A previous run might still be draining.
+            if self.dispatcher is not None:
+                self.dispatcher.join()
+            if self.writer is not None:
+                self.writer.join()
+        with self.lock:
+            self.active = True
+            self.producers += producers
+            if not running:
+                self.writer = Thread(target=self.__writer, name="writer")
+                self.writer.start()
+                self.dispatcher = Thread(target=self.__dispatch, name="dispatcher")
+                self.dispatcher.start()
+
+    def __producer_done(self) -> None:
+        """Called by each producer when it is done. When the last one
+        finishes, signal the dispatcher that no more Files will be coming."""
+        with self.lock:
+            self.producers -= 1
+            last: bool = self.producers == 0
+        if last:
+            self.fileq.put(None)
+
+    def __dispatch(self) -> None:
+        """Hand Files from the walkers to the Sandbox, and pass the results
+        on to the writer."""
+        box: Final[Sandbox] = Sandbox(self.procs)
+        try:
+            while True:
+                if box.idle() == 0:
+                    self.__collect(box.collect(FLUSH_INTERVAL))
+                    continue
+
+                try:
+                    f: Union[File, Checkpoint, None] = \
+                        self.fileq.get(timeout=POLL_INTERVAL if box.busy() > 0 else FLUSH_INTERVAL)
+                except Empty:
+                    self.__collect(box.collect(0))
+                    continue
+
+                if f is None:
+                    break
+                if not self.is_active():
+                    # Files that are dropped here must not be covered by a
+                    # Checkpoint, so we drop those, too.
+                    continue
+                if isinstance(f, Checkpoint):
+                    while box.busy() > 0:
+                        self.__collect(box.collect(FLUSH_INTERVAL))
+                    self.resultq.put(f)
+                    continue
+                ex = inspector.registry.lookup(f)
+                if ex is None:
+                    # Nothing to extract, no need to bother the Sandbox.
+                    self.resultq.put(f)
+                    continue
+                box.submit(f, ex.__name__)
+
+            while box.busy() > 0:
+                self.__collect(box.collect(FLUSH_INTERVAL))
+        finally:
+            box.close()
+            self.resultq.put(None)
+
+    def __collect(self, results: list[tuple[File, Optional[Failure]]]) -> None:
+        """Pass the results of finished extractions on to the writer."""
+        for f, failure in results:
+            self.resultq.put(f)
+            if failure is not None:
+                self.resultq.put(failure)
+
+    def __writer(self) -> None:
+        """Write processed Files to the database, in batches."""
+        buf: WriteBuffer = WriteBuffer(self.pool)
+        while True:
+            try:
+                item: Union[File, Failure, Checkpoint, None] = \
+                    self.resultq.get(timeout=buf.max_delay)
+            except Empty:
+                buf.flush()
+                continue
+            if item is None:
+                break
+            if isinstance(item, Failure):
+                buf.fail(item)
+            elif isinstance(item, Checkpoint):
+                buf.checkpoint(item)
+            else:
+                buf.put(item)
+            if len(buf.orphans) > 0:
+                self.__reextract(buf)
+        buf.flush()
+        while len(buf.orphans) > 0:
+            self.__reextract(buf)
+            buf.flush()
+
+        prof = profiler.active
+        if prof is not None:
+            try:
+                with self.pool.writer() as db:
+                    db.profile_add_many(prof.report(database.QUERY_TEXT))
+            except sqlite3.Error as err:
+                self.log.error("Failed to save the profiling report: %s", err)
+
+    def __reextract(self, buf: WriteBuffer) -> None:
+        """Run the WriteBuffer's orphans through the Extractors again, and
+        hand the results back to it.
+
+        This is rare enough that the writer can do it by itself, in a
+        Sandbox of its own, rather than sending the Files back upstream."""
+        files: list[File] = buf.orphans[:]
+        buf.orphans.clear()
+        self.log.info("Extract %d Files again, their content is no longer in the database",
+                      len(files))
+        box: Final[Sandbox] = Sandbox(1)
+        try:
+            while len(files) > 0 or box.busy() > 0:
+                if len(files) > 0 and box.idle() > 0:
+                    f: File = files.pop()
+                    ex = inspector.registry.lookup(f)
+                    box.submit(f, ex.__name__ if ex is not None else "")
+                    continue
+                for f, failure in box.collect(FLUSH_INTERVAL):
+                    buf.put(f)
+                    if failure is not None:
+                        buf.fail(failure)
+        finally:
+            box.close()
 
     def __worker(self, tree: str) -> None:
+        try:
+            self.__walk(tree)
+        except Exception as err:  # pylint: disable-msg=W0718
+            self.log.error("Error walking %s: %s - %s",
+                           tree,
+                           err.__class__.__name__,
+                           err)
+        finally:
+            self.pool.release()
+            self.__producer_done()
+
+    def __walk(self, tree: str) -> None:  # pylint: disable-msg=R0915
         self.log.debug("Process folder %s", tree)
-        db = database.Database()
+        db = self.pool.reader()
         fldr = db.folder_get_by_path(tree)
         if fldr is None:
             fldr = Folder(path=tree)
-            with db:
-                db.folder_add(fldr)
+            with self.pool.writer() as wdb:
+                wdb.folder_add(fldr)
+
+        start: Final[datetime] = datetime.now()
+        cp: Optional[Checkpoint] = db.checkpoint_get(fldr)
+        resume: list[str] = []
+        if cp is not None:
+            resume = cp.frontier
+            self.log.info("Resume walking %s from %d directories, as of %s",
+                          tree,
+                          len(resume),
+                          cp.timestamp.strftime(common.TIME_FMT))
 
-        for folder, subfolders, files in os.walk(tree):
+        # To tell which Files are gone once we are done, we mark the ones we
+        # find as seen, in batches. If we resume an earlier walk, we do not
+        # get to see the whole tree, so there is no point. The lock only
+        # guards seen, a full batch is swapped out and written without it, so
+        # the Walker's threads never wait for each other's database access.
+        lock: Final[Lock] = Lock()
+        seen: list[int] = []
+        sweep: bool = cp is None
+
+        def take_seen(force: bool) -> list[int]:
+            nonlocal seen
+            with lock:
+                if not sweep or len(seen) == 0 or (not force and len(seen) < SEEN_BATCH):
+                    return []
+                batch, seen = seen, []
+            return batch
+
+        def mark_seen(batch: list[int]) -> None:
+            nonlocal sweep
+            if len(batch) == 0:
+                return
+            try:
+                with self.pool.writer() as wdb:
+                    wdb.file_seen_add(fldr, batch)
+            except sqlite3.Error as err:
+                self.log.error("Failed to keep track of the Files in %s, "
+                               "not looking for deleted ones: %s",
+                               tree,
+                               err)
+                sweep = False
+
+        def visit(folder: str, files: list[walker.Entry]) -> None:
             self.log.debug("Process folder %s", folder)
-            subfolders[:] = [x for x in subfolders if not self.blacklist.match(x)]
-            for f in files:
-                if self.blacklist.match(f):
-                    continue
-                full_path = os.path.join(folder, f)
-                fob = db.file_get_by_path(full_path)
-                if fob is None:
-                    fob = File(
-                        full_path,
-                        {
-                            "folder_id": fldr.fid,
-                            "time_scanned": datetime.now(),
-                        }
-                    )
-                    with db:
-                        db.file_add(f)
+            if len(files) == 0:
+                return
+            # To tell if a File is new or has changed, we compare what we
+            # find on disk to the stat data we recorded the last time around,
+            # one directory at a time. That way, unchanged Files never need
+            # to be loaded from the database. Each of the Walker's threads
+            # uses its own reader.
+            known: dict[str, tuple[int, int, int]] = \
+                self.pool.reader().file_get_stat_by_paths(entry.path for entry, _ in files)
+            with lock:
+                seen.extend(fid for fid, _, _ in known.values())
+            mark_seen(take_seen(False))
+            for entry, st in files:
+                self.__check_file(entry, st, fldr, known.get(entry.path))
+
+        def checkpoint(frontier: list[str]) -> None:
+            self.fileq.put(Checkpoint(folder=fldr, frontier=frontier))
+
+        if sweep:
+            with self.pool.writer() as wdb:
+                wdb.file_seen_clear(fldr)
+        w = walker.Walker(self.blacklist, self.walk_threads, checkpoint)
+        w.walk(tree, visit, self.is_active, resume, self.pool.release)
+        # The Walker's threads count the Blacklist's hits separately.
+        self.blacklist.update_counts()
+        if not self.is_active():
+            return
+        mark_seen(take_seen(True))
+        if w.errors > 0 or cp is not None:
+            # If we did not see the whole tree, we cannot tell which Files
+            # are gone.
+            self.log.info("Not looking for deleted Files in %s, we did not see the whole tree",
+                          tree)
+            sweep = False
+        # An empty frontier tells the writer we are done. The writer removes
+        # the Files that are gone only once all Files in the pipeline ahead
+        # of it are written, so a File that was renamed is in the database
+        # under its new path before the old one is removed.
+        self.fileq.put(Checkpoint(folder=fldr, frontier=[], sweep=start if sweep else None))
+
+    def __check_file(self,
+                     entry: os.DirEntry,
+                     st: os.stat_result,
+                     fldr: Folder,
+                     prev: Optional[tuple[int, int, int]]) -> None:
+        """Queue a File for processing if it is new or has changed since
+        the last scan.
+
+        prev is the File's ID and stat data from the database, if it is
+        there."""
+        if unchanged(st, prev):
+            self.stats.unchanged.inc()
+            return
+
+        fob = File(
+            entry.path,
+            {
+                "folder_id": fldr.fid,
+                "time_scanned": datetime.now(),
+            }
+        )
+        fob.set_stat(st)
+        fob.fid = prev[0] if prev is not None else 0
+        self.stats.queued.inc()
+        self.fileq.put(fob)
 
 
 # Local Variables: #
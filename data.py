@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-02-27 15:03:54 krylon>
+# Time-stamp: <2026-10-18 07:44:43 krylon>
 #
 # /data/code/python/pythia/data.py
 # created on 21. 02. 2024
@@ -19,15 +19,15 @@ pythia.data
 This modules defines data types used throughout the application.
 """
 
-import json
+import hashlib
 import mimetypes
 import os
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum, auto
-from threading import Lock
-from typing import Any, Final, Union
+from threading import Lock, Thread, current_thread, local
+from typing import Any, Final, Optional, Protocol, Union
 
 
 class BlacklistItem:  # pylint: disable-msg=R0903
@@ -56,13 +56,89 @@ class BlacklistItem:  # pylint: disable-msg=R0903
         return True
 
 
-class Blacklist:  # pylint: disable-msg=R0903
-    """A sorted blacklist of patterns to match filenames against."""
+# Characters that have a special meaning in a regular expression. A pattern
+# that contains none of them (unescaped) is a plain string.
+_REGEX_SPECIAL: Final[str] = ".^$*+?{}[]()|\\"
+# Patterns with backreferences cannot be combined with others, because the
+# group numbers would change.
+_BACKREF_PAT: Final[re.Pattern] = re.compile(r"\\[1-9]|\(\?P=")
+
+
+def _parse_literal(src: str) -> Optional[tuple[str, bool, bool]]:
+    """Check if the regular expression src matches a fixed string, optionally
+    anchored at the start and/or the end.
+
+    If so, return the string and two flags indicating whether it is anchored
+    at the start and the end. Otherwise, return None."""
+    start: bool = src.startswith("^")
+    end: bool = False
+    if src.endswith("$"):
+        # Make sure the $ is not escaped.
+        backslashes: int = len(src) - 1 - len(src[:-1].rstrip("\\"))
+        end = backslashes % 2 == 0
+    body: str = src[(1 if start else 0):(len(src) - 1 if end else len(src))]
+    lit: list[str] = []
+    i: int = 0
+    while i < len(body):
+        c = body[i]
+        if c == "\\":
+            if i + 1 >= len(body) or body[i+1].isalnum():
+                return None
+            lit.append(body[i+1])
+            i += 2
+        elif c == "[":
+            # A character class with a single character, like [.]
+            if i + 2 >= len(body) or body[i+2] != "]" or body[i+1] in "^\\]":
+                return None
+            lit.append(body[i+1])
+            i += 3
+        elif c in _REGEX_SPECIAL:
+            return None
+        else:
+            lit.append(c)
+            i += 1
+    return "".join(lit), start, end
+
+
+class Blacklist:  # pylint: disable-msg=R0903,R0902
+    """A blacklist of patterns to match filenames against.
+
+    When the Blacklist is created, the patterns are compiled into a matcher:
+    Patterns that match a fixed string, a prefix, or a suffix are looked up in
+    hash tables, the other patterns are combined into a single regular
+    expression, so the path is only scanned once. Patterns that cannot be
+    combined (e.g. because they use flags or backreferences) are tried one
+    at a time.
 
-    __slots__ = ["patterns", "lock"]
+    Matching does not require a lock, each thread counts the hits of the
+    patterns separately. update_counts() adds them up, and folds the counts
+    of threads that have finished into the base counts."""
+
+    __slots__ = [
+        "patterns",
+        "lock",
+        "exact",
+        "prefixes",
+        "suffixes",
+        "combined",
+        "groups",
+        "rest",
+        "base_counts",
+        "tallies",
+        "local",
+    ]
 
     patterns: list[BlacklistItem]
     lock: Lock
+    exact: dict[str, int]
+    prefixes: list[tuple[int, dict[str, int]]]
+    suffixes: list[tuple[int, dict[str, int]]]
+    combined: Optional[re.Pattern]
+    groups: dict[str, int]
+    rest: list[tuple[int, re.Pattern]]
+    base_counts: list[int]
+    tallies: dict[Thread, list[int]]
+    local: local
 
     def __init__(self, *pat: Union[str, re.Pattern, BlacklistItem]) -> None:
         self.patterns = []
@@ -76,19 +152,114 @@ class Blacklist:  # pylint: disable-msg=R0903
                 assert isinstance(i, BlacklistItem)
                 self.patterns.append(i)
 
+        self.base_counts = [p.cnt for p in self.patterns]
+        self.tallies = {}
+        self.local = local()
+        self.__compile()
+
+    def __compile(self) -> None:  # pylint: disable-msg=R0912
+        """Build the matcher from the list of patterns."""
+        self.exact = {}
+        self.groups = {}
+        self.rest = []
+        prefixes: dict[int, dict[str, int]] = {}
+        suffixes: dict[int, dict[str, int]] = {}
+        alternatives: list[str] = []
+
+        for idx, item in enumerate(self.patterns):
+            src = item.pat.pattern
+            if not isinstance(src, str) or item.pat.flags != re.UNICODE:
+                self.rest.append((idx, item.pat))
+                continue
+
+            lit = _parse_literal(src)
+            if lit is not None and lit[0] != "" and (lit[1] or lit[2]):
+                s, start, end = lit
+                if start and end:
+                    table = self.exact
+                elif start:
+                    table = prefixes.setdefault(len(s), {})
+                else:
+                    table = suffixes.setdefault(len(s), {})
+                table.setdefault(s, idx)
+                continue
+
+            group: str = f"_bl{idx}"
+            alt: str = f"(?P<{group}>{src})"
+            if _BACKREF_PAT.search(src) is not None:
+                self.rest.append((idx, item.pat))
+                continue
+            try:
+                re.compile(alt)
+            except re.error:
+                self.rest.append((idx, item.pat))
+                continue
+            alternatives.append(alt)
+            self.groups[group] = idx
+
+        self.prefixes = sorted(prefixes.items())
+        self.suffixes = sorted(suffixes.items())
+        if len(alternatives) > 0:
+            self.combined = re.compile("|".join(alternatives))
+        else:
+            self.combined = None
+
+    def __find(self, path: str) -> int:
+        """Return the index of a pattern matching path, or -1 if there is
+        none."""
+        idx: Optional[int] = self.exact.get(path)
+        if idx is not None:
+            return idx
+        for length, table in self.suffixes:
+            idx = table.get(path[-length:])
+            if idx is not None:
+                return idx
+        for length, table in self.prefixes:
+            idx = table.get(path[:length])
+            if idx is not None:
+                return idx
+        if self.combined is not None:
+            m = self.combined.search(path)
+            if m is not None:
+                return self.groups[m.lastgroup]
+        for idx, pat in self.rest:
+            if pat.search(path) is not None:
+                return idx
+        return -1
+
+    def __tally(self) -> list[int]:
+        """Return the calling thread's hit counters."""
+        try:
+            return self.local.tally
+        except AttributeError:
+            tally: list[int] = [0] * len(self.patterns)
+            self.local.tally = tally
+            with self.lock:
+                self.tallies[current_thread()] = tally
+            return tally
+
     def match(self, path: str) -> bool:
         """Check if any of the patterns in the Blacklist match the given string."""
-        with self.lock:
-            for p in self.patterns:
-                if p.match(path):
-                    self.__sort()
-                    return True
+        idx = self.__find(path)
+        if idx < 0:
             return False
+        self.__tally()[idx] += 1
+        return True
+
+    def update_counts(self) -> None:
+        """Add up the hits counted by all threads and store the sum in the
+        BlacklistItems.
 
-    def __sort(self) -> None:
-        """Sort the BlacklistItems so that the items with the most hits move to the
-        front of the list."""
-        self.patterns.sort(key=lambda x: -x.cnt)
+        Threads that have finished do not count any more hits, so their
+        counts go into base_counts, and their tallies are dropped. Otherwise,
+        every Walker would leave its threads' tallies behind."""
+        with self.lock:
+            for t in [t for t in self.tallies if not t.is_alive()]:
+                for idx, cnt in enumerate(self.tallies.pop(t)):
+                    self.base_counts[idx] += cnt
+            for idx, item in enumerate(self.patterns):
+                item.cnt = self.base_counts[idx] + \
+                    sum(t[idx] for t in self.tallies.values())
 
 
 @dataclass(slots=True, kw_only=True)
@@ -117,6 +288,37 @@ class FileType(Enum):
 suffix_pat: Final[re.Pattern] = re.compile(r"[.](\w+)$")
 
 
+def _new_hash() -> Any:
+    """Create the hash object used to detect files with identical content.
+    We do not need a cryptographic hash, but BLAKE2 is about as fast as it
+    gets in the standard library, and 128 bits are plenty."""
+    return hashlib.blake2b(digest_size=16)
+
+
+class FileLoader(Protocol):  # pylint: disable-msg=R0903
+    """FileLoader is where a File loaded from the database gets its metadata
+    and text from, once they are needed. The Database is one."""
+
+    def file_get_meta(self, file_id: int) -> dict:
+        """Fetch the metadata of a File."""
+
+    def file_get_content(self, file_id: int) -> str:
+        """Fetch the text of a File."""
+
+
+@dataclass(slots=True, kw_only=True)
+class FileHeader:  # pylint: disable-msg=R0903
+    """FileHeader is a lightweight view of a File, for listing large numbers
+    of them, without their metadata and text."""
+
+    fid: int
+    folder_id: int
+    path: str
+    mtime: datetime
+    size: int
+    content_type: FileType
+
+
 class File:  # pylint: disable-msg=R0903,R0902
     """File represents a file and some metadata, plus any text we manage
     to extract from it."""
@@ -126,28 +328,43 @@ class File:  # pylint: disable-msg=R0903,R0902
         "folder_id",
         "path",
         "time_scanned",
+        "mtime",
+        "size",
+        "inode",
         "content_type",
         "mime_type",
-        "content",
-        "meta",
+        "_content",
+        "_meta",
+        "hash",
+        "shared",
+        "loader",
     ]
 
     fid: int
     folder_id: int
     path: str
     time_scanned: datetime
+    mtime: datetime
+    size: int
+    inode: int
     content_type: FileType
     mime_type: str
-    content: str
-    meta: dict
+    _content: Optional[str]
+    _meta: Optional[dict]
+    hash: str
+    shared: bool
+    loader: Optional[FileLoader]
 
     def __init__(self, path: str, fields: dict[str, Any]) -> None:
         self.fid = 0
         self.folder_id = fields.get("folder_id", 0)
         self.path = path
         self.time_scanned = fields.get("time_scanned", datetime.now())
+        self.mtime = fields.get("mtime", datetime.fromtimestamp(0))
+        self.size = fields.get("size", 0)
+        self.inode = fields.get("inode", 0)
         self.content_type = fields.get("content_type", FileType.Other)
-        self.meta = fields.get("meta", {})
+        self._meta = fields.get("meta", {})
         # self.mime_type = fields.get("mime_type", "application/octet-stream")
         if "mime_type" in fields:
             self.mime_type = fields["mime_type"]
@@ -157,7 +374,47 @@ class File:  # pylint: disable-msg=R0903,R0902
                 self.mime_type = "application/octet-stream"
             else:
                 self.mime_type = mt[0]
-        self.content = fields.get("content", "")
+        self._content = fields.get("content", "")
+        self.hash = fields.get("hash", "")
+        # A shared File's metadata and text were found in the database under
+        # its hash, so it does not carry the text around.
+        self.shared = fields.get("shared", False)
+        self.loader = None
+
+    @property
+    def meta(self) -> dict:
+        """The File's metadata. If the File was loaded from the database, it
+        is fetched on first access."""
+        if self._meta is None:
+            assert self.loader is not None
+            self._meta = self.loader.file_get_meta(self.fid)
+        return self._meta
+
+    @meta.setter
+    def meta(self, meta: dict) -> None:
+        self._meta = meta
+
+    @property
+    def content(self) -> str:
+        """The File's text. If the File was loaded from the database, it is
+        fetched on first access."""
+        if self._content is None:
+            assert self.loader is not None
+            self._content = self.loader.file_get_content(self.fid)
+        return self._content
+
+    @content.setter
+    def content(self, content: str) -> None:
+        self._content = content
+
+    def __getstate__(self) -> tuple[None, dict[str, Any]]:
+        # The loader cannot be pickled, so we load what we have not loaded
+        # yet before a File is sent to another process.
+        state = {slot: getattr(self, slot) for slot in self.__slots__}
+        state["_meta"] = self.meta
+        state["_content"] = self.content
+        state["loader"] = None
+        return (None, state)
 
     def suffix(self) -> str:
         """Return the filename's suffix, if it has one."""
@@ -167,25 +424,137 @@ class File:  # pylint: disable-msg=R0903,R0902
         return m[1].lower()
 
     @classmethod
-    def from_db(cls, row: tuple[Any, ...]) -> Any:
-        """Recreate a File object from a database record."""
+    def from_db(cls, row: tuple[Any, ...], loader: Optional[FileLoader] = None) -> Any:
+        """Recreate a File object from a database record.
+
+        The record does not include the metadata and the text, which can be
+        large. If a loader is given, they are fetched from it when they are
+        first accessed, otherwise they are left empty."""
         fields = {
             "folder_id": row[1],
             "time_scanned": datetime.fromtimestamp(row[3]),
-            "content_type": FileType(row[5]),
-            "mime_type": row[6],
-            "meta": json.loads(row[7]),
-            "content": row[8],
+            "mtime": datetime.fromtimestamp(row[4]),
+            "size": row[5],
+            "inode": row[6],
+            "content_type": FileType(row[7]),
+            "mime_type": row[8],
+            "hash": row[9] or "",
         }
         f: File = File(row[2], fields)
         f.fid = row[0]
+        if loader is not None:
+            f.loader = loader
+            f._meta = None  # pylint: disable-msg=W0212
+            f._content = None  # pylint: disable-msg=W0212
         return f
 
-    def needs_update(self) -> bool:
-        """Checks if the file needs to be scanned again."""
-        s = os.stat(self.path)
-        m = datetime.fromtimestamp(s.st_mtime)
-        return m > self.time_scanned
+    def set_stat(self, st: os.stat_result) -> None:
+        """Copy the modification time, size, and inode number from the
+        result of a stat call."""
+        self.mtime = datetime.fromtimestamp(int(st.st_mtime))
+        self.size = st.st_size
+        self.inode = st.st_ino
+
+    def compute_hash(self) -> str:
+        """Compute the hash of the file's content, store it in the File, and
+        return it. The file is read in chunks, not all at once."""
+        with open(self.path, "rb") as fh:
+            self.hash = hashlib.file_digest(fh, _new_hash).hexdigest()
+        return self.hash
+
+    def needs_update(self, st: Optional[os.stat_result] = None) -> bool:
+        """Checks if the file needs to be scanned again.
+
+        If the caller already has the result of stat'ing the file, it can pass
+        it in to save us a system call."""
+        if st is None:
+            st = os.stat(self.path)
+        return int(st.st_mtime) != int(self.mtime.timestamp()) or st.st_size != self.size
+
+
+class FailureKind(Enum):
+    """FailureKind identifies the ways in which extracting content from a
+    file can go wrong."""
+    Error = auto()
+    Timeout = auto()
+    Crash = auto()
+
+
+@dataclass(slots=True, kw_only=True)
+class Failure:  # pylint: disable-msg=R0903
+    """Failure records a file an Extractor could not process."""
+
+    path: str
+    kind: FailureKind
+    message: str = ""
+    timestamp: datetime = field(default_factory=datetime.now)
+
+
+@dataclass(slots=True, kw_only=True)
+class Checkpoint:  # pylint: disable-msg=R0903
+    """Checkpoint records how far the walk of a Folder has come, so an
+    interrupted crawl can pick up where it left off.
+
+    frontier holds the directories that have not been walked completely.
+    An empty frontier means the walk is finished. If the walk saw the whole
+    tree, sweep holds the time it started, Files of the Folder that were not
+    found and have not been scanned since then are gone from disk."""
+
+    folder: Folder
+    frontier: list[str]
+    timestamp: datetime = field(default_factory=datetime.now)
+    sweep: Optional[datetime] = None
+
+
+class ProfileKind(Enum):
+    """ProfileKind identifies what an entry in a profiling report is about."""
+    Extract = auto()
+    Query = auto()
+
+
+@dataclass(slots=True, kw_only=True)
+class ProfileEntry:  # pylint: disable-msg=R0903,R0902
+    """ProfileEntry is a line in a profiling report: A file that took long to
+    process, or a database query that took a lot of time overall.
+
+    For a query, seconds is the total time spent on all its calls, longest the
+    time of the slowest one. detail holds the Extractor or the SQL, and the
+    cProfile statistics, if they were captured."""
+
+    kind: ProfileKind
+    subject: str
+    seconds: float
+    calls: int = 1
+    longest: float = 0.0
+    detail: str = ""
+    run: datetime = field(default_factory=datetime.now)
+
+
+@dataclass(slots=True, kw_only=True)
+class Hit:  # pylint: disable-msg=R0903
+    """Hit is a search result: The path of a matching File, and an excerpt of
+    its content around the best match.
+
+    path_matches and matches hold the (start, end) offsets of the matching
+    terms in path and snippet, respectively."""
+
+    fid: int
+    path: str
+    snippet: str
+    rank: float
+    path_matches: list[tuple[int, int]] = field(default_factory=list)
+    matches: list[tuple[int, int]] = field(default_factory=list)
+
+
+@dataclass(slots=True, kw_only=True)
+class Page:  # pylint: disable-msg=R0903
+    """Page is a page of results for a query, see Database.find.
+
+    cursor is passed to find to get the next page. It is empty if this is
+    the last one."""
+
+    files: list[File]
+    cursor: str = ""
 
 # Local Variables: #
 # python-indent: 4 #
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-02-24 19:15:51 krylon>
+# Time-stamp: <2026-10-18 07:49:10 krylon>
 #
 # /data/code/python/pythia/database.py
 # created on 22. 02. 2024
@@ -19,19 +19,33 @@ pythia.database
 
 import json
 import logging
+import re
 import sqlite3
+import time
+import tomllib
+from contextlib import contextmanager
 from datetime import datetime
 from enum import Enum, auto
-from threading import Lock
-from typing import Final, Optional, Union
+from threading import Lock, RLock, local
+from typing import Any, Final, Iterable, Iterator, Optional, Sequence, Union
 
 import krylib
 
-from pythia import common
-from pythia.data import File, Folder
+from pythia import common, metrics, profiler
+from pythia.data import (Checkpoint, Failure, FailureKind, File, FileHeader,
+                         FileType, Folder, Hit, Page, ProfileEntry,
+                         ProfileKind)
+from pythia.query import Plan
 
 OPEN_LOCK: Final[Lock] = Lock()
 
+# Settings for the read-only connections handed out by a DatabasePool. Readers
+# get a large page cache and memory-mapped I/O, which helps with searches.
+READ_MMAP_SIZE: Final[int] = 256 * 2**20
+READ_CACHE_SIZE: Final[int] = -64 * 1024  # Negative values are in KiB
+# How many prepared statements each connection keeps around.
+STATEMENT_CACHE_SIZE: Final[int] = 128
+
 # NB We store the content_type Enum as an integer,
 # because converting between enums and integers
 # is trivial.
@@ -50,10 +64,14 @@ CREATE TABLE IF NOT EXISTS file (
     folder_id INTEGER NOT NULL,
     path TEXT UNIQUE NOT NULL,
     time_scanned INTEGER NOT NULL,
+    mtime INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL DEFAULT 0,
+    inode INTEGER NOT NULL DEFAULT 0,
     content_type INTEGER NOT NULL,
     mime_type TEXT NOT NULL,
     meta TEXT,
     content TEXT NOT NULL,
+    hash TEXT,
     FOREIGN KEY (folder_id) REFERENCES folder (id)
         ON UPDATE RESTRICT
         ON DELETE CASCADE,
@@ -63,8 +81,230 @@ CREATE TABLE IF NOT EXISTS file (
     "CREATE UNIQUE INDEX IF NOT EXISTS file_path_idx ON file (path)",
     "CREATE INDEX IF NOT EXISTS file_scan_time_idx ON file (time_scanned)",
     "CREATE INDEX IF NOT EXISTS file_type_idx ON file (content_type)",
+    # This index covers the query that loads the stat data of an entire
+    # folder, so a rescan does not have to touch the table itself.
+    """
+CREATE INDEX IF NOT EXISTS file_folder_stat_idx
+ON file (folder_id, path, mtime, size)
+    """,
+    "CREATE INDEX IF NOT EXISTS file_hash_idx ON file (hash)",
+    # Files with identical content share the extracted text and metadata,
+    # stored once in blob and keyed by the hash of the file's content.
+    """
+CREATE TABLE IF NOT EXISTS blob (
+    id INTEGER PRIMARY KEY,
+    hash TEXT UNIQUE NOT NULL,
+    meta TEXT,
+    content TEXT NOT NULL,
+    CHECK (meta = '' OR json_valid(meta))
+) STRICT
+    """,
+    # Files the Extractors choked on
+    """
+CREATE TABLE IF NOT EXISTS failure (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    kind INTEGER NOT NULL,
+    message TEXT NOT NULL
+) STRICT
+    """,
+    "CREATE INDEX IF NOT EXISTS failure_path_idx ON failure (path)",
+    "CREATE INDEX IF NOT EXISTS failure_time_idx ON failure (timestamp)",
+]
+
+# Profiling reports, see the profiler module.
+PROFILE_QUERIES: Final[list[str]] = [
+    """
+CREATE TABLE IF NOT EXISTS profile (
+    id INTEGER PRIMARY KEY,
+    run INTEGER NOT NULL,
+    kind INTEGER NOT NULL,
+    subject TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 1,
+    longest REAL NOT NULL DEFAULT 0,
+    detail TEXT NOT NULL DEFAULT ''
+) STRICT
+    """,
+    "CREATE INDEX IF NOT EXISTS profile_run_idx ON profile (run, kind, seconds)",
+]
+
+INIT_QUERIES.extend(PROFILE_QUERIES)
+
+# Where an interrupted walk of a Folder left off, see Crawler.
+CHECKPOINT_QUERIES: Final[list[str]] = [
+    """
+CREATE TABLE IF NOT EXISTS checkpoint (
+    folder_id INTEGER PRIMARY KEY,
+    timestamp INTEGER NOT NULL,
+    frontier TEXT NOT NULL,
+    FOREIGN KEY (folder_id) REFERENCES folder (id)
+        ON UPDATE RESTRICT
+        ON DELETE CASCADE,
+    CHECK (json_valid(frontier))
+) STRICT
+    """,
+]
+
+INIT_QUERIES.extend(CHECKPOINT_QUERIES)
+
+# Indexes for the filters of the query language, see the query module. The
+# index on mtime also gives us the order of results that do not come from
+# the full text index.
+FILTER_QUERIES: Final[list[str]] = [
+    "CREATE INDEX IF NOT EXISTS file_mime_idx ON file (mime_type)",
+    "CREATE INDEX IF NOT EXISTS file_mtime_idx ON file (mtime)",
+]
+
+INIT_QUERIES.extend(FILTER_QUERIES)
+
+# Metadata keys that get a column of their own, with an index, so looking up
+# Files by them does not mean parsing the metadata of every File. A column
+# takes its value from the first of its keys that is present: Audio files
+# call it "title", PDF documents "Title", and since SQLite does not care
+# about case in column names, they have to share one. See Database.promote.
+PROMOTED: Final[dict[str, list[str]]] = {
+    "artist": ["artist"],
+    "album": ["album"],
+    "title": ["title", "Title"],
+    "author": ["Author"],
+}
+PROMOTED_NAME_PAT: Final[re.Pattern] = re.compile(r"[a-z_][a-z0-9_]*")
+PROMOTED_KEY_PAT: Final[re.Pattern] = re.compile(r"\w+")
+
+PROMOTE_QUERIES: Final[list[str]] = [
+    """
+CREATE TABLE IF NOT EXISTS promoted (
+    name TEXT PRIMARY KEY,
+    keys TEXT NOT NULL,
+    CHECK (json_valid(keys))
+) STRICT
+    """,
+]
+
+INIT_QUERIES.extend(PROMOTE_QUERIES)
+
+# The full text index is an external content table, so the text is stored
+# only once. Its content comes from the view file_text, because the text of
+# a File is either in the file table itself or, if the File has a hash, in
+# the blob table. The triggers keep the index in sync with the file table.
+# For the ranking, a match in the path counts more than one in the metadata,
+# which in turn counts more than one in the content.
+FTS_QUERIES: Final[list[str]] = [
+    """
+CREATE VIEW IF NOT EXISTS file_text AS
+SELECT
+    f.id AS id,
+    f.path AS path,
+    f.meta AS meta,
+    COALESCE(b.content, f.content) AS content
+FROM file f
+LEFT OUTER JOIN blob b ON f.hash = b.hash
+    """,
+    """
+CREATE VIRTUAL TABLE IF NOT EXISTS file_fts USING fts5 (
+    path,
+    meta,
+    content,
+    content = 'file_text',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+    """,
+    """
+CREATE TRIGGER IF NOT EXISTS file_fts_ai AFTER INSERT ON file BEGIN
+    INSERT INTO file_fts (rowid, path, meta, content)
+    VALUES (new.id,
+            new.path,
+            new.meta,
+            COALESCE((SELECT content FROM blob WHERE hash = new.hash), new.content));
+END
+    """,
+    """
+CREATE TRIGGER IF NOT EXISTS file_fts_ad AFTER DELETE ON file BEGIN
+    INSERT INTO file_fts (file_fts, rowid, path, meta, content)
+    VALUES ('delete',
+            old.id,
+            old.path,
+            old.meta,
+            COALESCE((SELECT content FROM blob WHERE hash = old.hash), old.content));
+END
+    """,
+    """
+CREATE TRIGGER IF NOT EXISTS file_fts_au
+AFTER UPDATE OF path, meta, content, hash ON file BEGIN
+    INSERT INTO file_fts (file_fts, rowid, path, meta, content)
+    VALUES ('delete',
+            old.id,
+            old.path,
+            old.meta,
+            COALESCE((SELECT content FROM blob WHERE hash = old.hash), old.content));
+    INSERT INTO file_fts (rowid, path, meta, content)
+    VALUES (new.id,
+            new.path,
+            new.meta,
+            COALESCE((SELECT content FROM blob WHERE hash = new.hash), new.content));
+END
+    """,
+    "INSERT INTO file_fts (file_fts, rank) VALUES ('rank', 'bm25(10.0, 2.0, 1.0)')",
 ]
 
+INIT_QUERIES.extend(FTS_QUERIES)
+
+# MIGRATIONS holds the queries to bring a database created by an older
+# version up to date. The schema version is stored in PRAGMA user_version,
+# migrating from version n to n+1 runs the queries in MIGRATIONS[n].
+MIGRATIONS: Final[list[list[str]]] = [
+    # The first version of the full text index, superseded by version 3.
+    [],
+    [
+        "ALTER TABLE file ADD COLUMN mtime INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE file ADD COLUMN size INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE file ADD COLUMN inode INTEGER NOT NULL DEFAULT 0",
+        """
+CREATE INDEX IF NOT EXISTS file_folder_stat_idx
+ON file (folder_id, path, mtime, size)
+        """,
+    ],
+    [
+        "ALTER TABLE file ADD COLUMN hash TEXT",
+        "CREATE INDEX IF NOT EXISTS file_hash_idx ON file (hash)",
+        """
+CREATE TABLE IF NOT EXISTS blob (
+    id INTEGER PRIMARY KEY,
+    hash TEXT UNIQUE NOT NULL,
+    meta TEXT,
+    content TEXT NOT NULL,
+    CHECK (meta = '' OR json_valid(meta))
+) STRICT
+        """,
+        "DROP TRIGGER IF EXISTS file_fts_ai",
+        "DROP TRIGGER IF EXISTS file_fts_ad",
+        "DROP TRIGGER IF EXISTS file_fts_au",
+        "DROP TABLE IF EXISTS file_fts",
+    ] + FTS_QUERIES + ["INSERT INTO file_fts (file_fts) VALUES ('rebuild')"],
+    [
+        """
+CREATE TABLE IF NOT EXISTS failure (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    kind INTEGER NOT NULL,
+    message TEXT NOT NULL
+) STRICT
+        """,
+        "CREATE INDEX IF NOT EXISTS failure_path_idx ON failure (path)",
+        "CREATE INDEX IF NOT EXISTS failure_time_idx ON failure (timestamp)",
+    ],
+    PROFILE_QUERIES,
+    CHECKPOINT_QUERIES,
+    FILTER_QUERIES,
+    PROMOTE_QUERIES,
+]
+
+SCHEMA_VERSION: Final[int] = len(MIGRATIONS)
+
 
 class Query(Enum):
     """Symbolic constants to identify database queries"""
@@ -73,11 +313,42 @@ class Query(Enum):
     FolderGetByPath = auto()
     FolderGetAll = auto()
     FileAdd = auto()
+    FileAddMany = auto()
+    FileGetIDByPaths = auto()
     FileGetByPath = auto()
     FileGetByID = auto()
     FileGetByFolder = auto()
+    FileGetStatByFolder = auto()
+    FileGetStatByPaths = auto()
+    FileGetHeadersByFolder = auto()
+    FileGetMeta = auto()
+    FileGetContent = auto()
+    FileGetHashes = auto()
     FileUpdate = auto()
     FileDelete = auto()
+    FileDeleteByPath = auto()
+    FileDeleteByPrefix = auto()
+    FileDeleteUnseen = auto()
+    SeenCreate = auto()
+    SeenAdd = auto()
+    SeenClear = auto()
+    FileSearch = auto()
+    FileSnippets = auto()
+    BlobAdd = auto()
+    BlobGetMeta = auto()
+    BlobGetMissing = auto()
+    BlobPurge = auto()
+    BlobPurgeHashes = auto()
+    FailureAdd = auto()
+    FailureGetRecent = auto()
+    ProfileAdd = auto()
+    CheckpointSet = auto()
+    CheckpointGet = auto()
+    CheckpointDelete = auto()
+    ProfileGetRun = auto()
+    PromotedGetAll = auto()
+    PromotedAdd = auto()
+    PromotedDelete = auto()
 
 
 db_queries: Final[dict[Query, str]] = {
@@ -95,59 +366,443 @@ ORDER BY path
     """,
     Query.FileAdd: """
 INSERT INTO file
-    (folder_id, path, time_scanned, content_type, mime_type, meta, content)
-VALUES
-    (        ?,    ?,            ?,            ?,         ?,    ?,       ?)
+    (folder_id, path, time_scanned, mtime, size, inode,
+     content_type, mime_type, meta, content, hash)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
 RETURNING id
+    """,
+    # Different producers - e.g. the Crawler and the Watcher - might come
+    # across the same new file. Rather than failing the whole batch, the
+    # later one wins.
+    Query.FileAddMany: """
+INSERT INTO file
+    (folder_id, path, time_scanned, mtime, size, inode,
+     content_type, mime_type, meta, content, hash)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (path) DO UPDATE SET
+    time_scanned = excluded.time_scanned,
+    mtime = excluded.mtime,
+    size = excluded.size,
+    inode = excluded.inode,
+    content_type = excluded.content_type,
+    mime_type = excluded.mime_type,
+    meta = excluded.meta,
+    content = excluded.content,
+    hash = excluded.hash
+    """,
+    Query.FileGetIDByPaths: """
+SELECT
+    f.id,
+    f.path
+FROM json_each(?) p
+INNER JOIN file f ON f.path = p.value
     """,
     Query.FileGetByPath: """
 SELECT
-    id,
-    folder_id,
-    path,
-    time_scanned,
-    content_type,
-    mime_type,
-    meta,
-    content
-FROM file
-WHERE path = ?
+    f.id,
+    f.folder_id,
+    f.path,
+    f.time_scanned,
+    f.mtime,
+    f.size,
+    f.inode,
+    f.content_type,
+    f.mime_type,
+    f.hash
+FROM file f
+WHERE f.path = ?
     """,
     Query.FileGetByID: """
 SELECT
-    id,
-    folder_id,
+    f.id,
+    f.folder_id,
+    f.path,
+    f.time_scanned,
+    f.mtime,
+    f.size,
+    f.inode,
+    f.content_type,
+    f.mime_type,
+    f.hash
+FROM file f
+WHERE f.id = ?
+    """,
+    Query.FileGetStatByFolder: """
+SELECT
     path,
-    time_scanned,
-    content_type,
-    mime_type,
-    meta,
-    content
+    id,
+    mtime,
+    size
 FROM file
-WHERE id = ?
+WHERE folder_id = ?
     """,
-    Query.FileGetByFolder: """
+    Query.FileGetStatByPaths: """
+SELECT
+    f.path,
+    f.id,
+    f.mtime,
+    f.size
+FROM json_each(?) p
+INNER JOIN file f ON f.path = p.value
+    """,
+    Query.FileGetHeadersByFolder: """
 SELECT
     id,
     folder_id,
     path,
-    time_scanned,
-    content_type,
-    mime_type,
-    meta,
-    content
+    mtime,
+    size,
+    content_type
 FROM file
 WHERE folder_id = ?
 ORDER BY path
+    """,
+    Query.FileGetMeta: "SELECT meta FROM file WHERE id = ?",
+    Query.FileGetContent: """
+SELECT
+    COALESCE(b.content, f.content)
+FROM file f
+LEFT OUTER JOIN blob b ON f.hash = b.hash
+WHERE f.id = ?
+    """,
+    Query.FileGetHashes: """
+SELECT DISTINCT
+    hash
+FROM file
+WHERE id IN (SELECT value FROM json_each(?))
+  AND hash IS NOT NULL
+    """,
+    Query.FileGetByFolder: """
+SELECT
+    f.id,
+    f.folder_id,
+    f.path,
+    f.time_scanned,
+    f.mtime,
+    f.size,
+    f.inode,
+    f.content_type,
+    f.mime_type,
+    f.hash
+FROM file f
+WHERE f.folder_id = ?
+ORDER BY f.path
     """,
     Query.FileUpdate: """
 UPDATE file SET
-    time_scanned = ?, content_type = ?, mime_type = ?, meta = ?, content = ?
+    time_scanned = ?,
+    mtime = ?,
+    size = ?,
+    inode = ?,
+    content_type = ?,
+    mime_type = ?,
+    meta = ?,
+    content = ?,
+    hash = ?
 WHERE id = ?
     """,
     Query.FileDelete: "DELETE FROM file WHERE id = ?",
+    Query.FileDeleteByPath: "DELETE FROM file WHERE path = ?",
+    # We express "path starts with ?/" as a range, so SQLite can use the
+    # index on path. '0' is the character following '/'.
+    Query.FileDeleteByPrefix: "DELETE FROM file WHERE path > ? || '/' AND path < ? || '0'",
+    # Files of a Folder that were neither found by the walk that just
+    # finished, nor written since it started.
+    Query.FileDeleteUnseen: """
+DELETE FROM file
+WHERE folder_id = ?1
+  AND time_scanned < ?2
+  AND NOT EXISTS (SELECT 1 FROM seen s WHERE s.folder_id = ?1 AND s.file_id = file.id)
+    """,
+    # While a Folder is walked, the IDs of the Files found on disk are
+    # collected in seen, so we can tell which ones are gone. It is a
+    # temporary table, private to the writer connection.
+    Query.SeenCreate: """
+CREATE TEMP TABLE IF NOT EXISTS seen (
+    folder_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    PRIMARY KEY (folder_id, file_id)
+) WITHOUT ROWID
+    """,
+    Query.SeenAdd: """
+INSERT OR IGNORE INTO seen (folder_id, file_id) SELECT ?, value FROM json_each(?)
+    """,
+    Query.SeenClear: "DELETE FROM seen WHERE folder_id = ?",
+    Query.BlobAdd: """
+INSERT INTO blob (hash, meta, content) VALUES (?, ?, ?)
+ON CONFLICT (hash) DO NOTHING
+    """,
+    Query.BlobGetMeta: "SELECT meta FROM blob WHERE hash = ?",
+    Query.BlobGetMissing: """
+SELECT
+    h.value
+FROM json_each(?) h
+WHERE NOT EXISTS (SELECT 1 FROM blob b WHERE b.hash = h.value)
+    """,
+    Query.BlobPurge: """
+DELETE FROM blob
+WHERE NOT EXISTS (SELECT 1 FROM file WHERE file.hash = blob.hash)
+    """,
+    Query.BlobPurgeHashes: """
+DELETE FROM blob
+WHERE hash IN (SELECT value FROM json_each(?))
+  AND NOT EXISTS (SELECT 1 FROM file WHERE file.hash = blob.hash)
+    """,
+    Query.FailureAdd: """
+INSERT INTO failure (path, timestamp, kind, message) VALUES (?, ?, ?, ?)
+    """,
+    Query.FailureGetRecent: """
+SELECT
+    path,
+    timestamp,
+    kind,
+    message
+FROM failure
+ORDER BY timestamp DESC
+LIMIT ?
+    """,
+    Query.CheckpointSet: """
+INSERT INTO checkpoint (folder_id, timestamp, frontier) VALUES (?, ?, ?)
+ON CONFLICT (folder_id) DO UPDATE
+SET timestamp = excluded.timestamp,
+    frontier = excluded.frontier
+    """,
+    Query.CheckpointGet: "SELECT timestamp, frontier FROM checkpoint WHERE folder_id = ?",
+    Query.CheckpointDelete: "DELETE FROM checkpoint WHERE folder_id = ?",
+    Query.PromotedGetAll: "SELECT name, keys FROM promoted ORDER BY name",
+    Query.PromotedAdd: "INSERT INTO promoted (name, keys) VALUES (?, ?)",
+    Query.PromotedDelete: "DELETE FROM promoted WHERE name = ?",
+    Query.ProfileAdd: """
+INSERT INTO profile (run, kind, subject, seconds, calls, longest, detail)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+    """,
+    # Without a timestamp, we fetch the latest report.
+    Query.ProfileGetRun: """
+SELECT
+    run,
+    kind,
+    subject,
+    seconds,
+    calls,
+    longest,
+    detail
+FROM profile
+WHERE run = COALESCE(?, (SELECT MAX(run) FROM profile))
+ORDER BY kind, seconds DESC
+    """,
+    Query.FileSearch: """
+SELECT
+    f.id,
+    f.folder_id,
+    f.path,
+    f.time_scanned,
+    f.mtime,
+    f.size,
+    f.inode,
+    f.content_type,
+    f.mime_type,
+    f.hash
+FROM file_fts
+INNER JOIN file f ON file_fts.rowid = f.id
+WHERE file_fts MATCH ?
+ORDER BY rank
+LIMIT ? OFFSET ?
+    """,
+    Query.FileSnippets: """
+SELECT
+    rowid,
+    highlight(file_fts, 0, ?1, ?2),
+    snippet(file_fts, 2, ?1, ?2, ?3, ?4),
+    rank
+FROM file_fts
+WHERE file_fts MATCH ?5
+ORDER BY rank
+LIMIT ?6 OFFSET ?7
+    """,
 }
 
+# snippet() and highlight() mark the matching terms with these, we replace
+# them with offsets. Control characters do not occur in the text we index.
+MARK_START: Final[str] = "\x02"
+MARK_END: Final[str] = "\x03"
+ELLIPSIS: Final[str] = "…"
+# The size of a snippet in tokens. FTS5 does not allow more than 64.
+SNIPPET_SIZE: Final[int] = 24
+MAX_SNIPPET_SIZE: Final[int] = 64
+
+
+# For profiling, we identify the statements by the name of the Query.
+QUERY_NAMES: Final[dict[str, str]] = {sql: q.name for q, sql in db_queries.items()}
+QUERY_TEXT: Final[dict[str, str]] = {q.name: " ".join(sql.split())
+                                     for q, sql in db_queries.items()}
+
+
+def _record(sql: str, seconds: float) -> None:
+    prof = profiler.active
+    if prof is not None:
+        prof.query(QUERY_NAMES.get(sql) or " ".join(sql.split())[:120], seconds)
+
+
+class _ProfiledCursor(sqlite3.Cursor):
+    """Cursor that reports how long each statement takes to the active
+    Profiler.
+
+    For a SELECT, this only covers the time to the first row, but most of our
+    expensive queries, like searches, sort their results, so they do the bulk
+    of their work before that."""
+
+    def execute(self, sql: str, parameters: Any = (), /) -> sqlite3.Cursor:
+        """Execute a statement, and record how long it took."""
+        t0: float = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record(sql, time.perf_counter() - t0)
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /) -> sqlite3.Cursor:
+        """Execute a statement for each set of parameters, and record how long
+        it took altogether."""
+        t0: float = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record(sql, time.perf_counter() - t0)
+
+
+class _ProfiledConnection(sqlite3.Connection):
+    """Connection that hands out _ProfiledCursors."""
+
+    # This is not a useless delegation, pylint misses that we change the
+    # default factory.
+    # pylint: disable-msg=W0246
+    def cursor(self, factory: Any = _ProfiledCursor) -> sqlite3.Cursor:
+        """Return a new cursor, a _ProfiledCursor unless the caller asks for
+        a different kind."""
+        return super().cursor(factory)
+
+
+def _unmark(text: str) -> tuple[str, list[tuple[int, int]]]:
+    """Remove the markers from a snippet, and return the text along with the
+    offsets of the marked parts."""
+    pieces: list[str] = text.split(MARK_START)
+    parts: list[str] = [pieces[0]]
+    matches: list[tuple[int, int]] = []
+    pos: int = len(pieces[0])
+    for piece in pieces[1:]:
+        term, _, rest = piece.partition(MARK_END)
+        matches.append((pos, pos + len(term)))
+        parts.append(term)
+        parts.append(rest)
+        pos += len(term) + len(rest)
+    return "".join(parts), matches
+
+
+def _folder_id(folder: Union[Folder, int]) -> int:
+    """Accept a Folder or its ID."""
+    if isinstance(folder, Folder):
+        return folder.fid
+    if isinstance(folder, int):
+        return folder
+    raise TypeError(f"'folder' must be a Folder object or an int, not a {type(folder)}")
+
+
+def promoted(config: str = "") -> dict[str, list[str]]:
+    """Return the metadata keys that get a column of their own, as given in
+    the promote table of the settings file, like so:
+
+    [promote]
+    artist = ["artist"]
+    title = ["title", "Title"]
+
+    Without a promote table, we go with PROMOTED."""
+    if config == "":
+        config = common.path.config()
+    try:
+        with open(config, "rb") as fh:
+            cfg: Optional[dict[str, Any]] = tomllib.load(fh).get("promote")
+    except FileNotFoundError:
+        return PROMOTED
+    except (OSError, tomllib.TOMLDecodeError) as err:
+        common.get_logger("database").error("Cannot read %s: %s", config, err)
+        return PROMOTED
+
+    if cfg is None:
+        return PROMOTED
+    spec: dict[str, list[str]] = {}
+    for name, keys in cfg.items():
+        if isinstance(keys, str):
+            keys = [keys]
+        try:
+            _check_promoted(name, keys)
+        except ValueError as err:
+            common.get_logger("database").error("Invalid entry in %s: %s", config, err)
+            continue
+        spec[name] = keys
+    return spec
+
+
+def _check_promoted(name: str, keys: Any) -> None:
+    """Make sure a column name and its keys can go into SQL as they are."""
+    if PROMOTED_NAME_PAT.fullmatch(name) is None:
+        raise ValueError(f"Invalid column name {name!r}")
+    if not isinstance(keys, list) or len(keys) == 0 or \
+       not all(isinstance(k, str) and PROMOTED_KEY_PAT.fullmatch(k) for k in keys):
+        raise ValueError(f"Invalid metadata keys for {name}: {keys!r}")
+
+
+def _promote_queries(name: str, keys: list[str]) -> list[str]:
+    """Return the queries to add a generated column for the given keys.
+
+    The column is VIRTUAL, so it does not take any space, and adding it does
+    not touch the table. The value is stored only in the index. An empty
+    value counts as missing, read_tags, for one, fills in empty strings."""
+    values: list[str] = [f"json_extract(NULLIF(meta, ''), '$.\"{k}\"')" for k in keys]
+    expr: str = values[0] if len(values) == 1 else f"COALESCE({', '.join(values)})"
+    return [
+        f"""
+ALTER TABLE file ADD COLUMN meta_{name} TEXT COLLATE NOCASE
+GENERATED ALWAYS AS (CAST(NULLIF({expr}, '') AS TEXT)) VIRTUAL
+        """,
+        f"CREATE INDEX IF NOT EXISTS file_meta_{name}_idx ON file (meta_{name})",
+    ]
+
+
+def _promoted_columns(spec: dict[str, list[str]]) -> dict[str, str]:
+    """Map the promoted metadata keys, and the names of their columns, to the
+    columns."""
+    columns: dict[str, str] = {}
+    for name, keys in spec.items():
+        columns[name] = f"meta_{name}"
+        for k in keys:
+            columns.setdefault(k, f"meta_{name}")
+    return columns
+
+
+def _file_values(f: File) -> tuple[Any, ...]:
+    """Return the values of a File's columns, starting with time_scanned,
+    in the order the INSERT and UPDATE queries expect them.
+
+    If the File has a hash, its content lives in the blob table."""
+    if f.hash == "":
+        return (int(f.time_scanned.timestamp()),
+                int(f.mtime.timestamp()),
+                f.size,
+                f.inode,
+                f.content_type.value,
+                f.mime_type,
+                json.dumps(f.meta),
+                f.content,
+                None)
+    return (int(f.time_scanned.timestamp()),
+            int(f.mtime.timestamp()),
+            f.size,
+            f.inode,
+            f.content_type.value,
+            f.mime_type,
+            json.dumps(f.meta),
+            "",
+            f.hash)
+
 
 class Database:
     """Database provides a wrapper around the, uh, database connection
@@ -157,45 +812,200 @@ class Database:
         "db",
         "log",
         "path",
+        "readonly",
+        "commit_time",
+        "promoted",
+        "depth",
     ]
 
     db: sqlite3.Connection
     log: logging.Logger
     path: str
+    readonly: bool
+    commit_time: metrics.MetricHandle
+    promoted: dict[str, str]
+    depth: int
 
-    def __init__(self, path: Optional[str] = None) -> None:
+    def __init__(self,
+                 path: Optional[str] = None,
+                 readonly: bool = False,
+                 shared: bool = False,
+                 promote: Optional[dict[str, list[str]]] = None) -> None:
+        """Open the database.
+
+        A readonly connection cannot modify the database, and it assumes the
+        database already exists. A shared connection may be used by more than
+        one thread, but only by one at a time.
+
+        promote gives the metadata keys that get a column of their own, see
+        the promote method. When the database is created or its schema is
+        migrated, it gets what the settings file says. Otherwise, the columns
+        are only changed if promote is given, because building their indices
+        means going through the whole file table. A readonly connection takes
+        the columns as it finds them."""
         if path is None:
             self.path = common.path.db()
         else:
             self.path = path
+        self.readonly = readonly
+        self.depth = 0
         self.log = common.get_logger("database")
+        self.commit_time = metrics.registry.histogram("pythia_db_commit_seconds",
+                                                      "Time to commit a transaction")
+        factory: type[sqlite3.Connection] = \
+            sqlite3.Connection if profiler.active is None else _ProfiledConnection
         self.log.debug("Open database at %s", path)
+
+        if readonly:
+            self.db = sqlite3.connect(self.path,
+                                      check_same_thread=not shared,
+                                      cached_statements=STATEMENT_CACHE_SIZE,
+                                      factory=factory)
+            self.db.isolation_level = None
+            cur: sqlite3.Cursor = self.db.cursor()
+            cur.execute("PRAGMA query_only = true")
+            cur.execute(f"PRAGMA mmap_size = {READ_MMAP_SIZE}")
+            cur.execute(f"PRAGMA cache_size = {READ_CACHE_SIZE}")
+            self.promoted = _promoted_columns(self.__get_promoted())
+            return
+
         with OPEN_LOCK:
             exist: Final[bool] = krylib.fexist(self.path)
-            self.db = sqlite3.connect(self.path)
+            self.db = sqlite3.connect(self.path,
+                                      check_same_thread=not shared,
+                                      cached_statements=STATEMENT_CACHE_SIZE,
+                                      factory=factory)
             self.db.isolation_level = None
 
-            cur: Final[sqlite3.Cursor] = self.db.cursor()
+            cur = self.db.cursor()
             cur.execute("PRAGMA foreign_keys = true")
             cur.execute("PRAGMA journal_mode = WAL")
+            # In WAL mode, this is still safe against corruption, but it
+            # saves us an fsync on every commit.
+            cur.execute("PRAGMA synchronous = NORMAL")
 
+            migrated: bool = True
             if not exist:
                 self.__create_db()
+            else:
+                migrated = self.__migrate()
+            cur.execute(db_queries[Query.SeenCreate])
+            if migrated or promote is not None:
+                self.promote(promote if promote is not None else promoted())
+                return
+            current: Final[dict[str, list[str]]] = self.__get_promoted()
+            self.promoted = _promoted_columns(current)
+            if current != promoted():
+                self.log.warning("The promoted metadata keys in %s do not match the "
+                                 "database, they take effect once Database.promote "
+                                 "is called with them",
+                                 common.path.config())
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self.db.close()
 
     def __create_db(self) -> None:
         """Initialize a freshly created database"""
         self.log.debug("Initialize fresh database at %s", self.path)
-        with self.db:
+        # With isolation_level set to None, "with self.db" would not open a
+        # transaction, we need our own __enter__ for that.
+        with self:
             for query in INIT_QUERIES:
                 cur: sqlite3.Cursor = self.db.cursor()
                 cur.execute(query)
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         self.log.debug("Database initialized successfully.")
 
+    def __migrate(self) -> bool:
+        """Bring the schema of an existing database up to date.
+
+        Returns True if the schema had to be migrated."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute("PRAGMA user_version")
+        version: int = cur.fetchone()[0]
+        migrated: Final[bool] = version < SCHEMA_VERSION
+        while version < SCHEMA_VERSION:
+            self.log.info("Migrate database schema from version %d to %d",
+                          version,
+                          version + 1)
+            with self:
+                for query in MIGRATIONS[version]:
+                    cur.execute(query)
+                version += 1
+                cur.execute(f"PRAGMA user_version = {version}")
+        return migrated
+
+    def __get_promoted(self) -> dict[str, list[str]]:
+        """Load the promoted metadata keys, by the names of their columns."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        try:
+            cur.execute(db_queries[Query.PromotedGetAll])
+        except sqlite3.OperationalError as err:
+            # A readonly connection to a database that has not been migrated
+            # yet.
+            self.log.error("Cannot load promoted metadata keys: %s", err)
+            return {}
+        return {row[0]: json.loads(row[1]) for row in cur}
+
+    def promote(self, spec: dict[str, list[str]]) -> None:
+        """Give the metadata keys in spec columns of their own, with an index.
+
+        spec maps the names of the columns to the keys they take their value
+        from. Columns that are not in spec any more are removed. The columns
+        are generated by SQLite, so existing Files get their values as the
+        index is built, there is nothing to fill in.
+
+        SQLite builds an index in a single statement, which holds the write
+        lock until it is done, so each column is changed in a transaction of
+        its own. That way, other connections get a turn in between."""
+        for name, keys in spec.items():
+            _check_promoted(name, keys)
+        current: Final[dict[str, list[str]]] = self.__get_promoted()
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        for name, keys in current.items():
+            if spec.get(name) != keys:
+                self.log.info("Remove column meta_%s", name)
+                with self:
+                    cur.execute(f"DROP INDEX IF EXISTS file_meta_{name}_idx")
+                    cur.execute(f"ALTER TABLE file DROP COLUMN meta_{name}")
+                    cur.execute(db_queries[Query.PromotedDelete], (name, ))
+        for name, keys in spec.items():
+            if current.get(name) != keys:
+                self.log.info("Add column meta_%s for %s", name, ", ".join(keys))
+                with self:
+                    for query in _promote_queries(name, keys):
+                        cur.execute(query)
+                    cur.execute(db_queries[Query.PromotedAdd], (name, json.dumps(keys)))
+        self.promoted = _promoted_columns(spec)
+
     def __enter__(self) -> None:
-        self.db.__enter__()
+        # With isolation_level set to None, the sqlite3 module does not begin
+        # transactions on its own, so without this, every statement would be
+        # committed by itself. IMMEDIATE takes the write lock right away,
+        # rather than failing halfway through the transaction if another
+        # connection got it first.
+        # A nested transaction only sets a savepoint, so it can be rolled
+        # back on its own. Only the outermost one commits.
+        if self.depth > 0:
+            self.db.execute(f"SAVEPOINT nested_{self.depth}")
+        elif not self.db.in_transaction:
+            self.db.execute("BEGIN IMMEDIATE")
+        self.depth += 1
 
     def __exit__(self, ex_type, ex_val, traceback):
-        return self.db.__exit__(ex_type, ex_val, traceback)
+        self.depth -= 1
+        if self.depth > 0:
+            if ex_type is not None:
+                self.db.execute(f"ROLLBACK TO nested_{self.depth}")
+            self.db.execute(f"RELEASE nested_{self.depth}")
+            return False
+        if ex_type is not None:
+            return self.db.__exit__(ex_type, ex_val, traceback)
+        t0: float = time.perf_counter()
+        res = self.db.__exit__(ex_type, ex_val, traceback)
+        self.commit_time.observe(time.perf_counter() - t0)
+        return res
 
     def folder_add(self, f: Folder) -> None:
         """Add a Folder to the database."""
@@ -209,7 +1019,7 @@ class Database:
         if stamp is None:
             stamp = datetime.now()
         cur = self.db.cursor()
-        cur.execute(db_queries[Query.FolderUpdateScan], (stamp.timestamp(), f.fid))
+        cur.execute(db_queries[Query.FolderUpdateScan], (int(stamp.timestamp()), f.fid))
         f.time_scanned = stamp
 
     def folder_get_by_path(self, path: str) -> Optional[Folder]:
@@ -234,20 +1044,143 @@ class Database:
             folders.append(f)
         return folders
 
+    def __blob_add(self, files: Sequence[File]) -> None:
+        """Store the content and metadata of Files that have a hash in the
+        blob table, unless a blob with the same hash already exists.
+
+        Shared Files do not carry their content, they refer to a blob that is
+        already there."""
+        cur = self.db.cursor()
+        cur.executemany(db_queries[Query.BlobAdd],
+                        ((f.hash, json.dumps(f.meta), f.content)
+                         for f in files if f.hash != "" and not f.shared))
+
+    def blob_get_meta(self, file_hash: str) -> Optional[dict]:
+        """Look up the metadata stored for the given content hash.
+
+        Returns None if we have not seen the hash before."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.BlobGetMeta], (file_hash, ))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def blob_get_missing(self, hashes: Iterable[str]) -> set[str]:
+        """Return the hashes we do not have a blob for."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.BlobGetMissing], (json.dumps(list(hashes)), ))
+        return {row[0] for row in cur}
+
+    def blob_purge(self) -> int:
+        """Remove blobs that are no longer referenced by any File.
+
+        Returns the number of blobs removed."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.BlobPurge])
+        return cur.rowcount
+
     def file_add(self, f: File) -> None:
         """Add a File to the database."""
+        self.__blob_add((f, ))
         cur = self.db.cursor()
         cur.execute(db_queries[Query.FileAdd],
-                    (f.folder_id,
-                     f.path,
-                     f.time_scanned.timestamp(),
-                     f.content_type.value,
-                     f.mime_type,
-                     f.content,
-                     json.dumps(f.meta)))
+                    (f.folder_id, f.path) + _file_values(f))
         row = cur.fetchone()
         f.fid = row[0]
 
+    def file_add_many(self, files: Sequence[File]) -> None:
+        """Add several Files to the database in one go.
+
+        This is considerably faster than calling file_add for each File,
+        especially if the caller wraps it in a single transaction."""
+        if len(files) == 0:
+            return
+        self.__blob_add(files)
+        cur = self.db.cursor()
+        cur.executemany(db_queries[Query.FileAddMany],
+                        ((f.folder_id, f.path) + _file_values(f) for f in files))
+        # executemany does not give us the rows from a RETURNING clause, so we
+        # look up the IDs of all new Files with a single query.
+        ids: Final[dict[str, int]] = self.file_get_ids(f.path for f in files)
+        for f in files:
+            f.fid = ids[f.path]
+
+    def file_get_ids(self, paths: Iterable[str]) -> dict[str, int]:
+        """Look up the database IDs of the Files with the given paths.
+
+        Returns a dict that maps paths to IDs. Paths that are not in the
+        database are missing from the result."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FileGetIDByPaths], (json.dumps(list(paths)), ))
+        return {row[1]: row[0] for row in cur}
+
+    def file_update(self, f: File) -> None:
+        """Update a File's scan time, type, metadata and content."""
+        self.file_update_many((f, ))
+
+    def file_update_many(self, files: Sequence[File]) -> None:
+        """Update several Files in one go.
+
+        Blobs that were only used by the old content of these Files are
+        removed. Unlike blob_purge, this only looks at the blobs in question,
+        so it is cheap enough to do on every update."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FileGetHashes],
+                    (json.dumps([f.fid for f in files]), ))
+        old: list[str] = [row[0] for row in cur]
+        self.__blob_add(files)
+        cur.executemany(db_queries[Query.FileUpdate],
+                        (_file_values(f) + (f.fid, ) for f in files))
+        if len(old) > 0:
+            cur.execute(db_queries[Query.BlobPurgeHashes], (json.dumps(old), ))
+
+    def file_delete(self, f: File) -> None:
+        """Remove a File from the database."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FileDelete], (f.fid, ))
+
+    def file_delete_many(self, ids: Iterable[int]) -> int:
+        """Remove the Files with the given IDs from the database.
+
+        Returns the number of Files removed."""
+        cur = self.db.cursor()
+        cur.executemany(db_queries[Query.FileDelete], ((fid, ) for fid in ids))
+        return cur.rowcount
+
+    def file_delete_unseen(self, folder: Folder, before: datetime) -> int:
+        """Remove the Files of a Folder that were last scanned before the given
+        time, and that were not marked as seen since file_seen_clear was
+        called. Clears the seen marks afterwards.
+
+        Returns the number of Files removed."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FileDeleteUnseen], (folder.fid, int(before.timestamp())))
+        cnt: Final[int] = cur.rowcount
+        cur.execute(db_queries[Query.SeenClear], (folder.fid, ))
+        return cnt
+
+    def file_seen_add(self, folder: Folder, ids: Sequence[int]) -> None:
+        """Mark the Files with the given IDs as found on disk."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.SeenAdd], (folder.fid, json.dumps(ids)))
+
+    def file_seen_clear(self, folder: Folder) -> None:
+        """Forget which Files of a Folder have been marked as seen."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.SeenClear], (folder.fid, ))
+
+    def file_delete_by_path(self, paths: Iterable[str]) -> None:
+        """Remove the Files with the given paths from the database."""
+        cur = self.db.cursor()
+        cur.executemany(db_queries[Query.FileDeleteByPath], ((p, ) for p in paths))
+
+    def file_delete_by_prefix(self, folder: str) -> None:
+        """Remove all Files below the given directory from the database."""
+        folder = folder.rstrip("/")
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FileDeleteByPrefix], (folder, folder))
+
     def file_get_by_path(self, path: str) -> Optional[File]:
         """Look up a File by its path."""
         cur = self.db.cursor()
@@ -255,7 +1188,7 @@ class Database:
         row = cur.fetchone()
         if row is None:
             return None
-        return File.from_db(row)
+        return File.from_db(row, self)
 
     def file_get_by_id(self, file_id: int) -> Optional[File]:
         """Look up a File by its database ID"""
@@ -264,25 +1197,289 @@ class Database:
         row = cur.fetchone()
         if row is None:
             return None
-        return File.from_db(row)
+        return File.from_db(row, self)
 
     def file_get_by_folder(self, folder: Union[Folder, int]) -> list[File]:
         """Get all files found in a given directory tree."""
-        fid: int = 0
-        if isinstance(folder, Folder):
-            fid = folder.fid
-        elif isinstance(folder, int):
-            fid = folder
-        else:
-            raise TypeError(f"'folder' must be a Folder object or an int, not a {type(folder)}")
+        return list(self.file_iter_by_folder(folder))
+
+    def file_iter_by_folder(self, folder: Union[Folder, int]) -> Iterator[File]:
+        """Iterate over the files found in a given directory tree, without
+        building a list of them first.
+
+        Like all Files loaded from the database, their metadata and text are
+        only fetched when they are first accessed, which has to happen in the
+        thread that owns the Database."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FileGetByFolder], (_folder_id(folder), ))
+        for row in cur:
+            yield File.from_db(row, self)
+
+    def file_get_headers_by_folder(self, folder: Union[Folder, int]) -> Iterator[FileHeader]:
+        """Iterate over a lightweight view of the files found in a given
+        directory tree."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FileGetHeadersByFolder], (_folder_id(folder), ))
+        for row in cur:
+            yield FileHeader(fid=row[0],
+                             folder_id=row[1],
+                             path=row[2],
+                             mtime=datetime.fromtimestamp(row[3]),
+                             size=row[4],
+                             content_type=FileType(row[5]))
+
+    def file_get_meta(self, file_id: int) -> dict:
+        """Fetch the metadata of a File."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FileGetMeta], (file_id, ))
+        row = cur.fetchone()
+        if row is None or row[0] == "":
+            return {}
+        return json.loads(row[0])
+
+    def file_get_content(self, file_id: int) -> str:
+        """Fetch the text of a File."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FileGetContent], (file_id, ))
+        row = cur.fetchone()
+        if row is None:
+            return ""
+        return row[0]
+
+    def file_get_stat_by_folder(self, folder: Folder) -> dict[str, tuple[int, int, int]]:
+        """Load the stat data of all Files in the given Folder, in a single query.
+
+        Returns a dict that maps each path to a tuple of the File's ID,
+        its mtime (as a Unix timestamp), and its size."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FileGetStatByFolder], (folder.fid, ))
+        return {row[0]: (row[1], row[2], row[3]) for row in cur}
+
+    def file_get_stat_by_paths(self, paths: Iterable[str]) -> dict[str, tuple[int, int, int]]:
+        """Load the stat data of the Files with the given paths, in a single
+        query.
+
+        Returns a dict like file_get_stat_by_folder, paths that are not in the
+        database are missing from it."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FileGetStatByPaths], (json.dumps(list(paths)), ))
+        return {row[0]: (row[1], row[2], row[3]) for row in cur}
+
+    def failure_add_many(self, failures: Sequence[Failure]) -> None:
+        """Record Failures to process files."""
+        cur = self.db.cursor()
+        cur.executemany(db_queries[Query.FailureAdd],
+                        ((x.path, int(x.timestamp.timestamp()), x.kind.value, x.message)
+                         for x in failures))
+
+    def failure_get_recent(self, limit: int = 100) -> list[Failure]:
+        """Fetch the most recent Failures, newest first."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FailureGetRecent], (limit, ))
+        return [Failure(path=row[0],
+                        timestamp=datetime.fromtimestamp(row[1]),
+                        kind=FailureKind(row[2]),
+                        message=row[3]) for row in cur]
+
+    def checkpoint_set(self, cp: Checkpoint) -> None:
+        """Save a Checkpoint, replacing the Folder's previous one."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.CheckpointSet],
+                    (cp.folder.fid, int(cp.timestamp.timestamp()), json.dumps(cp.frontier)))
+
+    def checkpoint_get(self, folder: Folder) -> Optional[Checkpoint]:
+        """Fetch the Checkpoint of a Folder whose walk was interrupted."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.CheckpointGet], (folder.fid, ))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return Checkpoint(folder=folder,
+                          timestamp=datetime.fromtimestamp(row[0]),
+                          frontier=json.loads(row[1]))
+
+    def checkpoint_delete(self, folder: Folder) -> None:
+        """Remove the Checkpoint of a Folder."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.CheckpointDelete], (folder.fid, ))
+
+    def profile_add_many(self, entries: Sequence[ProfileEntry]) -> None:
+        """Store a profiling report."""
+        cur = self.db.cursor()
+        cur.executemany(db_queries[Query.ProfileAdd],
+                        ((int(x.run.timestamp()),
+                          x.kind.value,
+                          x.subject,
+                          x.seconds,
+                          x.calls,
+                          x.longest,
+                          x.detail) for x in entries))
+
+    def profile_get(self, run: Optional[datetime] = None) -> list[ProfileEntry]:
+        """Fetch the profiling report from the given run, or the latest one.
+        The slowest files come first, then the most expensive queries."""
         cur = self.db.cursor()
-        cur.execute(db_queries[Query.FileGetByFolder], (fid, ))
+        cur.execute(db_queries[Query.ProfileGetRun],
+                    (None if run is None else int(run.timestamp()), ))
+        return [ProfileEntry(run=datetime.fromtimestamp(row[0]),
+                             kind=ProfileKind(row[1]),
+                             subject=row[2],
+                             seconds=row[3],
+                             calls=row[4],
+                             longest=row[5],
+                             detail=row[6]) for row in cur]
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> list[File]:
+        """Search the full text index for the given query.
+
+        The query uses the FTS5 query syntax. Results are ordered by relevance,
+        best match first."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FileSearch], (query, limit, offset))
         results: list[File] = []
         for row in cur:
-            f = File.from_db(row)
+            f = File.from_db(row, self)
             results.append(f)
         return results
 
+    def search_snippets(self,
+                        query: str,
+                        limit: int = 20,
+                        offset: int = 0,
+                        size: int = SNIPPET_SIZE) -> list[Hit]:
+        """Search the full text index for the given query, like search, but
+        return only an excerpt of about size tokens from each matching File.
+
+        The excerpts are computed by SQLite, so the full text of the Files is
+        never loaded."""
+        size = max(1, min(size, MAX_SNIPPET_SIZE))
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FileSnippets],
+                    (MARK_START, MARK_END, ELLIPSIS, size, query, limit, offset))
+        results: list[Hit] = []
+        for row in cur:
+            path, path_matches = _unmark(row[1])
+            snippet, matches = _unmark(row[2])
+            results.append(Hit(fid=row[0],
+                               path=path,
+                               snippet=snippet,
+                               rank=row[3],
+                               path_matches=path_matches,
+                               matches=matches))
+        return results
+
+    def find(self, query: str, limit: int = 20, cursor: str = "") -> Page:
+        """Find the Files matching a query in the syntax of the query module.
+
+        To get the next page of results, pass the cursor of the previous Page.
+        Raises query.QueryError if the query or the cursor is not valid."""
+        plan: Final[Plan] = Plan(query, self.promoted)
+        sql, params = plan.sql(limit + 1, cursor)
+        cur = self.db.cursor()
+        cur.execute(sql, params)
+        rows: list[tuple[Any, ...]] = cur.fetchall()
+        page: Page = Page(files=[File.from_db(row, self) for row in rows[:limit]])
+        if len(rows) > limit:
+            page.cursor = plan.cursor(rows[limit - 1])
+        return page
+
+    def facet(self, name: str, limit: int = 1000) -> list[tuple[str, int]]:
+        """Return the values of a promoted metadata key, along with the number
+        of Files that have each, in alphabetical order. This only reads the
+        index of the key's column."""
+        column: Final[str] = f"meta_{name}"
+        if self.promoted.get(name) != column:
+            raise ValueError(f"{name} is not a promoted metadata key")
+        cur = self.db.cursor()
+        cur.execute(f"""
+SELECT
+    {column},
+    COUNT(*)
+FROM file
+WHERE {column} IS NOT NULL
+GROUP BY {column}
+ORDER BY {column}
+LIMIT ?
+        """, (limit, ))
+        return cur.fetchall()
+
+
+class DatabasePool:
+    """DatabasePool hands out one read-only connection per thread, and sends
+    all writes through a single writer connection.
+
+    In WAL mode, readers do not block the writer or each other, so searches
+    never have to wait for a crawl, and vice versa. Writers still have to take
+    turns, so we might as well have them do so on our side, on one connection,
+    instead of waiting for each other's locks on the database file."""
+
+    __slots__ = [
+        "path",
+        "log",
+        "lock",
+        "wlock",
+        "wdb",
+        "local",
+        "readers",
+    ]
+
+    path: str
+    log: logging.Logger
+    lock: Lock
+    wlock: RLock
+    wdb: Database
+    local: local
+    readers: list[Database]
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path if path is not None else common.path.db()
+        self.log = common.get_logger("database")
+        self.lock = Lock()
+        self.wlock = RLock()
+        # The writer comes first, it creates or migrates the database if
+        # necessary.
+        self.wdb = Database(self.path, shared=True)
+        self.local = local()
+        self.readers = []
+
+    def reader(self) -> Database:
+        """Return the calling thread's read-only connection, opening it if
+        the thread does not have one, yet."""
+        db: Optional[Database] = getattr(self.local, "db", None)
+        if db is None:
+            db = Database(self.path, readonly=True, shared=True)
+            self.local.db = db
+            with self.lock:
+                self.readers.append(db)
+        return db
+
+    def release(self) -> None:
+        """Close the calling thread's read-only connection, if it has one.
+        Threads that are about to finish should call this."""
+        db: Optional[Database] = getattr(self.local, "db", None)
+        if db is not None:
+            del self.local.db
+            with self.lock:
+                self.readers.remove(db)
+            db.close()
+
+    @contextmanager
+    def writer(self) -> Iterator[Database]:
+        """Run a transaction on the writer connection. Other threads that
+        want to write have to wait until it is finished."""
+        with self.wlock:
+            with self.wdb:
+                yield self.wdb
+
+    def close(self) -> None:
+        """Close all connections."""
+        with self.lock:
+            for db in self.readers:
+                db.close()
+            self.readers.clear()
+        with self.wlock:
+            self.wdb.close()
+
 
 # Local Variables: #
 # python-indent: 4 #
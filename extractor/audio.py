@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-02-27 15:04:58 krylon>
+# Time-stamp: <2026-10-18 07:43:53 krylon>
 #
 # /home/krylon/code/python/pythia/extractor/audio.py
 # created on 27. 02. 2024
@@ -17,9 +17,10 @@ pythia.extractor.audio
 (c) 2024 Benjamin Walkenhorst
 """
 
-import os.path
+import os
 import re
-from typing import Final
+import struct
+from typing import IO, Final, Optional
 
 import mutagen
 
@@ -30,25 +31,77 @@ AUDIO_PAT: Final[re.Pattern] = \
     re.compile("[.](?:mp3|og[ga]|opus|m4b|aac|flac)", re.I)
 DISC_NO_PAT: Final[re.Pattern] = re.compile("(\\d+)\\s*/\\s*(\\d+)")
 
+# The names of the tags we are interested in, per tag format, and the keys we
+# store them under in File.meta.
+TAG_KEYS: Final[dict[str, dict[str, str]]] = {
+    "id3": {
+        "TPE1": "artist",
+        "TALB": "album",
+        "TIT2": "title",
+        "TPOS": "ord1",
+        "TRCK": "ord2",
+        # ID3v2.2 has three-letter frame IDs
+        "TP1": "artist",
+        "TAL": "album",
+        "TT2": "title",
+        "TPA": "ord1",
+        "TRK": "ord2",
+    },
+    # Vorbis comments, used by Ogg Vorbis, Opus, and FLAC. The names are
+    # case-insensitive, we look them up in upper case.
+    "vorbis": {
+        "ARTIST": "artist",
+        "ALBUM": "album",
+        "TITLE": "title",
+        "DISCNUMBER": "ord1",
+        "TRACKNUMBER": "ord2",
+    },
+    # mutagen's "easy" interface, which we fall back to for anything else.
+    "easy": {
+        "artist": "artist",
+        "album": "album",
+        "title": "title",
+        "discnumber": "ord1",
+        "tracknumber": "ord2",
+    },
+}
+
+# A tag larger than this is most likely garbage, or a huge cover image.
+MAX_TAG_SIZE: Final[int] = 16 * 2**20
+
+ID3_ENCODINGS: Final[tuple[str, ...]] = ("latin-1", "utf-16", "utf-16-be", "utf-8")
+
 
 class AudioExtractor(Extractor):  # pylint: disable-msg=R0903
     """Extracts metadata from audio files"""
 
+    suffixes = ("mp3", "ogg", "oga", "opus", "flac")
+    mime_types = ("audio/mpeg", "audio/ogg", "audio/flac", "audio/x-flac", "audio/opus")
+    # ID3 tag, MPEG frame sync, FLAC, Ogg
+    magic = (b"ID3", b"\xff\xfb", b"\xff\xf3", b"\xff\xf2", b"fLaC", b"OggS")
+
     def process(self, f: File) -> bool:
         f.meta = read_tags(f.path)
         f.content = ""
         return True
 
 
-def read_tags(path: str) -> dict[str, str]:  # pylint: disable-msg=R0912
+def read_tags(path: str) -> dict[str, str]:
     """Attempt to extract metadata from an audio file.
 
     path is expected to be the full, absolute path.
+
+    We read only the parts of the file that contain the tags, for the formats
+    we know. Everything else is left to mutagen.
     """
+    raw: Optional[dict[str, str]] = None
     try:
-        meta = mutagen.File(path)
-    except mutagen.MutagenError:
-        return {}
+        with open(path, "rb") as fh:
+            raw = _read_header_tags(fh)
+    except (OSError, ValueError, IndexError, struct.error):
+        raw = None
+    if raw is None:
+        raw = _read_mutagen(path)
 
     tags: dict[str, str] = {
         "artist": "",
@@ -57,34 +110,11 @@ def read_tags(path: str) -> dict[str, str]:  # pylint: disable-msg=R0912
         "ord1": "0",
         "ord2": "0",
     }
+    tags.update((k, v) for k, v in raw.items() if v != "")
 
-    if "artist" in meta:
-        tags["artist"] = meta["artist"][0]
-    elif "TPE1" in meta:
-        tags["artist"] = meta["TPE1"].text[0]
-
-    if "album" in meta:
-        tags["album"] = meta["album"][0]
-    elif "TALB" in meta:
-        tags["album"] = meta["TALB"].text[0]
-    else:
+    if tags["album"] == "":
         tags["album"] = os.path.basename(os.path.dirname(path))
 
-    if "title" in meta:
-        tags["title"] = meta["title"][0]
-    elif "TIT2" in meta:
-        tags["title"] = meta["TIT2"].text[0]
-
-    if "tracknumber" in meta:
-        tags["ord2"] = meta["tracknumber"][0]
-    elif "TRCK" in meta:
-        tags["ord2"] = meta["TRCK"].text[0]
-
-    if "discnumber" in meta:
-        tags["ord1"] = meta["discnumber"][0]
-    elif "TPOS" in meta:
-        tags["ord1"] = meta["TPOS"].text[0]
-
     m1 = DISC_NO_PAT.search(tags["ord1"])
     if m1 is not None:
         tags["ord1"] = m1[1]
@@ -96,6 +126,197 @@ def read_tags(path: str) -> dict[str, str]:  # pylint: disable-msg=R0912
     return tags
 
 
+def _read_header_tags(fh: IO[bytes]) -> Optional[dict[str, str]]:
+    """Read the tags from the header of an audio file, if we know its format.
+
+    Returns None if we do not."""
+    head: bytes = fh.read(4)
+    fh.seek(0)
+    if head.startswith(b"ID3"):
+        tags = _read_id3(fh)
+        if len(tags) > 0:
+            return tags
+        # Some FLAC files have an ID3 tag in front of them.
+        pos: int = fh.tell()
+        if fh.read(4) == b"fLaC":
+            fh.seek(pos)
+            return _read_flac(fh)
+        return _read_id3v1(fh)
+    if head == b"fLaC":
+        return _read_flac(fh)
+    if head == b"OggS":
+        return _read_ogg(fh)
+    if len(head) >= 2 and head[0] == 0xff and head[1] & 0xe0 == 0xe0:
+        # An MPEG audio frame, without an ID3v2 tag. There may be an ID3v1
+        # tag at the end.
+        return _read_id3v1(fh)
+    return None
+
+
+def _syncsafe(data: bytes) -> int:
+    """Decode a 28 bit integer stored in 4 bytes of 7 bits each."""
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _read_id3(fh: IO[bytes]) -> dict[str, str]:  # pylint: disable-msg=R0912
+    """Read an ID3v2 tag from the beginning of a file."""
+    header: bytes = fh.read(10)
+    if len(header) < 10 or not header.startswith(b"ID3"):
+        return {}
+    major, flags = header[3], header[5]
+    size: int = _syncsafe(header[6:10])
+    if major not in (2, 3, 4) or size > MAX_TAG_SIZE:
+        return {}
+    data: bytes = fh.read(size)
+    if flags & 0x80 and major < 4:
+        # Unsynchronisation applies to the whole tag before ID3v2.4
+        data = data.replace(b"\xff\x00", b"\xff")
+
+    pos: int = 0
+    if flags & 0x40 and major == 3:
+        pos = 4 + int.from_bytes(data[0:4], "big")
+    elif flags & 0x40 and major == 4:
+        pos = _syncsafe(data[0:4])
+    idlen, hdrlen = (3, 6) if major == 2 else (4, 10)
+    keys = TAG_KEYS["id3"]
+    tags: dict[str, str] = {}
+
+    while pos + hdrlen <= len(data) and data[pos] != 0:
+        fid: str = data[pos:pos+idlen].decode("latin-1")
+        fflags: int = 0
+        if major == 2:
+            fsize = int.from_bytes(data[pos+3:pos+6], "big")
+        elif major == 3:
+            fsize = int.from_bytes(data[pos+4:pos+8], "big")
+            fflags = data[pos+9]
+        else:
+            fsize = _syncsafe(data[pos+4:pos+8])
+            fflags = data[pos+9]
+        body: bytes = data[pos+hdrlen:pos+hdrlen+fsize]
+        pos += hdrlen + fsize
+
+        key = keys.get(fid)
+        if key is None or key in tags:
+            continue
+        if major == 3 and fflags & 0xc0:
+            # Compressed or encrypted
+            continue
+        if major == 4:
+            if fflags & 0x0c:
+                continue
+            if fflags & 0x02:
+                body = body.replace(b"\xff\x00", b"\xff")
+            if fflags & 0x01:
+                # Data length indicator
+                body = body[4:]
+        if len(body) > 1 and body[0] < len(ID3_ENCODINGS):
+            text = body[1:].decode(ID3_ENCODINGS[body[0]], "replace")
+            # ID3v2.4 separates multiple values with NUL characters.
+            tags[key] = text.split("\0", 1)[0].strip()
+    return tags
+
+
+def _read_id3v1(fh: IO[bytes]) -> dict[str, str]:
+    """Read an ID3v1 tag from the last 128 bytes of a file."""
+    fh.seek(0, os.SEEK_END)
+    if fh.tell() < 128:
+        return {}
+    fh.seek(-128, os.SEEK_END)
+    data: bytes = fh.read(128)
+    if not data.startswith(b"TAG"):
+        return {}
+    tags: dict[str, str] = {}
+    for key, start in (("title", 3), ("artist", 33), ("album", 63)):
+        tags[key] = data[start:start+30].split(b"\0", 1)[0].decode("latin-1").strip()
+    # ID3v1.1 keeps the track number in the last byte of the comment.
+    if data[125] == 0 and data[126] != 0:
+        tags["ord2"] = str(data[126])
+    return tags
+
+
+def _vorbis_comments(data: bytes) -> dict[str, str]:
+    """Parse a block of Vorbis comments."""
+    keys = TAG_KEYS["vorbis"]
+    tags: dict[str, str] = {}
+    vendor_len: int = struct.unpack_from("<I", data, 0)[0]
+    pos: int = 4 + vendor_len
+    count: int = struct.unpack_from("<I", data, pos)[0]
+    pos += 4
+    for _ in range(count):
+        clen: int = struct.unpack_from("<I", data, pos)[0]
+        name, _, value = data[pos+4:pos+4+clen].partition(b"=")
+        pos += 4 + clen
+        key = keys.get(name.decode("ascii", "replace").upper())
+        if key is not None and key not in tags:
+            tags[key] = value.decode("utf-8", "replace").strip()
+    return tags
+
+
+def _read_flac(fh: IO[bytes]) -> dict[str, str]:
+    """Read the Vorbis comments from the metadata blocks of a FLAC file,
+    skipping the other blocks."""
+    if fh.read(4) != b"fLaC":
+        return {}
+    while True:
+        header: bytes = fh.read(4)
+        if len(header) < 4:
+            return {}
+        last: bool = header[0] & 0x80 != 0
+        btype: int = header[0] & 0x7f
+        length: int = int.from_bytes(header[1:4], "big")
+        if btype == 4:
+            return _vorbis_comments(fh.read(length))
+        if last:
+            return {}
+        fh.seek(length, os.SEEK_CUR)
+
+
+def _read_ogg(fh: IO[bytes]) -> dict[str, str]:
+    """Read the comment header from the first pages of an Ogg Vorbis or Opus
+    file. It is the second packet in the stream."""
+    packets: list[bytes] = []
+    current = bytearray()
+    while len(packets) < 2:
+        header: bytes = fh.read(27)
+        if len(header) < 27 or not header.startswith(b"OggS"):
+            return {}
+        lacing: bytes = fh.read(header[26])
+        data: bytes = fh.read(sum(lacing))
+        pos: int = 0
+        for seglen in lacing:
+            current += data[pos:pos+seglen]
+            pos += seglen
+            if seglen < 255:
+                packets.append(bytes(current))
+                current.clear()
+                if len(packets) == 2:
+                    break
+        if len(current) > MAX_TAG_SIZE:
+            return {}
+
+    comments: bytes = packets[1]
+    if comments.startswith(b"\x03vorbis"):
+        return _vorbis_comments(comments[7:])
+    if comments.startswith(b"OpusTags"):
+        return _vorbis_comments(comments[8:])
+    return {}
+
+
+def _read_mutagen(path: str) -> dict[str, str]:
+    """Let mutagen read the tags of a file we do not know how to handle."""
+    try:
+        meta = mutagen.File(path, easy=True)
+    except mutagen.MutagenError:
+        return {}
+    if meta is None or meta.tags is None:
+        return {}
+    tags: dict[str, str] = {}
+    for name, key in TAG_KEYS["easy"].items():
+        if name in meta.tags and len(meta.tags[name]) > 0:
+            tags[key] = str(meta.tags[name][0])
+    return tags
+
+
 # Local Variables: #
 # python-indent: 4 #
 # End: #
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-02-27 15:02:38 krylon>
+# Time-stamp: <2026-10-18 07:54:53 krylon>
 #
 # /data/code/python/pythia/extractor/base.py
 # created on 24. 02. 2024
@@ -19,13 +19,24 @@ pythia.extractor.base
 
 import logging
 from abc import ABC, abstractmethod
+from typing import ClassVar
 
 from pythia import common
 from pythia.data import File
 
 
 class Extractor(ABC):  # pylint: disable-msg=R0903
-    """Abstract base class for the various extractors."""
+    """Abstract base class for the various extractors.
+
+    Subclasses declare which files they handle, by suffix (lowercase, without
+    the dot), by MIME type, and by the magic bytes the files start with.
+    Instances are long-lived and get reused for many files, so process must
+    not keep any state between calls.
+
+    Extractors that set dedup are expensive enough that it pays off to hash
+    each file first and reuse the content of a copy we have already seen.
+    For the cheap ones, hashing the whole file costs about as much as the
+    extraction itself."""
 
     __slots__ = [
         "name",
@@ -35,15 +46,40 @@ class Extractor(ABC):  # pylint: disable-msg=R0903
     log: logging.Logger
     name: str
 
+    suffixes: ClassVar[tuple[str, ...]] = ()
+    mime_types: ClassVar[tuple[str, ...]] = ()
+    magic: ClassVar[tuple[bytes, ...]] = ()
+    dedup: ClassVar[bool] = False
+
     def __init__(self) -> None:
         self.name = self.__class__.__name__
         self.log = common.get_logger(self.name)
 
+    @classmethod
+    def sniff(cls, head: bytes) -> bool:
+        """Check if a file, given its first few bytes, looks like something
+        we can handle."""
+        return any(head.startswith(m) for m in cls.magic)
+
     @abstractmethod
     def process(self, f: File) -> bool:
         """Process a file, attempt to extract content and metadata."""
 
 
+def utf8_size(text: str) -> int:
+    """Return the size of text in bytes, as it is stored in the database."""
+    return len(text.encode("utf-8"))
+
+
+def truncate(text: str, max_bytes: int) -> str:
+    """Cut text down to at most max_bytes bytes of UTF-8, without splitting
+    a character."""
+    data: bytes = text.encode("utf-8")
+    if len(data) <= max_bytes:
+        return text
+    return data[:max_bytes].decode("utf-8", "ignore")
+
+
 # Local Variables: #
 # python-indent: 4 #
 # End: #
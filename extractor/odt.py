@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-02-27 15:02:54 krylon>
+# Time-stamp: <2026-10-18 07:41:28 krylon>
 #
 # /data/code/python/pythia/extractor/odt.py
 # created on 26. 02. 2024
@@ -17,16 +17,92 @@ pythia.extractor.odt
 (c) 2024 Benjamin Walkenhorst
 """
 
-from pythia.data import File
+import zipfile
+from typing import Any, Final
+
+from pythia.data import File, FileType
 from pythia.extractor.base import Extractor
+from pythia.extractor.xmltext import (MAX_BYTES, TextBuffer, block_text,
+                                      iter_blocks, qname, read_meta)
+
+NS_TEXT: Final[str] = "urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+NS_OFFICE: Final[str] = "urn:oasis:names:tc:opendocument:xmlns:office:1.0"
+
+BLOCKS: Final[frozenset[str]] = frozenset((
+    qname(NS_TEXT, "p"),
+    qname(NS_TEXT, "h"),
+))
+
+SPECIAL: Final[dict[str, str]] = {
+    qname(NS_TEXT, "s"): " ",
+    qname(NS_TEXT, "tab"): "\t",
+    qname(NS_TEXT, "line-break"): "\n",
+}
+
+# Annotations and tracked changes are not part of the text as it appears in
+# the document.
+SKIP: Final[frozenset[str]] = frozenset((
+    qname(NS_OFFICE, "annotation"),
+    qname(NS_TEXT, "tracked-changes"),
+))
 
 
 class ODTExtractor(Extractor):  # pylint: disable-msg=R0903
-    """Extractor for ODF text documents"""
+    """Extractor for ODF documents: text, spreadsheets, presentations
+
+    content.xml is decompressed and parsed as a stream, paragraph by
+    paragraph, so even huge spreadsheets do not use much memory."""
+
+    suffixes = ("odt", "ott", "ods", "ots", "odp", "otp", "odg")
+    dedup = True
+    mime_types = (
+        "application/vnd.oasis.opendocument.text",
+        "application/vnd.oasis.opendocument.spreadsheet",
+        "application/vnd.oasis.opendocument.presentation",
+        "application/vnd.oasis.opendocument.graphics",
+    )
+    magic = (b"PK\x03\x04", )
+
+    __slots__ = [
+        "max_bytes",
+    ]
+
+    max_bytes: int
+
+    def __init__(self, max_bytes: int = MAX_BYTES) -> None:
+        super().__init__()
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def sniff(cls, head: bytes) -> bool:
+        """ODF files are zip archives that start with an uncompressed member
+        called mimetype."""
+        return head.startswith(cls.magic[0]) and \
+            head[30:38] == b"mimetype" and \
+            head[38:73] == b"application/vnd.oasis.opendocument"
 
     def process(self, f: File) -> bool:
-        """Attempt to extract metadata from ODF Documents"""
-        return False
+        """Attempt to extract metadata and text from ODF Documents"""
+        with zipfile.ZipFile(f.path) as zf:
+            names = set(zf.namelist())
+            if "content.xml" not in names:
+                return False
+            meta: dict[str, Any] = {}
+            if "meta.xml" in names:
+                with zf.open("meta.xml") as fh:
+                    meta = read_meta(fh, qname(NS_OFFICE, "meta"))
+
+            buf = TextBuffer(self.max_bytes)
+            with zf.open("content.xml") as fh:
+                for block in iter_blocks(fh, BLOCKS):
+                    if not buf.add(block_text(block, SPECIAL, SKIP)):
+                        meta["truncated"] = "bytes"
+                        break
+
+        f.content_type = FileType.Document
+        f.meta = meta
+        f.content = buf.text()
+        return True
 
 # Local Variables: #
 # python-indent: 4 #
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:41:28 krylon>
+#
+# /data/code/python/pythia/extractor/ooxml.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.extractor.ooxml
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import re
+import zipfile
+from typing import Any, Final, NamedTuple
+
+from pythia.data import File, FileType
+from pythia.extractor.base import Extractor
+from pythia.extractor.xmltext import (MAX_BYTES, TextBuffer, block_text,
+                                      iter_blocks, qname, read_meta)
+
+NS_WORD: Final[str] = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+NS_SHEET: Final[str] = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_DRAWING: Final[str] = "http://schemas.openxmlformats.org/drawingml/2006/main"
+NS_CORE: Final[str] = \
+    "http://schemas.openxmlformats.org/package/2006/metadata/core-properties"
+NS_APP: Final[str] = \
+    "http://schemas.openxmlformats.org/officeDocument/2006/extended-properties"
+
+SLIDE_PAT: Final[re.Pattern] = re.compile("^ppt/slides/slide(\\d+)[.]xml$")
+
+
+class Format(NamedTuple):
+    """Format describes where to find the text in one kind of document."""
+    members: tuple[str, ...]
+    blocks: frozenset[str]
+    special: dict[str, str]
+    skip: frozenset[str]
+
+
+FORMATS: Final[dict[str, Format]] = {
+    "word": Format(
+        ("word/document.xml", ),
+        frozenset((qname(NS_WORD, "p"), )),
+        {
+            qname(NS_WORD, "tab"): "\t",
+            qname(NS_WORD, "br"): "\n",
+            qname(NS_WORD, "cr"): "\n",
+        },
+        # Field codes and deleted text do not appear in the document.
+        frozenset((qname(NS_WORD, "instrText"), qname(NS_WORD, "delText"))),
+    ),
+    # The text in a spreadsheet is kept in one table of shared strings.
+    "xl": Format(
+        ("xl/sharedStrings.xml", ),
+        frozenset((qname(NS_SHEET, "si"), )),
+        {},
+        # Phonetic hints for East Asian text
+        frozenset((qname(NS_SHEET, "rPh"), )),
+    ),
+    # The slides are filled in by _members.
+    "ppt": Format(
+        (),
+        frozenset((qname(NS_DRAWING, "p"), )),
+        {
+            qname(NS_DRAWING, "br"): "\n",
+        },
+        frozenset(),
+    ),
+}
+
+
+def _members(fmt: Format, names: list[str]) -> tuple[str, ...]:
+    """Return the members of the archive we need to look at, in order."""
+    if len(fmt.members) > 0:
+        return tuple(m for m in fmt.members if m in names)
+    slides: list[tuple[int, str]] = []
+    for name in names:
+        m = SLIDE_PAT.match(name)
+        if m is not None:
+            slides.append((int(m[1]), name))
+    return tuple(name for _, name in sorted(slides))
+
+
+class OOXMLExtractor(Extractor):  # pylint: disable-msg=R0903
+    """Extractor for Office Open XML documents: docx, xlsx, pptx
+
+    Just like ODF documents, the XML files in the archive are decompressed
+    and parsed as a stream."""
+
+    suffixes = ("docx", "docm", "xlsx", "xlsm", "pptx", "pptm")
+    dedup = True
+    mime_types = (
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    )
+    magic = (b"PK\x03\x04", )
+
+    __slots__ = [
+        "max_bytes",
+    ]
+
+    max_bytes: int
+
+    def __init__(self, max_bytes: int = MAX_BYTES) -> None:
+        super().__init__()
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def sniff(cls, head: bytes) -> bool:
+        """OOXML files are zip archives, the first member is usually the
+        list of content types."""
+        return head.startswith(cls.magic[0]) and head[30:49] == b"[Content_Types].xml"
+
+    def process(self, f: File) -> bool:
+        """Attempt to extract metadata and text from an OOXML document."""
+        with zipfile.ZipFile(f.path) as zf:
+            names = zf.namelist()
+            fmt = None
+            for prefix, candidate in FORMATS.items():
+                if any(n.startswith(prefix + "/") for n in names):
+                    fmt = candidate
+                    break
+            if fmt is None:
+                return False
+
+            meta: dict[str, Any] = {}
+            if "docProps/core.xml" in names:
+                with zf.open("docProps/core.xml") as fh:
+                    meta.update(read_meta(fh, qname(NS_CORE, "coreProperties")))
+            if "docProps/app.xml" in names:
+                with zf.open("docProps/app.xml") as fh:
+                    app = read_meta(fh, qname(NS_APP, "Properties"))
+                for key in ("Application", "Pages", "Words", "Slides"):
+                    if key in app:
+                        meta[key.lower()] = app[key]
+
+            buf = TextBuffer(self.max_bytes)
+            for member in _members(fmt, names):
+                with zf.open(member) as fh:
+                    for block in iter_blocks(fh, fmt.blocks):
+                        if not buf.add(block_text(block, fmt.special, fmt.skip)):
+                            break
+                if buf.full():
+                    meta["truncated"] = "bytes"
+                    break
+
+        f.content_type = FileType.Document
+        f.meta = meta
+        f.content = buf.text()
+        return True
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-02-27 15:05:06 krylon>
+# Time-stamp: <2026-10-18 07:54:53 krylon>
 #
 # /data/code/python/pythia/extractor/pdf.py
 # created on 26. 02. 2024
@@ -17,36 +17,129 @@ pythia.extractor.pdf
 (c) 2024 Benjamin Walkenhorst
 """
 
-from pdfminer.high_level import extract_text
-from pdfminer.pdfdocument import PDFDocument
+import io
+import time
+from typing import Any, Final, Iterator
+
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfdocument import PDFDocument, PDFNoOutlines
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
 from pdfminer.pdfparser import PDFParser
-from pythia.data import File
-from pythia.extractor.base import Extractor
+from pdfminer.pdftypes import resolve1
+from pdfminer.utils import decode_text
+from pythia.data import File, FileType
+from pythia.extractor.base import Extractor, truncate, utf8_size
+
+# Default limits per document. Once one of them is reached, we stop extracting
+# text and keep what we have so far.
+MAX_PAGES: Final[int] = 500
+MAX_BYTES: Final[int] = 16 * 2**20
+MAX_TIME: Final[float] = 60.0
 
 
 class PDFExtractor(Extractor):  # pylint: disable-msg=R0903
-    """Exctractor for PDF files"""
+    """Exctractor for PDF files
+
+    The document is parsed once, the text is extracted page by page, within
+    limits on the number of pages, the amount of text (in bytes of UTF-8),
+    and the time spent."""
+
+    suffixes = ("pdf", )
+    dedup = True
+    mime_types = ("application/pdf", )
+    magic = (b"%PDF-", )
+
+    __slots__ = [
+        "max_pages",
+        "max_bytes",
+        "max_time",
+    ]
+
+    max_pages: int
+    max_bytes: int
+    max_time: float
+
+    def __init__(self,
+                 max_pages: int = MAX_PAGES,
+                 max_bytes: int = MAX_BYTES,
+                 max_time: float = MAX_TIME) -> None:
+        super().__init__()
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.max_time = max_time
 
     def process(self, f: File) -> bool:
-        """Attempt to extract metadata from a PDF document."""
+        """Attempt to extract metadata and text from a PDF document."""
+        f.content_type = FileType.PDF
         with open(f.path, "rb") as fh:
             parser = PDFParser(fh)
             doc = PDFDocument(parser)
-            metadata = {}
-            for key, val in doc.info[0].items():
-                metadata[key] = val.decode()
+            metadata = self.__read_meta(doc)
 
-            outlines = []
-            for i in doc.get_outlines():
-                outlines.append(i[1])
+            if not doc.is_extractable:
+                f.meta = metadata
+                f.content = ""
+                return True
 
-            if len(outlines) > 0:
-                metadata["chapters"] = outlines
+            text: list[str] = []
+            size: int = 0
+            for page in self.__pages(doc, metadata):
+                text.append(page)
+                size += utf8_size(page)
+                if size >= self.max_bytes:
+                    metadata["truncated"] = "bytes"
+                    break
 
             f.meta = metadata
-        f.content = extract_text(f.path)
+            f.content = truncate("".join(text), self.max_bytes)
         return True
 
+    def __read_meta(self, doc: PDFDocument) -> dict[str, Any]:
+        """Read the document info dictionary and the outline."""
+        metadata: dict[str, Any] = {}
+        for info in doc.info:
+            for key, val in info.items():
+                val = resolve1(val)
+                if isinstance(val, bytes):
+                    metadata[key] = decode_text(val)
+                elif isinstance(val, (str, int, float)):
+                    metadata[key] = val
+
+        outlines = []
+        try:
+            for i in doc.get_outlines():
+                outlines.append(i[1])
+        except PDFNoOutlines:
+            pass
+
+        if len(outlines) > 0:
+            metadata["chapters"] = outlines
+        return metadata
+
+    def __pages(self, doc: PDFDocument, metadata: dict[str, Any]) -> Iterator[str]:
+        """Yield the text of the document, one page at a time.
+
+        If we run into the page or time limit, we note so in the metadata."""
+        rsrc = PDFResourceManager()
+        buf = io.StringIO()
+        with TextConverter(rsrc, buf, laparams=LAParams()) as device:
+            interpreter = PDFPageInterpreter(rsrc, device)
+            deadline: Final[float] = time.monotonic() + self.max_time
+            for cnt, page in enumerate(PDFPage.create_pages(doc)):
+                if cnt >= self.max_pages:
+                    metadata["truncated"] = "pages"
+                    return
+                if time.monotonic() > deadline:
+                    metadata["truncated"] = "time"
+                    self.log.info("Time limit reached after %d pages", cnt)
+                    return
+                interpreter.process_page(page)
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+
 # Local Variables: #
 # python-indent: 4 #
 # End: #
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 06:29:07 krylon>
+#
+# /data/code/python/pythia/extractor/text.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.extractor.text
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import codecs
+import mmap
+import os
+from typing import Final, Optional
+
+from pythia.data import File, FileType
+from pythia.extractor.base import Extractor
+
+# By default, we index at most this many bytes of a file. Log files can get
+# very large, but the first few MB should give us enough to search for.
+MAX_BYTES: Final[int] = 4 * 2**20
+# We decode the file in chunks of this size.
+CHUNK_SIZE: Final[int] = 256 * 1024
+# How many bytes we look at to decide if a file is text at all.
+SNIFF_SIZE: Final[int] = 4096
+# If a file is not valid UTF-8, we assume it is some legacy 8-bit encoding.
+FALLBACK_ENCODING: Final[str] = "cp1252"
+
+BOMS: Final[tuple[tuple[bytes, str], ...]] = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# Control characters other than these do not usually occur in text files.
+TEXT_CONTROLS: Final[bytes] = b"\t\n\v\f\r\x1b"
+_CONTROLS: Final[bytes] = bytes(c for c in range(32) if c not in TEXT_CONTROLS) + b"\x7f"
+
+
+def detect_bom(head: bytes) -> Optional[str]:
+    """If the data starts with a byte order mark, return the encoding it
+    indicates."""
+    for bom, enc in BOMS:
+        if head.startswith(bom):
+            return enc
+    return None
+
+
+def looks_like_text(head: bytes) -> bool:
+    """Guess if the given data, the beginning of a file, is text."""
+    if detect_bom(head) is not None:
+        return True
+    if b"\0" in head:
+        return False
+    if len(head) == 0:
+        return True
+    # bytes.translate with a deletechars argument runs in C, which is a lot
+    # faster than looking at each byte in Python.
+    controls: int = len(head) - len(head.translate(None, _CONTROLS))
+    return controls * 10 < len(head)
+
+
+class TextExtractor(Extractor):  # pylint: disable-msg=R0903
+    """Extractor for plain text files, like notes, logs and source code.
+
+    The file is memory-mapped and decoded in chunks, at most max_bytes of it,
+    so even huge log files do not end up in memory as a whole."""
+
+    suffixes = (
+        "txt", "text", "md", "markdown", "org", "rst", "tex", "log", "csv", "tsv",
+        "json", "yaml", "yml", "toml", "ini", "cfg", "conf", "xml", "html", "htm",
+        "py", "pl", "rb", "lua", "sh", "bash", "zsh", "el", "lisp", "scm", "sql",
+        "c", "h", "cc", "cpp", "hpp", "java", "go", "rs", "js", "ts", "css",
+    )
+    mime_types = (
+        "text/plain",
+        "text/markdown",
+        "text/csv",
+        "text/x-python",
+        "text/x-sh",
+        "application/json",
+    )
+
+    __slots__ = [
+        "max_bytes",
+    ]
+
+    max_bytes: int
+
+    def __init__(self, max_bytes: int = MAX_BYTES) -> None:
+        super().__init__()
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def sniff(cls, head: bytes) -> bool:
+        """Files without a suffix, like README or Makefile, are often text."""
+        return len(head) > 0 and looks_like_text(head)
+
+    def process(self, f: File) -> bool:
+        """Extract the text from a file."""
+        f.content_type = FileType.Text
+        with open(f.path, "rb") as fh:
+            size: int = os.fstat(fh.fileno()).st_size
+            if size == 0:
+                f.meta = {}
+                f.content = ""
+                return True
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                head: bytes = mm[:SNIFF_SIZE]
+                if not looks_like_text(head):
+                    f.meta = {"binary": True}
+                    f.content = ""
+                    return True
+                enc, text = self.__decode(mm, min(size, self.max_bytes), detect_bom(head))
+
+        f.meta = {"encoding": enc}
+        if size > self.max_bytes:
+            f.meta["truncated"] = "bytes"
+        f.content = text
+        return True
+
+    def __decode(self, mm: mmap.mmap, limit: int, enc: Optional[str]) -> tuple[str, str]:
+        """Decode the first limit bytes of the file, chunk by chunk.
+
+        Unless there is a byte order mark, we start out with UTF-8 and switch
+        to the fallback encoding at the first chunk that is not valid UTF-8."""
+        if enc is None:
+            enc = "utf-8"
+            decoder = codecs.getincrementaldecoder(enc)("strict")
+        else:
+            decoder = codecs.getincrementaldecoder(enc)("replace")
+        parts: list[str] = []
+
+        for offset in range(0, limit, CHUNK_SIZE):
+            chunk: bytes = mm[offset:min(offset + CHUNK_SIZE, limit)]
+            pending: bytes = decoder.getstate()[0]
+            try:
+                parts.append(decoder.decode(chunk))
+            except UnicodeDecodeError:
+                enc = FALLBACK_ENCODING
+                decoder = codecs.getincrementaldecoder(enc)("replace")
+                parts.append(decoder.decode(pending + chunk))
+
+        try:
+            parts.append(decoder.decode(b"", final=True))
+        except UnicodeDecodeError:
+            # We cut off the file in the middle of a character.
+            pass
+        return enc, "".join(parts)
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
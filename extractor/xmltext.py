@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:54:53 krylon>
+#
+# /data/code/python/pythia/extractor/xmltext.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.extractor.xmltext
+
+(c) 2026 Benjamin Walkenhorst
+
+Helpers to pull the text out of the XML files that office documents are made
+of, without building a tree of the whole document in memory.
+"""
+
+import xml.etree.ElementTree as ET
+from typing import IO, Any, Final, Iterator, Mapping
+
+from pythia.extractor.base import truncate, utf8_size
+
+# The default size limit for the text we extract from an office document, in
+# bytes of UTF-8.
+MAX_BYTES: Final[int] = 16 * 2**20
+
+
+def qname(ns: str, tag: str) -> str:
+    """Return a tag name in the notation ElementTree uses."""
+    return f"{{{ns}}}{tag}"
+
+
+def local_name(tag: str) -> str:
+    """Strip the namespace from a tag name."""
+    return tag.rpartition("}")[2]
+
+
+def block_text(elem: ET.Element,
+               special: Mapping[str, str],
+               skip: frozenset[str] = frozenset()) -> str:
+    """Return the text of an element and its descendants.
+
+    Elements whose tag is in special, like tabs or line breaks, are replaced by
+    the corresponding string. The text of elements whose tag is in skip is
+    ignored, but not their tail."""
+    parts: list[str] = []
+    _collect(elem, parts, special, skip)
+    return "".join(parts)
+
+
+def _collect(elem: ET.Element,
+             parts: list[str],
+             special: Mapping[str, str],
+             skip: frozenset[str]) -> None:
+    if elem.text:
+        parts.append(elem.text)
+    for child in elem:
+        if child.tag in special:
+            parts.append(special[child.tag])
+        elif child.tag not in skip:
+            _collect(child, parts, special, skip)
+        if child.tail:
+            parts.append(child.tail)
+
+
+def iter_blocks(stream: IO[bytes], blocks: frozenset[str]) -> Iterator[ET.Element]:
+    """Parse an XML document incrementally, and yield the elements whose tag
+    is in blocks, like paragraphs, once they are complete.
+
+    Everything else is discarded as soon as the parser is done with it, and
+    so are the blocks once the caller is done with them, so the memory we need
+    depends on the size of the largest block, not the size of the document."""
+    stack: list[ET.Element] = []
+    depth: int = 0  # How many blocks we are inside of
+
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            if elem.tag in blocks:
+                depth += 1
+            continue
+
+        stack.pop()
+        if elem.tag in blocks:
+            depth -= 1
+            if depth == 0:
+                yield elem
+        if depth == 0:
+            # All siblings before elem have been removed already, so elem is
+            # the parent's only child, and removing it is cheap.
+            elem.clear()
+            if len(stack) > 0:
+                stack[-1].remove(elem)
+
+
+def read_meta(stream: IO[bytes], container: str) -> dict[str, Any]:
+    """Read a metadata file that consists of a container element with simple
+    elements in it, like an ODF meta.xml.
+
+    The local names of the elements become the keys, unless an element has
+    a name attribute, like user-defined fields. Elements that occur more than
+    once end up as a list, elements without text contribute their attributes
+    instead."""
+    meta: dict[str, Any] = {}
+    for elem in iter_blocks(stream, frozenset((container, ))):
+        for child in elem:
+            key = local_name(child.tag)
+            for akey, aval in child.attrib.items():
+                if local_name(akey) == "name":
+                    key = aval
+            text = (child.text or "").strip()
+            if text == "":
+                for akey, aval in child.attrib.items():
+                    meta[local_name(akey)] = aval
+            elif key in meta:
+                if not isinstance(meta[key], list):
+                    meta[key] = [meta[key]]
+                meta[key].append(text)
+            else:
+                meta[key] = text
+    return meta
+
+
+class TextBuffer:
+    """TextBuffer collects text up to a size limit, in bytes of UTF-8."""
+
+    __slots__ = [
+        "parts",
+        "size",
+        "max_bytes",
+    ]
+
+    parts: list[str]
+    size: int
+    max_bytes: int
+
+    def __init__(self, max_bytes: int) -> None:
+        self.parts = []
+        self.size = 0
+        self.max_bytes = max_bytes
+
+    def full(self) -> bool:
+        """Return True if we have collected enough text."""
+        return self.size >= self.max_bytes
+
+    def add(self, text: str) -> bool:
+        """Add a piece of text, return False if the buffer is full."""
+        if text != "":
+            self.parts.append(text)
+            self.size += utf8_size(text) + 1
+        return not self.full()
+
+    def text(self) -> str:
+        """Return the text we have collected, one block per line."""
+        return truncate("\n".join(self.parts), self.max_bytes)
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-02-27 15:10:50 krylon>
+# Time-stamp: <2026-10-18 07:52:01 krylon>
 #
 # /data/code/python/pythia/inspector.py
 # created on 26. 02. 2024
@@ -17,27 +17,177 @@ pythia.inspector
 (c) 2024 Benjamin Walkenhorst
 """
 
+from threading import Lock
+from typing import Final, Optional, Sequence
 
-from pythia import common
-from pythia.data import File
+from pythia import common, database
+from pythia.data import Failure, FailureKind, File
+from pythia.extractor.audio import AudioExtractor
 from pythia.extractor.base import Extractor
+from pythia.extractor.odt import ODTExtractor
+from pythia.extractor.ooxml import OOXMLExtractor
 from pythia.extractor.pdf import PDFExtractor
-from pythia.extractor.audio import AudioExtractor
+from pythia.extractor.text import TextExtractor
+
+# How many bytes we read from the start of a file to look for magic numbers.
+SNIFF_SIZE: Final[int] = 512
+
+
+class Registry:
+    """Registry knows which Extractor handles which files.
+
+    Most files are dispatched by their suffix, with a single dictionary lookup.
+    Only if a file has no suffix, or more than one Extractor claims the suffix,
+    we read the first few bytes of the file and look for magic numbers.
+
+    Each Extractor is instantiated once, when it is first needed, and then
+    reused for all files it handles."""
+
+    __slots__ = [
+        "classes",
+        "by_suffix",
+        "by_mime",
+        "instances",
+        "lock",
+    ]
+
+    classes: list[type[Extractor]]
+    by_suffix: dict[str, list[type[Extractor]]]
+    by_mime: dict[str, type[Extractor]]
+    instances: dict[type[Extractor], Extractor]
+    lock: Lock
+
+    def __init__(self, *classes: type[Extractor]) -> None:
+        self.classes = []
+        self.by_suffix = {}
+        self.by_mime = {}
+        self.instances = {}
+        self.lock = Lock()
+        for cls in classes:
+            self.register(cls)
+
+    def register(self, cls: type[Extractor]) -> None:
+        """Add an Extractor class to the Registry."""
+        self.classes.append(cls)
+        for suffix in cls.suffixes:
+            self.by_suffix.setdefault(suffix, []).append(cls)
+        for mime in cls.mime_types:
+            self.by_mime.setdefault(mime, cls)
+
+    def lookup(self, f: File) -> Optional[type[Extractor]]:
+        """Find the Extractor class for the given File, if there is one."""
+        suffix: str = f.suffix()
+        candidates = self.by_suffix.get(suffix)
+        if candidates is not None:
+            if len(candidates) == 1:
+                return candidates[0]
+        elif suffix != "":
+            return self.by_mime.get(f.mime_type)
+        else:
+            candidates = self.classes
+        return self.__sniff(f, candidates)
+
+    def __sniff(self, f: File, candidates: Sequence[type[Extractor]]) -> Optional[type[Extractor]]:
+        """Look at the first few bytes of the File to find an Extractor."""
+        try:
+            with open(f.path, "rb") as fh:
+                head: bytes = fh.read(SNIFF_SIZE)
+        except OSError:
+            return None
+        for cls in candidates:
+            if cls.sniff(head):
+                return cls
+        return None
+
+    def get(self, f: File) -> Optional[Extractor]:
+        """Return the Extractor instance for the given File, if there is one."""
+        cls = self.lookup(f)
+        if cls is None:
+            return None
+        ex = self.instances.get(cls)
+        if ex is None:
+            with self.lock:
+                ex = self.instances.get(cls)
+                if ex is None:
+                    ex = cls()
+                    self.instances[cls] = ex
+        return ex
+
+
+# TextExtractor's sniffing accepts almost anything that is not binary, so it
+# has to come last.
+registry: Final[Registry] = Registry(PDFExtractor,
+                                     ODTExtractor,
+                                     OOXMLExtractor,
+                                     AudioExtractor,
+                                     TextExtractor)
+
+
+class Timeout(BaseException):
+    """Raised when processing a file takes too long.
+
+    It is raised from a signal handler, i.e. anywhere in an Extractor, so it
+    must not be caught by the Extractors' handlers for Exception."""
 
 
 class Inspector:  # pylint: disable-msg=R0903
-    """Inspector deals with file content."""
+    """Inspector deals with file content.
+
+    If the Inspector has a Database, it skips the extraction for files whose
+    content we have already seen, e.g. copies of the same document. We only
+    look for copies if the Extractor is expensive, the others are cheaper to
+    run than hashing the file."""
 
-    def __init__(self) -> None:
+    def __init__(self, db: Optional[database.Database] = None) -> None:
         self.log = common.get_logger("Inspector")
+        self.db = db
 
-    def get_extractor(self, f: File) -> Extractor:
+    def get_extractor(self, f: File) -> Optional[Extractor]:
         """Attempt to find the right Extractor for the given File."""
-        match f.suffix():
-            case "pdf":
-                return PDFExtractor()
-            case "mp3" | "ogg" | "flac" | "opus":
-                return AudioExtractor()
+        return registry.get(f)
+
+    def inspect(self, f: File) -> Optional[Failure]:
+        """Run the appropriate Extractor on the given File, if there is one.
+
+        Returns a Failure if the Extractor did not succeed, None otherwise."""
+        ex = self.get_extractor(f)
+        if ex is None:
+            return None
+        failure: Failure
+        try:
+            if self.db is not None and ex.dedup:
+                meta = self.db.blob_get_meta(f.compute_hash())
+                if meta is not None:
+                    # The content is already in the database, so we do not
+                    # need to carry it around.
+                    f.meta = meta
+                    f.content = ""
+                    f.shared = True
+                    return None
+            f.shared = False
+            if ex.process(f):
+                return None
+            failure = Failure(path=f.path,
+                              kind=FailureKind.Error,
+                              message=f"{ex.name} could not process the file")
+        except Timeout:
+            self.log.error("%s took too long to process %s", ex.name, f.path)
+            failure = Failure(path=f.path,
+                              kind=FailureKind.Timeout,
+                              message=f"{ex.name} took too long")
+        except Exception as err:  # pylint: disable-msg=W0718
+            self.log.error("%s failed to process %s: %s - %s",
+                           ex.name,
+                           f.path,
+                           err.__class__.__name__,
+                           err)
+            failure = Failure(path=f.path,
+                              kind=FailureKind.Error,
+                              message=f"{ex.name}: {err.__class__.__name__} - {err}")
+        # Without a hash, a failed extraction does not end up being used for
+        # other files with the same content.
+        f.hash = ""
+        return failure
 
 
 # Local Variables: #
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:46:26 krylon>
+#
+# /data/code/python/pythia/metrics.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.metrics
+
+(c) 2026 Benjamin Walkenhorst
+
+Counters, gauges, and histograms that tell us what the Crawler and the
+database are up to, exported as JSON or in the Prometheus text format.
+
+Metrics are disabled by default. As long as they are, the Registry hands out
+a dummy metric whose methods do nothing, so instrumented code costs next to
+nothing. Components look up their metrics when they are created, so metrics
+have to be enabled before that.
+"""
+
+import json
+import os
+import time
+import tomllib
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Final, Optional, Union
+
+from pythia import common
+
+# Upper bounds of the default histogram buckets, in seconds.
+DEFAULT_BUCKETS: Final[tuple[float, ...]] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+# How often the Exporter writes the metrics to a file, in seconds.
+EXPORT_INTERVAL: Final[float] = 15.0
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Counter:
+    """Counter is a value that only goes up, like the number of files
+    processed."""
+
+    __slots__ = ["value", "lock"]
+
+    value: float
+    lock: Lock
+
+    def __init__(self) -> None:
+        self.value = 0
+        self.lock = Lock()
+
+    def inc(self, n: float = 1) -> None:
+        """Add n to the Counter."""
+        with self.lock:
+            self.value += n
+
+    def sample(self) -> float:
+        """Return the current value."""
+        return self.value
+
+
+class Gauge:
+    """Gauge is a value that can go up and down, like the length of a
+    queue. If the Gauge has a function, it is called to get the value
+    whenever the Gauge is sampled."""
+
+    __slots__ = ["value", "fn", "lock"]
+
+    value: float
+    fn: Optional[Callable[[], float]]
+    lock: Lock
+
+    def __init__(self, fn: Optional[Callable[[], float]] = None) -> None:
+        self.value = 0
+        self.fn = fn
+        self.lock = Lock()
+
+    def set(self, value: float) -> None:
+        """Set the Gauge to value."""
+        self.value = value
+
+    def inc(self, n: float = 1) -> None:
+        """Add n to the Gauge."""
+        with self.lock:
+            self.value += n
+
+    def dec(self, n: float = 1) -> None:
+        """Subtract n from the Gauge."""
+        with self.lock:
+            self.value -= n
+
+    def sample(self) -> float:
+        """Return the current value."""
+        if self.fn is not None:
+            return self.fn()
+        return self.value
+
+
+class Histogram:
+    """Histogram counts observations, like durations, in buckets."""
+
+    __slots__ = ["bounds", "counts", "total", "lock"]
+
+    bounds: tuple[float, ...]
+    counts: list[int]
+    total: float
+    lock: Lock
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.bounds = bounds
+        # The last bucket holds everything above the largest bound.
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.lock = Lock()
+
+    def observe(self, value: float) -> None:
+        """Record an observation."""
+        idx: int = bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[idx] += 1
+            self.total += value
+
+    def sample(self) -> dict[str, Any]:
+        """Return the number and sum of the observations, and the cumulative
+        counts per bucket, keyed by their upper bound."""
+        with self.lock:
+            counts = list(self.counts)
+            total = self.total
+        buckets: dict[str, int] = {}
+        cum: int = 0
+        for bound, cnt in zip(self.bounds + (float("inf"), ), counts):
+            cum += cnt
+            buckets[_fmt(bound)] = cum
+        return {"count": cum, "sum": total, "buckets": buckets}
+
+
+class _Null:
+    """_Null stands in for all kinds of metrics while metrics are disabled."""
+
+    __slots__: list[str] = []
+
+    def inc(self, n: float = 1) -> None:
+        """Do nothing."""
+
+    def dec(self, n: float = 1) -> None:
+        """Do nothing."""
+
+    def set(self, value: float) -> None:
+        """Do nothing."""
+
+    def observe(self, value: float) -> None:
+        """Do nothing."""
+
+
+NULL: Final[_Null] = _Null()
+
+Metric = Union[Counter, Gauge, Histogram]
+MetricHandle = Union[Counter, Gauge, Histogram, _Null]
+
+
+class Registry:
+    """Registry holds all metrics. A metric is identified by its name and
+    its labels, e.g. the extraction times are one histogram per Extractor."""
+
+    __slots__ = [
+        "enabled",
+        "lock",
+        "started",
+        "kinds",
+        "metrics",
+    ]
+
+    enabled: bool
+    lock: Lock
+    started: float
+    kinds: dict[str, tuple[type, str]]
+    metrics: dict[str, dict[Labels, Metric]]
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.lock = Lock()
+        self.started = time.time()
+        self.kinds = {}
+        self.metrics = {}
+
+    def enable(self, enabled: bool = True) -> None:
+        """Turn metrics on or off. This only affects metrics that are
+        looked up afterwards."""
+        self.enabled = enabled
+
+    def reset(self) -> None:
+        """Forget all metrics."""
+        with self.lock:
+            self.kinds.clear()
+            self.metrics.clear()
+            self.started = time.time()
+
+    def __get(self, kind: type, name: str, doc: str, labels: dict[str, Any],
+              factory: Callable[[], Metric]) -> Metric:
+        key: Labels = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self.lock:
+            known = self.kinds.setdefault(name, (kind, doc))
+            if known[0] is not kind:
+                raise TypeError(f"Metric {name} is a {known[0].__name__}, not a {kind.__name__}")
+            family = self.metrics.setdefault(name, {})
+            metric = family.get(key)
+            if metric is None:
+                metric = factory()
+                family[key] = metric
+            return metric
+
+    def counter(self, name: str, doc: str, **labels: Any) -> MetricHandle:
+        """Return the Counter with the given name and labels."""
+        if not self.enabled:
+            return NULL
+        return self.__get(Counter, name, doc, labels, Counter)
+
+    def gauge(self,
+              name: str,
+              doc: str,
+              fn: Optional[Callable[[], float]] = None,
+              **labels: Any) -> MetricHandle:
+        """Return the Gauge with the given name and labels. If fn is given,
+        it replaces the Gauge's function."""
+        if not self.enabled:
+            return NULL
+        gauge = self.__get(Gauge, name, doc, labels, lambda: Gauge(fn))
+        assert isinstance(gauge, Gauge)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self,
+                  name: str,
+                  doc: str,
+                  bounds: tuple[float, ...] = DEFAULT_BUCKETS,
+                  **labels: Any) -> MetricHandle:
+        """Return the Histogram with the given name and labels."""
+        if not self.enabled:
+            return NULL
+        return self.__get(Histogram, name, doc, labels, lambda: Histogram(bounds))
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return the current values of all metrics."""
+        with self.lock:
+            families = [(name, self.kinds[name], list(family.items()))
+                        for name, family in self.metrics.items()]
+        now: float = time.time()
+        snap: dict[str, Any] = {
+            "timestamp": now,
+            "uptime": now - self.started,
+            "metrics": {},
+        }
+        for name, (kind, doc), family in families:
+            samples: list[dict[str, Any]] = []
+            for labels, metric in family:
+                try:
+                    value = metric.sample()
+                except Exception:  # pylint: disable-msg=W0718
+                    # A Gauge's function might fail, e.g. once the object it
+                    # looks at is gone.
+                    continue
+                samples.append({"labels": dict(labels), "value": value})
+            snap["metrics"][name] = {
+                "type": kind.__name__.lower(),
+                "help": doc,
+                "samples": samples,
+            }
+        return snap
+
+    def to_json(self) -> str:
+        """Return a snapshot of all metrics as JSON."""
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Return a snapshot of all metrics in the Prometheus text format."""
+        lines: list[str] = []
+        for name, family in self.snapshot()["metrics"].items():
+            lines.append(f"# HELP {name} {_escape(family['help'], False)}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for s in family["samples"]:
+                if family["type"] != "histogram":
+                    lines.append(f"{name}{_labels(s['labels'])} {_fmt(s['value'])}")
+                    continue
+                hist = s["value"]
+                for bound, cnt in hist["buckets"].items():
+                    lbl = _labels(s["labels"] | {"le": bound})
+                    lines.append(f"{name}_bucket{lbl} {cnt}")
+                lines.append(f"{name}_sum{_labels(s['labels'])} {_fmt(hist['sum'])}")
+                lines.append(f"{name}_count{_labels(s['labels'])} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Write a snapshot of all metrics to a file, as JSON if the file
+        name ends in .json, in the Prometheus format otherwise.
+
+        The file is replaced atomically, so a reader never sees half of it."""
+        data: str = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        tmp: str = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(s: str, quotes: bool = True) -> str:
+    s = s.replace("\\", "\\\\").replace("\n", "\\n")
+    if quotes:
+        s = s.replace('"', '\\"')
+    return s
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+registry: Final[Registry] = Registry()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves the metrics at /metrics, and as JSON at /metrics.json."""
+
+    def do_GET(self) -> None:  # pylint: disable-msg=C0116
+        if self.path == "/metrics":
+            body = registry.to_prometheus().encode("utf-8")
+            ctype = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            body = registry.to_json().encode("utf-8")
+            ctype = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint: disable-msg=W0622
+        pass
+
+
+class Exporter:
+    """Exporter periodically writes the metrics to a file, and/or serves
+    them over HTTP on localhost, so Prometheus or whoever else is interested
+    can pick them up."""
+
+    __slots__ = [
+        "log",
+        "path",
+        "interval",
+        "port",
+        "server",
+        "threads",
+        "stopped",
+    ]
+
+    log: Any
+    path: str
+    interval: float
+    port: int
+    server: Optional[ThreadingHTTPServer]
+    threads: list[Thread]
+    stopped: Event
+
+    def __init__(self, path: str = "", interval: float = EXPORT_INTERVAL, port: int = 0) -> None:
+        self.log = common.get_logger("metrics")
+        self.path = path
+        self.interval = interval
+        self.port = port
+        self.server = None
+        self.threads = []
+        self.stopped = Event()
+
+    def start(self) -> None:
+        """Start exporting."""
+        if self.path != "":
+            t = Thread(target=self.__loop, name="metrics", daemon=True)
+            t.start()
+            self.threads.append(t)
+        if self.port > 0:
+            self.server = ThreadingHTTPServer(("127.0.0.1", self.port), _Handler)
+            t = Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def stop(self) -> None:
+        """Stop exporting. The file is written one last time."""
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        for t in self.threads:
+            t.join()
+        self.threads.clear()
+
+    def __loop(self) -> None:
+        while True:
+            stop: bool = self.stopped.wait(self.interval)
+            try:
+                registry.write(self.path)
+            except OSError as err:
+                self.log.error("Cannot write metrics to %s: %s", self.path, err)
+            if stop:
+                break
+
+
+# The Exporter started by configure, if any.
+exporter: Optional[Exporter] = None  # pylint: disable-msg=C0103
+
+
+def configure(config: str = "") -> Optional[Exporter]:
+    """Set up metrics as configured in the metrics table of the settings
+    file, like so:
+
+    [metrics]
+    enabled = true
+    file = "/var/lib/node_exporter/pythia.prom"
+    interval = 15
+    port = 9464
+
+    If metrics are enabled and a file or a port is given, an Exporter is
+    started and returned. An Exporter started by an earlier call is stopped
+    first."""
+    global exporter  # pylint: disable-msg=W0603
+    if exporter is not None:
+        exporter.stop()
+        exporter = None
+    if config == "":
+        config = common.path.config()
+    try:
+        with open(config, "rb") as fh:
+            cfg: dict[str, Any] = tomllib.load(fh).get("metrics", {})
+    except FileNotFoundError:
+        return None
+    except (OSError, tomllib.TOMLDecodeError) as err:
+        common.get_logger("metrics").error("Cannot read %s: %s", config, err)
+        return None
+
+    registry.enable(bool(cfg.get("enabled", False)))
+    if not registry.enabled or (cfg.get("file", "") == "" and cfg.get("port", 0) == 0):
+        return None
+    exporter = Exporter(cfg.get("file", ""),
+                        float(cfg.get("interval", EXPORT_INTERVAL)),
+                        int(cfg.get("port", 0)))
+    exporter.start()
+    return exporter
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 06:47:28 krylon>
+#
+# /data/code/python/pythia/profiler.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.profiler
+
+(c) 2026 Benjamin Walkenhorst
+
+Find out which files and which queries make a crawl slow.
+
+Profiling is off unless enable() or configure() is called. While it is on,
+the Sandbox times every file it hands to an Extractor, and Database
+connections opened afterwards time every statement they execute. The
+slowest files and the queries that took the most time overall end up in a
+report, which the Crawler stores in the database at the end of each run.
+"""
+
+import cProfile
+import heapq
+import io
+import pstats
+import time
+import tomllib
+from datetime import datetime
+from itertools import count
+from threading import Lock
+from typing import Any, Callable, Final, Optional, TypeVar
+
+from pythia import common
+from pythia.data import ProfileEntry, ProfileKind
+
+# How many files and queries we keep in a report.
+TOP_N: Final[int] = 25
+# Files that take longer than this many seconds are profiled with cProfile,
+# if that is enabled.
+THRESHOLD: Final[float] = 5.0
+# How many functions of the cProfile statistics we keep.
+STATS_LINES: Final[int] = 30
+
+T = TypeVar("T")
+
+
+def run_profiled(fn: Callable[[], T], threshold: float) -> tuple[T, str]:
+    """Call fn with cProfile running. If the call takes at least threshold
+    seconds, return the statistics as text along with the result, otherwise
+    an empty string.
+
+    We cannot know beforehand which calls will be slow, so we have to profile
+    all of them, which makes them slower by a factor of two or so."""
+    prof = cProfile.Profile()
+    t0: float = time.perf_counter()
+    prof.enable()
+    try:
+        res: T = fn()
+    finally:
+        prof.disable()
+    if time.perf_counter() - t0 < threshold:
+        return res, ""
+    buf = io.StringIO()
+    pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(STATS_LINES)
+    return res, buf.getvalue()
+
+
+class Profiler:
+    """Profiler collects the timings of files and queries."""
+
+    __slots__ = [
+        "top_n",
+        "threshold",
+        "capture",
+        "lock",
+        "seq",
+        "files",
+        "queries",
+    ]
+
+    top_n: int
+    threshold: float
+    capture: bool
+    lock: Lock
+    seq: count
+    files: list[tuple[float, int, ProfileEntry]]
+    queries: dict[str, list[float]]
+
+    def __init__(self, top_n: int = TOP_N, threshold: float = THRESHOLD,
+                 capture: bool = False) -> None:
+        """Create a Profiler that keeps the top_n slowest files and queries.
+
+        If capture is True, Extractors that take longer than threshold
+        seconds have their cProfile statistics recorded."""
+        self.top_n = top_n
+        self.threshold = threshold
+        self.capture = capture
+        self.lock = Lock()
+        self.seq = count()
+        self.files = []
+        self.queries = {}
+
+    def file(self, path: str, seconds: float, detail: str = "") -> None:
+        """Record the time it took to process a file."""
+        entry = ProfileEntry(kind=ProfileKind.Extract,
+                             subject=path,
+                             seconds=seconds,
+                             longest=seconds,
+                             detail=detail)
+        # A min-heap of the top_n slowest files, the fastest of them on top.
+        item = (seconds, next(self.seq), entry)
+        with self.lock:
+            if len(self.files) < self.top_n:
+                heapq.heappush(self.files, item)
+            elif seconds > self.files[0][0]:
+                heapq.heapreplace(self.files, item)
+
+    def query(self, name: str, seconds: float) -> None:
+        """Record the time it took to execute a query."""
+        with self.lock:
+            stats = self.queries.get(name)
+            if stats is None:
+                self.queries[name] = [1, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                if seconds > stats[2]:
+                    stats[2] = seconds
+
+    def report(self, details: Optional[dict[str, str]] = None) -> list[ProfileEntry]:
+        """Return the slowest files and the queries that took the most time
+        overall, slowest first, and start over.
+
+        details maps query names to a description, e.g. the SQL."""
+        with self.lock:
+            files = self.files
+            queries = self.queries
+            self.files = []
+            self.queries = {}
+        run: Final[datetime] = datetime.now()
+        entries: list[ProfileEntry] = []
+        for _, _, entry in sorted(files, reverse=True):
+            entry.run = run
+            entries.append(entry)
+        top = heapq.nlargest(self.top_n, queries.items(), key=lambda q: q[1][1])
+        for name, (calls, total, longest) in top:
+            entries.append(ProfileEntry(kind=ProfileKind.Query,
+                                        subject=name,
+                                        seconds=total,
+                                        calls=int(calls),
+                                        longest=longest,
+                                        detail=(details or {}).get(name, ""),
+                                        run=run))
+        return entries
+
+
+# The active Profiler, if profiling is enabled.
+active: Optional[Profiler] = None  # pylint: disable-msg=C0103
+
+
+def enable(top_n: int = TOP_N, threshold: float = THRESHOLD, capture: bool = False) -> Profiler:
+    """Turn on profiling. This affects Sandboxes and Database connections
+    created afterwards."""
+    global active  # pylint: disable-msg=W0603
+    active = Profiler(top_n, threshold, capture)
+    return active
+
+
+def disable() -> None:
+    """Turn off profiling."""
+    global active  # pylint: disable-msg=W0603
+    active = None
+
+
+def configure(config: str = "") -> Optional[Profiler]:
+    """Turn on profiling if the settings file says so, like this:
+
+    [profile]
+    enabled = true
+    top = 25
+    threshold = 5.0
+    cprofile = true
+    """
+    if config == "":
+        config = common.path.config()
+    try:
+        with open(config, "rb") as fh:
+            cfg: dict[str, Any] = tomllib.load(fh).get("profile", {})
+    except FileNotFoundError:
+        return None
+    except (OSError, tomllib.TOMLDecodeError) as err:
+        common.get_logger("profiler").error("Cannot read %s: %s", config, err)
+        return None
+
+    if not cfg.get("enabled", False):
+        return None
+    return enable(int(cfg.get("top", TOP_N)),
+                  float(cfg.get("threshold", THRESHOLD)),
+                  bool(cfg.get("cprofile", False)))
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,574 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 06:59:03 krylon>
+#
+# /data/code/python/pythia/query.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.query
+
+(c) 2026 Benjamin Walkenhorst
+
+Parse search queries and compile them to SQL.
+
+A query is a list of terms, all of which have to match:
+
+    word        a word anywhere in the path, metadata, or text of a File
+    word*       a word starting with "word"
+    "a phrase"  a phrase
+    -term       a term that must not match, so does NOT term
+    a OR b      either of two terms, AND is implied between terms
+    ( ... )     grouping
+    key:value   a filter, see below
+
+Filters look at the columns of the file table, or at the metadata:
+
+    type:pdf                a FileType
+    mime:application/*      a MIME type, * is a wildcard
+    path:/home/me/Music     Files below a directory, or matching a pattern
+    folder:/home/me         Files belonging to a Folder
+    modified:>2024-01       the modification time
+    scanned:2024-01..2024-03 the time of the last scan
+    size:>10M               the size in bytes, with k, M, G, or T as suffix
+    artist:"Miles Davis"    any other key matches the metadata, * is a
+                            wildcard, case does not matter
+    meta.type:foo           the metadata, even if the key is that of a filter
+
+Times are given as YYYY, YYYY-MM, or YYYY-MM-DD, and stand for the entire
+year, month, or day. Times and sizes may be prefixed with >, >=, <, or <=,
+or given as a range like a..b.
+
+Metadata keys that have a column of their own, see Database.promote, are
+looked up in the column's index rather than in the metadata of every File.
+"""
+
+import base64
+import binascii
+import json
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Final, Optional, Union
+
+from pythia.data import FileType
+
+
+class QueryError(ValueError):
+    """QueryError indicates a query that cannot be parsed or compiled."""
+
+
+@dataclass(slots=True, kw_only=True)
+class Term:  # pylint: disable-msg=R0903
+    """A word or phrase to look up in the full text index."""
+
+    text: str
+    prefix: bool = False
+
+
+@dataclass(slots=True, kw_only=True)
+class Filter:  # pylint: disable-msg=R0903
+    """A condition on a column or on the metadata of a File."""
+
+    key: str
+    op: str
+    value: str
+
+
+@dataclass(slots=True, kw_only=True)
+class Not:  # pylint: disable-msg=R0903
+    """The negation of a query."""
+
+    node: "Node"
+
+
+@dataclass(slots=True, kw_only=True)
+class And:  # pylint: disable-msg=R0903
+    """Queries that all have to match."""
+
+    nodes: list["Node"]
+
+
+@dataclass(slots=True, kw_only=True)
+class Or:  # pylint: disable-msg=R0903
+    """Queries of which at least one has to match."""
+
+    nodes: list["Node"]
+
+
+Node = Union[Term, Filter, Not, And, Or]
+
+TOKEN_PAT: Final[re.Pattern] = re.compile(r"""
+\s*(?:
+    (?P<paren>[()])
+  | (?P<neg>-)(?=[^\s()])
+  | (?P<key>[A-Za-z_][\w.]*):(?P<value>"(?:[^"\\]|\\.)*"|[^\s()"]+)
+  | (?P<phrase>"(?:[^"\\]|\\.)*")
+  | (?P<word>[^\s()"]+)
+  | (?P<junk>\S)
+)""", re.X)
+OP_PAT: Final[re.Pattern] = re.compile(r"(>=|<=|>|<|=)?(.*)", re.S)
+DATE_PAT: Final[re.Pattern] = re.compile(r"(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?")
+SIZE_PAT: Final[re.Pattern] = re.compile(r"(\d+)\s*([kmgt]?)i?b?", re.I)
+META_KEY_PAT: Final[re.Pattern] = re.compile(r"\w+")
+UNQUOTE_PAT: Final[re.Pattern] = re.compile(r"\\(.)")
+
+# The columns of a File, in the order File.from_db expects them.
+FILE_COLUMNS: Final[str] = """
+    f.id,
+    f.folder_id,
+    f.path,
+    f.time_scanned,
+    f.mtime,
+    f.size,
+    f.inode,
+    f.content_type,
+    f.mime_type,
+    f.hash"""
+
+FTS_CLAUSE: Final[str] = "f.id IN (SELECT rowid FROM file_fts WHERE file_fts MATCH ?)"
+
+# What it costs to evaluate a condition, roughly. Conditions that can use an
+# index and narrow the result down a lot come first, the metadata, which has
+# to be parsed for every row, comes last.
+COST_INDEX: Final[int] = 1
+COST_RANGE: Final[int] = 2
+COST_COLUMN: Final[int] = 3
+COST_FTS: Final[int] = 4
+COST_META: Final[int] = 5
+
+SIZE_UNITS: Final[dict[str, int]] = {
+    "": 1,
+    "k": 1 << 10,
+    "m": 1 << 20,
+    "g": 1 << 30,
+    "t": 1 << 40,
+}
+
+Tokens = list[tuple[str, str]]
+Clause = tuple[int, str, list[Any]]
+
+
+def tokenize(text: str) -> Tokens:
+    """Split a query into (kind, text) tuples."""
+    tokens: Tokens = []
+    for m in TOKEN_PAT.finditer(text.strip()):
+        kind: str = m.lastgroup or ""
+        if kind == "junk":
+            raise QueryError(f"Unbalanced quote at offset {m.start(kind)}")
+        if kind == "value":
+            tokens.append(("key", m["key"]))
+        tokens.append((kind, m[kind]))
+    return tokens
+
+
+def _unquote(text: str) -> str:
+    """Remove the quotes around a phrase, if there are any."""
+    if len(text) >= 2 and text[0] == '"' and text[-1] == '"':
+        return UNQUOTE_PAT.sub(r"\1", text[1:-1])
+    return text
+
+
+class Parser:  # pylint: disable-msg=R0903
+    """Parser turns a query into a tree of Nodes."""
+
+    __slots__ = ["tokens", "pos"]
+
+    tokens: Tokens
+    pos: int
+
+    def __init__(self, text: str) -> None:
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def parse(self) -> Optional[Node]:
+        """Parse the query. An empty query yields None."""
+        if len(self.tokens) == 0:
+            return None
+        node: Node = self.__or()
+        if self.pos < len(self.tokens):
+            raise QueryError(f"Unexpected {self.tokens[self.pos][1]!r}")
+        return node
+
+    def __peek(self) -> tuple[str, str]:
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return ("end", "")
+
+    def __next(self) -> tuple[str, str]:
+        tok = self.__peek()
+        self.pos += 1
+        return tok
+
+    def __or(self) -> Node:
+        nodes: list[Node] = [self.__and()]
+        while self.__peek() == ("word", "OR"):
+            self.pos += 1
+            nodes.append(self.__and())
+        return nodes[0] if len(nodes) == 1 else Or(nodes=nodes)
+
+    def __and(self) -> Node:
+        nodes: list[Node] = []
+        while (tok := self.__peek()) not in (("end", ""), ("paren", ")"), ("word", "OR")):
+            if tok == ("word", "AND"):
+                self.pos += 1
+                continue
+            nodes.append(self.__unary())
+        if len(nodes) == 0:
+            raise QueryError("Expected a search term")
+        return nodes[0] if len(nodes) == 1 else And(nodes=nodes)
+
+    def __unary(self) -> Node:
+        kind, text = self.__next()
+        match kind:
+            case "neg":
+                return Not(node=self.__unary())
+            case "word" if text == "NOT":
+                return Not(node=self.__unary())
+            case "paren" if text == "(":
+                node: Node = self.__or()
+                if self.__next() != ("paren", ")"):
+                    raise QueryError("Missing )")
+                return node
+            case "key":
+                m = OP_PAT.fullmatch(_unquote(self.__next()[1]))
+                assert m is not None
+                return Filter(key=text, op=m[1] or "=", value=m[2])
+            case "phrase":
+                phrase: str = _unquote(text)
+                if phrase.strip() == "":
+                    raise QueryError("Empty phrase")
+                return Term(text=phrase)
+            case "word":
+                word: str = text.rstrip("*")
+                if word == "" or "*" in word:
+                    raise QueryError(f"Wildcards are only allowed at the end of a word: {text}")
+                return Term(text=word, prefix=word != text)
+        raise QueryError(f"Unexpected {text!r}")
+
+
+def parse(text: str) -> Optional[Node]:
+    """Parse a query."""
+    return Parser(text).parse()
+
+
+def _fts(node: Node) -> str:
+    """Translate a Node to an FTS5 query, if possible. FTS5 only knows a
+    binary NOT, so a negation needs something to be subtracted from.
+
+    Return an empty string if the Node cannot be expressed in FTS5 alone."""
+    match node:
+        case Term():
+            return '"' + node.text.replace('"', '""') + '"' + ("*" if node.prefix else "")
+        case And():
+            pos: list[str] = [_fts(n) for n in node.nodes if not isinstance(n, Not)]
+            neg: list[str] = [_fts(n.node) for n in node.nodes if isinstance(n, Not)]
+            if len(pos) == 0 or "" in pos or "" in neg:
+                return ""
+            expr: str = " AND ".join(f"({p})" for p in pos)
+            for n in neg:
+                expr = f"({expr}) NOT ({n})"
+            return expr
+        case Or():
+            parts: list[str] = [_fts(n) for n in node.nodes]
+            if "" in parts:
+                return ""
+            return " OR ".join(f"({p})" for p in parts)
+    return ""
+
+
+def _period(text: str) -> tuple[int, int]:
+    """Return the start and end of a year, month, or day as timestamps."""
+    m = DATE_PAT.fullmatch(text)
+    if m is None:
+        raise QueryError(f"Invalid date {text!r}, expected YYYY, YYYY-MM, or YYYY-MM-DD")
+    try:
+        year: int = int(m[1])
+        if m[3] is not None:
+            start = datetime(year, int(m[2]), int(m[3]))
+            end = start + timedelta(days=1)
+        elif m[2] is not None:
+            month: int = int(m[2])
+            start = datetime(year, month, 1)
+            end = datetime(year + month // 12, month % 12 + 1, 1)
+        else:
+            start = datetime(year, 1, 1)
+            end = datetime(year + 1, 1, 1)
+    except ValueError as err:
+        raise QueryError(f"Invalid date {text!r}: {err}") from err
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def _size(text: str) -> tuple[int, int]:
+    """Return the range of sizes a size like 10M stands for."""
+    m = SIZE_PAT.fullmatch(text)
+    if m is None:
+        raise QueryError(f"Invalid size {text!r}")
+    size: int = int(m[1]) * SIZE_UNITS[m[2].lower()]
+    return size, size + 1
+
+
+def _range(column: str, f: Filter, bounds: Callable[[str], tuple[int, int]]) -> tuple[str, list]:
+    """Compare a column to a value that stands for a range [lo, hi)."""
+    if ".." in f.value:
+        if f.op != "=":
+            raise QueryError(f"A range cannot have an operator: {f.key}:{f.op}{f.value}")
+        first, last = f.value.split("..", 1)
+        return f"{column} >= ? AND {column} < ?", [bounds(first)[0], bounds(last)[1]]
+    lo, hi = bounds(f.value)
+    match f.op:
+        case ">":
+            return f"{column} >= ?", [hi]
+        case ">=":
+            return f"{column} >= ?", [lo]
+        case "<":
+            return f"{column} < ?", [lo]
+        case "<=":
+            return f"{column} < ?", [hi]
+    return f"{column} >= ? AND {column} < ?", [lo, hi]
+
+
+def _equal(f: Filter) -> str:
+    """Make sure a Filter compares for equality, and return its value."""
+    if f.op != "=":
+        raise QueryError(f"{f.key} does not support {f.op}")
+    if f.value == "":
+        raise QueryError(f"{f.key} needs a value")
+    return f.value
+
+
+def _glob(column: str, pattern: str) -> tuple[int, str, list]:
+    """Match a column against a pattern. If the only wildcard is at the end,
+    we express it as a range, so SQLite can use an index."""
+    prefix: str = pattern.rstrip("*")
+    if "*" not in prefix and "?" not in prefix:
+        if prefix == pattern:
+            return COST_INDEX, f"{column} = ?", [pattern]
+        if prefix != "":
+            upper: str = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            return COST_RANGE, f"{column} >= ? AND {column} < ?", [prefix, upper]
+    return COST_COLUMN, f"{column} GLOB ?", [pattern]
+
+
+def _filter_type(f: Filter) -> Clause:
+    name: str = _equal(f).lower()
+    for ft in FileType:
+        if ft.name.lower() == name:
+            return COST_INDEX, "f.content_type = ?", [ft.value]
+    raise QueryError(f"Unknown type {f.value!r}, expected one of "
+                     f"{', '.join(ft.name.lower() for ft in FileType)}")
+
+
+def _filter_mime(f: Filter) -> Clause:
+    return _glob("f.mime_type", _equal(f).lower())
+
+
+def _filter_path(f: Filter) -> Clause:
+    path: str = _equal(f)
+    if "*" in path or "?" in path:
+        return _glob("f.path", path)
+    path = path.rstrip("/")
+    # See Query.FileDeleteByPrefix
+    return (COST_RANGE,
+            "(f.path = ? OR (f.path > ? || '/' AND f.path < ? || '0'))",
+            [path, path, path])
+
+
+def _filter_folder(f: Filter) -> Clause:
+    folder: str = _equal(f)
+    if folder.isdigit():
+        return COST_INDEX, "f.folder_id = ?", [int(folder)]
+    return (COST_INDEX,
+            "f.folder_id = (SELECT id FROM folder WHERE path = ?)",
+            [folder.rstrip("/") or "/"])
+
+
+def _filter_modified(f: Filter) -> Clause:
+    return (COST_RANGE, *_range("f.mtime", f, _period))
+
+
+def _filter_scanned(f: Filter) -> Clause:
+    return (COST_RANGE, *_range("f.time_scanned", f, _period))
+
+
+def _filter_size(f: Filter) -> Clause:
+    return (COST_COLUMN, *_range("f.size", f, _size))
+
+
+def _filter_meta(f: Filter, key: str, column: str = "") -> Clause:
+    """Match a metadata key. If the key has a column of its own, see
+    Database.promote, we use that, and its index."""
+    if META_KEY_PAT.fullmatch(key) is None:
+        raise QueryError(f"Invalid metadata key {key!r}")
+    value: str = _equal(f)
+    pattern: str = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    if column != "":
+        # The column is declared COLLATE NOCASE, and so is its index.
+        if "*" not in value:
+            return COST_INDEX, f"f.{column} = ?", [value]
+        return (COST_RANGE if pattern[0] != "*" else COST_COLUMN,
+                f"f.{column} LIKE ? ESCAPE '\\'",
+                [pattern.replace("*", "%")])
+    if "*" not in value:
+        return (COST_META,
+                "json_extract(f.meta, ?) = ? COLLATE NOCASE",
+                [f'$."{key}"', value])
+    return (COST_META,
+            "json_extract(f.meta, ?) LIKE ? ESCAPE '\\'",
+            [f'$."{key}"', pattern.replace("*", "%")])
+
+
+FILTERS: Final[dict[str, Callable[[Filter], Clause]]] = {
+    "type": _filter_type,
+    "mime": _filter_mime,
+    "path": _filter_path,
+    "folder": _filter_folder,
+    "modified": _filter_modified,
+    "scanned": _filter_scanned,
+    "size": _filter_size,
+}
+
+
+def _where(node: Node, promoted: dict[str, str]) -> Clause:
+    """Translate a Node to a condition for the WHERE clause, along with its
+    estimated cost.
+
+    promoted maps metadata keys to the columns that hold them."""
+    fts: str = _fts(node)
+    if fts != "":
+        return COST_FTS, FTS_CLAUSE, [fts]
+    match node:
+        case Filter():
+            if node.key.startswith("meta."):
+                key: str = node.key[5:]
+                return _filter_meta(node, key, promoted.get(key, ""))
+            fn = FILTERS.get(node.key.lower())
+            if fn is None:
+                return _filter_meta(node, node.key, promoted.get(node.key, ""))
+            return fn(node)
+        case Not():
+            inner: Clause = _where(node.node, promoted)
+            return inner[0] + 1, f"NOT ({inner[1]})", inner[2]
+        case And() | Or():
+            clauses: list[Clause] = sorted((_where(n, promoted) for n in node.nodes),
+                                           key=lambda c: c[0])
+            op: str = " AND " if isinstance(node, And) else " OR "
+            cost: int = (min if isinstance(node, And) else max)(c[0] for c in clauses)
+            params: list[Any] = []
+            for c in clauses:
+                params.extend(c[2])
+            return cost, op.join(f"({c[1]})" for c in clauses), params
+    raise QueryError(f"Cannot compile {node}")
+
+
+class Plan:
+    """Plan is a compiled query.
+
+    If the query contains words or phrases that have to match, the full text
+    index drives the query, and the results are ordered by relevance.
+    Otherwise, we go through the file table, using whatever index fits the
+    filters best, and order the results by modification time, most recent
+    first. Either way, the filters are evaluated in the order of their cost,
+    the cheapest first.
+
+    Results come in pages. Instead of an offset, the next page starts after
+    the position of the last result of the previous page, given as an opaque
+    cursor, so the database does not have to skip over all the results of
+    the previous pages."""
+
+    __slots__ = ["match", "clauses"]
+
+    match: str
+    clauses: list[Clause]
+
+    def __init__(self, text: str, promoted: Optional[dict[str, str]] = None) -> None:
+        """Compile a query. promoted maps metadata keys to the columns that
+        hold them, see Database.promote."""
+        root: Optional[Node] = parse(text)
+        nodes: list[Node] = []
+        if isinstance(root, And):
+            nodes = root.nodes
+        elif root is not None:
+            nodes = [root]
+
+        pos: list[str] = []
+        neg: list[str] = []
+        self.clauses = []
+        for node in nodes:
+            if isinstance(node, Not) and (fts := _fts(node.node)) != "":
+                neg.append(fts)
+            elif not isinstance(node, Not) and (fts := _fts(node)) != "":
+                pos.append(fts)
+            else:
+                self.clauses.append(_where(node, promoted or {}))
+
+        self.match = " AND ".join(f"({p})" for p in pos)
+        for n in neg:
+            if self.match != "":
+                self.match = f"({self.match}) NOT ({n})"
+            else:
+                self.clauses.append((COST_FTS + 1, f"NOT ({FTS_CLAUSE})", [n]))
+        self.clauses.sort(key=lambda c: c[0])
+
+    def sql(self, limit: int, cursor: str = "") -> tuple[str, list[Any]]:
+        """Return the SQL query for a page of results, and its parameters.
+
+        Each row holds the columns File.from_db expects, and the sort key."""
+        where: list[str] = []
+        params: list[Any] = []
+        if self.match != "":
+            query: str = f"""
+SELECT{FILE_COLUMNS},
+    file_fts.rank
+FROM file_fts
+INNER JOIN file f ON file_fts.rowid = f.id"""
+            where.append("file_fts MATCH ?")
+            params.append(self.match)
+            keyset: str = "(file_fts.rank, f.id) > (?, ?)"
+            order: str = "file_fts.rank, f.id"
+        else:
+            query = f"""
+SELECT{FILE_COLUMNS},
+    f.mtime
+FROM file f"""
+            keyset = "(f.mtime, f.id) < (?, ?)"
+            order = "f.mtime DESC, f.id DESC"
+
+        if cursor != "":
+            where.append(keyset)
+            params.extend(self.__decode(cursor))
+        for _, clause, args in self.clauses:
+            where.append(f"({clause})")
+            params.extend(args)
+        if len(where) > 0:
+            query += "\nWHERE " + "\n  AND ".join(where)
+        query += f"\nORDER BY {order}\nLIMIT ?"
+        params.append(limit)
+        return query, params
+
+    def __mode(self) -> str:
+        return "rank" if self.match != "" else "mtime"
+
+    def cursor(self, row: tuple[Any, ...]) -> str:
+        """Return the cursor for the page following a row."""
+        token: bytes = json.dumps([self.__mode(), row[10], row[0]]).encode()
+        return base64.urlsafe_b64encode(token).decode()
+
+    def __decode(self, cursor: str) -> tuple[Any, int]:
+        try:
+            mode, key, fid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError, TypeError) as err:
+            raise QueryError(f"Invalid cursor {cursor!r}") from err
+        if mode != self.__mode():
+            raise QueryError("The cursor belongs to a different query")
+        return key, fid
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
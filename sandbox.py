@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:52:01 krylon>
+#
+# /data/code/python/pythia/sandbox.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.sandbox
+
+(c) 2026 Benjamin Walkenhorst
+
+Run the Extractors in separate worker processes, so a file that makes an
+Extractor hang, eat all memory, or crash the interpreter only costs us that
+one file.
+"""
+
+import logging
+import logging.handlers
+import multiprocessing
+import resource
+import signal
+import time
+from multiprocessing.connection import Connection, wait
+from typing import Any, Final, Optional
+
+from pythia import common, database, inspector, metrics, profiler
+from pythia.data import Failure, FailureKind, File
+
+# Default limits for the worker processes:
+# How long a worker may spend on a single file, in seconds. Once the deadline
+# passes, the worker is asked to give up on the file. If it does not respond
+# within GRACE_TIME seconds, it is killed.
+DEADLINE: Final[float] = 120.0
+GRACE_TIME: Final[float] = 10.0
+# How much memory (address space) a worker may use, in bytes.
+MEM_LIMIT: Final[int] = 2 * 2**30
+# After this many files, a worker is replaced by a fresh one, in case an
+# Extractor leaks memory or other resources.
+MAX_FILES: Final[int] = 256
+
+Result = tuple[File, Optional[Failure]]
+
+
+def _alarm(_signum: int, _frame: Any) -> None:
+    raise inspector.Timeout()
+
+
+def _work(conn: Connection,  # pylint: disable-msg=R0913
+          basedir: str,
+          logq: Any,
+          deadline: float,
+          mem_limit: int,
+          capture: float) -> None:
+    """Main loop of a worker process: Receive Files, inspect them, send them
+    back, until the parent sends None or closes the connection.
+
+    Log messages go to the parent through logq, so the workers do not all
+    open the log file themselves.
+
+    If capture is greater than zero, the Extractors run under cProfile, and
+    for files that take at least capture seconds, the statistics are sent
+    back along with the File."""
+    common.path.base(basedir)
+    common.forward_logs(logq)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGALRM, _alarm)
+    if mem_limit > 0:
+        resource.setrlimit(resource.RLIMIT_AS, (mem_limit, mem_limit))
+    # Workers only look up content we have seen before, the Crawler's
+    # writer takes care of storing the results.
+    insp = inspector.Inspector(database.Database(readonly=True))
+
+    while True:
+        try:
+            f: Optional[File] = conn.recv()
+        except EOFError:
+            break
+        if f is None:
+            break
+        failure: Optional[Failure] = None
+        stats: str = ""
+        try:
+            signal.setitimer(signal.ITIMER_REAL, deadline)
+            if capture > 0:
+                failure, stats = profiler.run_profiled(lambda: insp.inspect(f), capture)
+            else:
+                failure = insp.inspect(f)
+        except inspector.Timeout:
+            failure = Failure(path=f.path, kind=FailureKind.Timeout, message="Deadline exceeded")
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        conn.send((f, failure, stats))
+    conn.close()
+    common.stop_logging()
+
+
+class Worker:  # pylint: disable-msg=R0903
+    """Worker is the parent's handle on a worker process."""
+
+    __slots__ = [
+        "proc",
+        "conn",
+        "file",
+        "label",
+        "started",
+        "count",
+    ]
+
+    proc: multiprocessing.Process
+    conn: Connection
+    file: Optional[File]
+    label: str
+    started: float
+    count: int
+
+    def __init__(self, proc: multiprocessing.Process, conn: Connection) -> None:
+        self.proc = proc
+        self.conn = conn
+        self.file = None
+        self.label = ""
+        self.started = 0.0
+        self.count = 0
+
+
+class Sandbox:
+    """Sandbox manages a set of pre-forked worker processes that run the
+    Extractors, with a limit on memory and time per file.
+
+    The Sandbox is not thread-safe, it is meant to be used from a single
+    thread, the Crawler's dispatcher."""
+
+    __slots__ = [
+        "log",
+        "ctx",
+        "procs",
+        "deadline",
+        "mem_limit",
+        "max_files",
+        "workers",
+        "restarts",
+        "capture",
+        "logq",
+        "logs",
+    ]
+
+    log: logging.Logger
+    ctx: Any
+    procs: int
+    deadline: float
+    mem_limit: int
+    max_files: int
+    workers: list[Worker]
+    restarts: metrics.MetricHandle
+    capture: float
+    logq: Any
+    logs: logging.handlers.QueueListener
+
+    def __init__(self,
+                 procs: int,
+                 deadline: float = DEADLINE,
+                 mem_limit: int = MEM_LIMIT,
+                 max_files: int = MAX_FILES) -> None:
+        self.log = common.get_logger("sandbox")
+        self.ctx = multiprocessing.get_context("forkserver")
+        self.procs = procs
+        self.deadline = deadline
+        self.mem_limit = mem_limit
+        self.max_files = max_files
+        self.restarts = metrics.registry.counter("pythia_worker_restarts_total",
+                                                 "Worker processes replaced by fresh ones")
+        prof = profiler.active
+        self.capture = prof.threshold if prof is not None and prof.capture else 0.0
+        self.logq = self.ctx.Queue()
+        self.logs = common.receive_logs(self.logq)
+        self.workers = [self.__spawn() for _ in range(procs)]
+
+    def __spawn(self) -> Worker:
+        """Start a new worker process."""
+        parent, child = self.ctx.Pipe()
+        proc = self.ctx.Process(target=_work,
+                                args=(child,
+                                      common.path.base(),
+                                      self.logq,
+                                      self.deadline,
+                                      self.mem_limit,
+                                      self.capture),
+                                daemon=True)
+        proc.start()
+        child.close()
+        return Worker(proc, parent)
+
+    def __replace(self, w: Worker, kill: bool = False) -> None:
+        """Shut down a worker process and start a new one in its place."""
+        if kill:
+            w.proc.kill()
+        else:
+            try:
+                w.conn.send(None)
+            except OSError:
+                pass
+        w.proc.join()
+        w.conn.close()
+        self.workers[self.workers.index(w)] = self.__spawn()
+        self.restarts.inc()
+
+    def idle(self) -> int:
+        """Return the number of workers that are waiting for work."""
+        return sum(1 for w in self.workers if w.file is None)
+
+    def busy(self) -> int:
+        """Return the number of workers that are processing a file."""
+        return self.procs - self.idle()
+
+    def submit(self, f: File, label: str = "") -> None:
+        """Hand a File to an idle worker. The caller must check there is one.
+
+        label names the Extractor that will handle the File, the time it takes
+        is recorded under that name."""
+        w = next(w for w in self.workers if w.file is None)
+        w.file = f
+        w.label = label
+        w.started = time.monotonic()
+        try:
+            w.conn.send(f)
+        except OSError:
+            # The worker died while it was idle, try again with a fresh one.
+            self.__replace(w, True)
+            self.submit(f, label)
+
+    def collect(self, timeout: float) -> list[Result]:
+        """Wait up to timeout seconds for workers to finish, and return their
+        results. Workers that crashed or missed their deadline are replaced,
+        their files are returned with a Failure."""
+        busy: dict[Connection, Worker] = {w.conn: w for w in self.workers if w.file is not None}
+        if len(busy) == 0:
+            return []
+
+        now: float = time.monotonic()
+        hard_limit: Final[float] = self.deadline + GRACE_TIME
+        next_deadline: float = min(w.started + hard_limit for w in busy.values())
+        timeout = max(0.0, min(timeout, next_deadline - now))
+        results: list[Result] = []
+
+        for conn in wait(list(busy), timeout):
+            w = busy[conn]
+            f = w.file
+            assert f is not None
+            w.file = None
+            try:
+                res, failure, stats = conn.recv()
+                results.append((res, failure))
+                self.__observe(w, res, stats)
+                w.count += 1
+                if w.count >= self.max_files:
+                    self.__replace(w)
+            except (EOFError, OSError):
+                w.proc.join()
+                self.log.error("Worker process crashed on %s, exit code %s",
+                               f.path,
+                               w.proc.exitcode)
+                self.__observe(w, f, "Worker crashed")
+                results.append(self.__failed(f,
+                                             FailureKind.Crash,
+                                             f"Worker exited with code {w.proc.exitcode}"))
+                self.__replace(w, True)
+
+        now = time.monotonic()
+        for w in busy.values():
+            if w.file is not None and now - w.started > hard_limit:
+                self.log.error("Worker process did not finish %s in time, killing it",
+                               w.file.path)
+                self.__observe(w, w.file, "Worker killed")
+                results.append(self.__failed(w.file,
+                                             FailureKind.Timeout,
+                                             f"Worker killed after {hard_limit:.0f} seconds"))
+                w.file = None
+                self.__replace(w, True)
+
+        return results
+
+    def __observe(self, w: Worker, f: File, stats: str) -> None:
+        """Record how long a worker took to process a File."""
+        elapsed: float = time.monotonic() - w.started
+        metrics.registry.histogram("pythia_extract_seconds",
+                                   "Time to extract content and metadata from a File",
+                                   extractor=w.label).observe(elapsed)
+        prof = profiler.active
+        if prof is not None:
+            prof.file(f.path, elapsed, f"{w.label}\n{stats}".strip())
+
+    def __failed(self, f: File, kind: FailureKind, msg: str) -> Result:
+        """Prepare a File whose processing failed so it can still be recorded,
+        without content, and a Failure to go with it."""
+        f.content = ""
+        f.hash = ""
+        return (f, Failure(path=f.path, kind=kind, message=msg))
+
+    def close(self) -> None:
+        """Shut down all worker processes. Files still being processed are
+        abandoned."""
+        for w in self.workers:
+            if w.file is not None:
+                w.proc.kill()
+            else:
+                try:
+                    w.conn.send(None)
+                except OSError:
+                    pass
+        for w in self.workers:
+            w.proc.join()
+            w.conn.close()
+        self.workers.clear()
+        # The workers are gone, so nothing is left to log.
+        self.logs.stop()
+        self.logq.close()
+        self.logq.join_thread()
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:43:53 krylon>
+#
+# /data/code/python/pythia/test_audio.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.test_audio
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import struct
+import tempfile
+import unittest
+
+from pythia.extractor.audio import read_tags
+
+# A few bytes that look like MPEG audio frames.
+FRAMES = b"\xff\xfb\x90\x00" + b"\0" * 412
+
+
+def id3_frame(fid: str, text: str, major: int) -> bytes:
+    """Build an ID3v2 text frame."""
+    body = b"\x03" + text.encode("utf-8") if major == 4 else \
+        b"\x01" + text.encode("utf-16")
+    if major == 4:
+        size = bytes(((len(body) >> s) & 0x7f) for s in (21, 14, 7, 0))
+    else:
+        size = len(body).to_bytes(4, "big")
+    return fid.encode() + size + b"\0\0" + body
+
+
+def id3_tag(major: int, frames: dict[str, str]) -> bytes:
+    """Build an ID3v2 tag, with some padding."""
+    data = b"".join(id3_frame(k, v, major) for k, v in frames.items()) + b"\0" * 64
+    size = bytes(((len(data) >> s) & 0x7f) for s in (21, 14, 7, 0))
+    return b"ID3" + bytes((major, 0, 0)) + size + data
+
+
+def vorbis_comments(comments: dict[str, str]) -> bytes:
+    """Build a block of Vorbis comments."""
+    vendor = b"pythia"
+    data = struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", len(comments))
+    for k, v in comments.items():
+        c = f"{k}={v}".encode("utf-8")
+        data += struct.pack("<I", len(c)) + c
+    return data
+
+
+def ogg_pages(packets: list[bytes]) -> bytes:
+    """Put each packet on Ogg pages of its own. We do not bother with the
+    checksum, because we do not check it."""
+    out = b""
+    for seq, packet in enumerate(packets):
+        lacing = [255] * (len(packet) // 255) + [len(packet) % 255]
+        # Spread long packets over pages of at most 4 segments.
+        for i in range(0, len(lacing), 4):
+            segs = lacing[i:i+4]
+            data, packet = packet[:sum(segs)], packet[sum(segs):]
+            out += b"OggS\0" + bytes((1 if i > 0 else 0, )) + b"\0" * 8 + \
+                struct.pack("<III", 1, seq, 0) + bytes((len(segs), )) + bytes(segs) + data
+    return out
+
+
+class AudioTest(unittest.TestCase):
+    """Tests for reading tags from audio files."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable-msg=R1732
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmpdir.cleanup()
+
+    def __write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "wb") as fh:
+            fh.write(data)
+        return path
+
+    def test_formats(self) -> None:
+        """Test reading tags from the formats we parse ourselves."""
+        frames = {"TPE1": "Motörhead", "TALB": "Ace of Spades", "TIT2": "Jailbait",
+                  "TRCK": "3/12", "TPOS": "1/1"}
+        comments = {"Artist": "Motörhead", "ALBUM": "Ace of Spades", "title": "Jailbait",
+                    "TRACKNUMBER": "3", "DISCNUMBER": "1"}
+        v1 = b"TAG" + b"Jailbait".ljust(30, b"\0") + \
+            "Motörhead".encode("latin-1").ljust(30, b"\0") + \
+            b"Ace of Spades".ljust(30, b"\0") + b"1980" + b"\0" * 29 + b"\x03" + b"\x09"
+        flac = b"fLaC" + b"\x00" + (34).to_bytes(3, "big") + b"\0" * 34 + \
+            b"\x06" + (1000).to_bytes(3, "big") + b"\0" * 1000
+        flac_comments = vorbis_comments(comments)
+        flac += b"\x84" + len(flac_comments).to_bytes(3, "big") + flac_comments + FRAMES
+        # The comment packet is longer than one page, to test reassembly.
+        long_comments = dict(comments, DESCRIPTION="x" * 2000)
+        vorbis = ogg_pages([b"\x01vorbis" + b"\0" * 23,
+                            b"\x03vorbis" + vorbis_comments(long_comments) + b"\x01",
+                            b"\x05vorbis"])
+        opus = ogg_pages([b"OpusHead" + b"\0" * 11, b"OpusTags" + vorbis_comments(comments)])
+
+        test_cases = (
+            ("id3v23.mp3", id3_tag(3, frames) + FRAMES),
+            ("id3v24.mp3", id3_tag(4, frames) + FRAMES),
+            ("id3v1.mp3", FRAMES + v1),
+            ("plain.flac", flac),
+            ("id3.flac", id3_tag(3, {}) + flac),
+            ("song.ogg", vorbis),
+            ("song.opus", opus),
+        )
+
+        for c in test_cases:
+            tags = read_tags(self.__write(c[0], c[1]))
+            self.assertEqual(tags["artist"], "Motörhead", c[0])
+            self.assertEqual(tags["album"], "Ace of Spades", c[0])
+            self.assertEqual(tags["title"], "Jailbait", c[0])
+            self.assertEqual(tags["ord2"], "3", c[0])
+
+    def test_defaults(self) -> None:
+        """Test that a file without tags gets the name of its folder as album."""
+        tags = read_tags(self.__write("untagged.mp3", FRAMES))
+        self.assertEqual(tags["album"], os.path.basename(self.tmpdir.name))
+        self.assertEqual(tags["ord1"], "0")
+        self.assertEqual(tags["title"], "")
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
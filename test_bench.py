@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:39:45 krylon>
+#
+# /data/code/python/pythia/test_bench.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.test_bench
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+from pythia import common
+from pythia.bench import BLACKLISTED, Corpus, CorpusSpec, main
+
+
+def _digest(root: str) -> str:
+    """Hash the names, contents, and mtimes of all files below root."""
+    h = hashlib.sha256()
+    for folder, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(folder, name)
+            h.update(os.path.relpath(path, root).encode())
+            h.update(str(int(os.stat(path).st_mtime)).encode())
+            with open(path, "rb") as fh:
+                h.update(fh.read())
+    return h.hexdigest()
+
+
+class CorpusTest(unittest.TestCase):
+    """Tests for the benchmark corpus generator."""
+
+    def test_deterministic(self) -> None:
+        """Test that the same spec yields the same corpus, and a different
+        seed a different one."""
+        spec = CorpusSpec(depth=2, fanout=2, files=6)
+        with tempfile.TemporaryDirectory() as tmp:
+            stats = Corpus(spec).generate(os.path.join(tmp, "a"))
+            Corpus(spec).generate(os.path.join(tmp, "b"))
+            Corpus(CorpusSpec(seed=7, depth=2, fanout=2, files=6)).generate(
+                os.path.join(tmp, "c"))
+
+            self.assertEqual(stats.folders, 7)
+            self.assertEqual(stats.files, 42)
+            self.assertEqual(stats.blacklisted, 6 * len(BLACKLISTED))
+            self.assertEqual(sum(stats.kinds.values()), stats.files)
+            for name in BLACKLISTED:
+                self.assertTrue(os.path.isdir(os.path.join(tmp, "a", name)))
+
+            a = _digest(os.path.join(tmp, "a"))
+            self.assertEqual(a, _digest(os.path.join(tmp, "b")))
+            self.assertNotEqual(a, _digest(os.path.join(tmp, "c")))
+
+
+class BenchTest(unittest.TestCase):
+    """Tests for running the benchmarks."""
+
+    def test_output(self) -> None:
+        """Test that the report written to stdout is valid JSON, and nothing
+        else ends up there."""
+        basedir = common.path.base()
+        self.addCleanup(common.set_basedir, basedir)
+        out = io.StringIO()
+        argv = ["bench", "-d", "1", "-f", "1", "-n", "4", "-r", "1", "-p", "1"]
+        with mock.patch("sys.argv", argv), redirect_stdout(out):
+            main()
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["corpus"]["files"], 8)
+        for name in ("generate", "crawl", "crawl_rescan"):
+            self.assertIn(name, report["results"])
+        self.assertEqual(common.path.base(), basedir)
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-02-23 15:51:46 krylon>
+# Time-stamp: <2026-10-18 07:44:43 krylon>
 #
 # /data/code/python/pythia/test_blacklist.py
 # created on 23. 02. 2024
@@ -18,7 +18,9 @@ pythia.test_blacklist
 """
 
 
+import re
 import unittest
+from threading import Thread
 
 from pythia.data import Blacklist, BlacklistItem
 
@@ -49,6 +51,80 @@ class BlacklistTest(unittest.TestCase):
             m = bl.match(t[0])
             self.assertEqual(m, t[1], f"Unexpected result from bl.match({t[0]}) - {m}")
 
+    def test_blacklist_kinds(self):
+        """Test the different kinds of patterns the Blacklist compiles
+        differently."""
+        bl = Blacklist(
+            "^[.]git$",                    # exact
+            "^__pycache__$",               # exact
+            "[.]pyc$",                     # suffix
+            "~$",                          # suffix
+            "^[.]#",                       # prefix
+            "node_modules",                # substring
+            r"^\d+[.]tmp$",                # regex
+            r"(a)\1",                      # backreference
+            re.compile("^thumbs[.]db$", re.I),
+        )
+
+        test_cases = (
+            (".git", True),
+            ("x.git", False),
+            ("__pycache__", True),
+            ("module.pyc", True),
+            ("module.py", False),
+            ("notes.txt~", True),
+            (".#notes.txt", True),
+            ("a.#notes.txt", False),
+            ("my_node_modules_backup", True),
+            ("12345.tmp", True),
+            ("a12345.tmp", False),
+            ("aa", True),
+            ("ab", False),
+            ("Thumbs.db", True),
+            ("", False),
+        )
+
+        for t in test_cases:
+            m = bl.match(t[0])
+            self.assertEqual(m, t[1], f"Unexpected result from bl.match({t[0]}) - {m}")
+
+    def test_blacklist_counts(self):
+        """Test that hits are counted correctly across threads."""
+        items = (
+            BlacklistItem("[.]bak$", cnt=10),
+            BlacklistItem("^tmp"),
+            BlacklistItem("cache"),
+        )
+        bl = Blacklist(*items)
+
+        def worker():
+            for _ in range(100):
+                bl.match("file.bak")
+                bl.match("tmpfile")
+                bl.match("file.txt")
+
+        threads = [Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        bl.update_counts()
+        self.assertEqual(items[0].cnt, 410)
+        self.assertEqual(items[1].cnt, 400)
+        self.assertEqual(items[2].cnt, 0)
+        # The finished threads' counts have been folded into the base counts.
+        self.assertEqual(len(bl.tallies), 0)
+        self.assertEqual(bl.base_counts, [410, 400, 0])
+
+        # The calling thread keeps its tally, and it is counted, too.
+        bl.match("file.bak")
+        bl.match("file.bak")
+        bl.update_counts()
+        bl.update_counts()
+        self.assertEqual(items[0].cnt, 412)
+        self.assertEqual(len(bl.tallies), 1)
+
 
 # Local Variables: #
 # python-indent: 4 #
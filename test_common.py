@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:52:01 krylon>
+#
+# /data/code/python/pythia/test_common.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.test_common
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import logging
+import multiprocessing
+import os
+import tempfile
+import unittest
+from typing import Any
+
+from pythia import common, metrics, profiler
+
+SETTINGS = """
+[log]
+level = "info"
+
+[log.levels]
+crawler = "WARNING"
+database = 10
+watcher = "CHATTY"
+"""
+
+OPT_IN = """
+[metrics]
+enabled = true
+file = "{folder}/pythia.prom"
+interval = 60
+
+[profile]
+enabled = true
+top = 7
+"""
+
+
+def _child(logq: Any, folder: str) -> None:
+    """Log a message from another process, like a Sandbox's worker."""
+    common.path.base(folder)
+    common.forward_logs(logq)
+    common.get_logger("child").error("Hello from the child")
+    common.stop_logging()
+
+
+class CommonTest(unittest.TestCase):
+    """Tests for the logging setup."""
+
+    def test_load_log_levels(self) -> None:
+        """Test reading log levels from the configuration file."""
+        with tempfile.TemporaryDirectory() as folder:
+            config = os.path.join(folder, "settings.toml")
+            default, levels = common.load_log_levels(config)
+            self.assertEqual(default, logging.DEBUG)
+            self.assertEqual(levels, {})
+
+            with open(config, "w", encoding="utf-8") as fh:
+                fh.write(SETTINGS)
+            default, levels = common.load_log_levels(config)
+            self.assertEqual(default, logging.INFO)
+            self.assertEqual(levels, {
+                "crawler": logging.WARNING,
+                "database": logging.DEBUG,
+                "watcher": logging.INFO,
+            })
+
+    def test_get_logger(self) -> None:
+        """Test that loggers are cached, and their messages end up in the log
+        file."""
+        basedir = common.path.base()
+        self.addCleanup(common.set_basedir, basedir)
+        with tempfile.TemporaryDirectory() as folder:
+            with open(os.path.join(folder, "settings.toml"), "w", encoding="utf-8") as fh:
+                fh.write(SETTINGS)
+            common.set_basedir(folder)
+            log = common.get_logger("test_common", False)
+            self.assertIs(common.get_logger("test_common"), log)
+            self.assertEqual(log.level, logging.INFO)
+            log.info("Hello, world")
+            log.debug("Nobody cares")
+            # Stopping the backend writes out all pending messages.
+            common.set_basedir(folder)
+            with open(common.path.log(), "r", encoding="utf-8") as fh:
+                text = fh.read()
+            self.assertIn("Hello, world", text)
+            self.assertNotIn("Nobody cares", text)
+
+    def test_forward_logs(self) -> None:
+        """Test that log messages from another process end up in our log
+        file, and only there."""
+        basedir = common.path.base()
+        self.addCleanup(common.set_basedir, basedir)
+        with tempfile.TemporaryDirectory() as folder:
+            common.set_basedir(os.path.join(folder, "parent"))
+            ctx = multiprocessing.get_context("forkserver")
+            logq = ctx.Queue()
+            listener = common.receive_logs(logq)
+            proc = ctx.Process(target=_child, args=(logq, os.path.join(folder, "child")))
+            proc.start()
+            proc.join()
+            listener.stop()
+            logq.close()
+            logq.join_thread()
+            self.assertEqual(proc.exitcode, 0)
+            # Restarting the backend writes out all pending messages.
+            common.set_basedir(common.path.base())
+            with open(common.path.log(), "r", encoding="utf-8") as fh:
+                self.assertIn("Hello from the child", fh.read())
+            self.assertFalse(os.path.exists(os.path.join(folder, "child", "pythia.log")))
+
+    def test_opt_in(self) -> None:
+        """Test that metrics and profiling are turned on by the settings
+        file."""
+        basedir = common.path.base()
+        self.addCleanup(common.set_basedir, basedir)
+        self.addCleanup(metrics.registry.enable, False)
+        self.addCleanup(profiler.disable)
+        with tempfile.TemporaryDirectory() as folder:
+            with open(os.path.join(folder, "settings.toml"), "w", encoding="utf-8") as fh:
+                fh.write(OPT_IN.format(folder=folder))
+            common.set_basedir(folder)
+            self.assertTrue(metrics.registry.enabled)
+            exporter = metrics.exporter
+            self.assertIsNotNone(exporter)
+            self.assertEqual(exporter.path, os.path.join(folder, "pythia.prom"))
+            self.assertIsNotNone(profiler.active)
+            self.assertEqual(profiler.active.top_n, 7)
+
+            # Loading the settings again replaces the Exporter.
+            common.init_app()
+            self.assertIsNot(metrics.exporter, exporter)
+            self.assertFalse(any(t.is_alive() for t in exporter.threads))
+            metrics.exporter.stop()
+            metrics.exporter = None
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:24:27 krylon>
+#
+# /data/code/python/pythia/test_crawler.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.test_crawler
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import tempfile
+import time
+import unittest
+
+from pythia import common, database
+from pythia.crawler import Crawler, WriteBuffer
+from pythia.data import Blacklist, BlacklistItem, FailureKind, File, Folder
+
+
+def make_tree(root: str, dirs: int, files: int) -> list[str]:
+    """Create a directory tree with some text files, return their paths."""
+    paths: list[str] = []
+    for i in range(dirs):
+        folder = os.path.join(root, f"d{i}")
+        os.makedirs(folder)
+        for j in range(files):
+            path = os.path.join(folder, f"f{j}.txt")
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.write(f"word{i}x{j} is in file {j} of folder {i}\n")
+            paths.append(path)
+    return paths
+
+
+class CrawlerTest(unittest.TestCase):
+    """Tests for the Crawler's pipeline."""
+
+    tmpdir: tempfile.TemporaryDirectory
+    db: database.Database
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable-msg=R1732
+        common.set_basedir(os.path.join(cls.tmpdir.name, "base"))
+        cls.db = database.Database(common.path.db())
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.db.close()
+        cls.tmpdir.cleanup()
+
+    def crawl(self, root: str) -> Crawler:
+        """Create a Crawler for a tree, and make sure it gets cleaned up."""
+        c = Crawler(root, procs=2)
+        self.addCleanup(c.pool.close)
+        return c
+
+    def assert_stopped(self, c: Crawler) -> None:
+        """Check that all of the Crawler's threads are finished."""
+        for t in c.workers + [c.dispatcher, c.writer]:
+            self.assertIsNotNone(t)
+            self.assertFalse(t.is_alive())
+
+    def test_01_traverse(self) -> None:
+        """Test that a traversal processes all files, and records the ones
+        that cannot be processed."""
+        root = os.path.join(self.tmpdir.name, "tree1")
+        paths = make_tree(root, 3, 10)
+        broken = os.path.join(root, "broken.odt")
+        with open(broken, "wb") as fh:
+            fh.write(b"This is not a zip archive")
+
+        c = self.crawl(root)
+        c.traverse()
+        c.wait()
+        self.assert_stopped(c)
+
+        for path in paths:
+            f = self.db.file_get_by_path(path)
+            self.assertIsNotNone(f, path)
+        self.assertEqual(len(self.db.search("word1x7")), 1)
+        self.assertIsNotNone(self.db.file_get_by_path(broken))
+        failures = [x for x in self.db.failure_get_recent() if x.path == broken]
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0].kind, FailureKind.Error)
+        fldr = self.db.folder_get_by_path(root)
+        self.assertIsNotNone(fldr)
+        self.assertGreater(fldr.time_scanned.year, 1970)
+
+    def test_02_stop(self) -> None:
+        """Test stopping the Crawler while it is busy, and finishing the job
+        with another one."""
+        root = os.path.join(self.tmpdir.name, "tree2")
+        paths = make_tree(root, 20, 50)
+
+        c = self.crawl(root)
+        c.traverse()
+        c.stop()
+        self.assert_stopped(c)
+        for path in paths:
+            f = self.db.file_get_by_path(path)
+            if f is not None:
+                # Whatever made it to the database must be complete.
+                self.assertIn("is in file", f.content)
+
+        c = self.crawl(root)
+        c.traverse()
+        c.wait()
+        for path in paths:
+            self.assertIsNotNone(self.db.file_get_by_path(path), path)
+
+    def test_03_drain(self) -> None:
+        """Test that drain() writes all Files handed to enqueue() before the
+        pipeline shuts down."""
+        root = os.path.join(self.tmpdir.name, "tree3")
+        paths = make_tree(root, 2, 25)
+        fldr = Folder(path=root)
+        with self.db:
+            self.db.folder_add(fldr)
+
+        c = self.crawl(root)
+        c.start()
+        for path in paths:
+            f = File(path, {"folder_id": fldr.fid})
+            f.set_stat(os.stat(path))
+            c.enqueue(f)
+        c.drain()
+        self.assert_stopped(c)
+        for path in paths:
+            f = self.db.file_get_by_path(path)
+            self.assertIsNotNone(f, path)
+            self.assertIn("is in file", f.content)
+
+    def test_04_sweep(self) -> None:
+        """Test that Files that are gone from disk are removed, and that a
+        renamed File keeps its content."""
+        root = os.path.join(self.tmpdir.name, "tree4")
+        paths = make_tree(root, 2, 5)
+        c = self.crawl(root)
+        c.traverse()
+        c.wait()
+
+        # Scan times are stored in seconds, Files scanned in the same second
+        # the walk starts are never removed.
+        time.sleep(1)
+        os.remove(paths[0])
+        renamed = os.path.join(root, "renamed.txt")
+        os.rename(paths[1], renamed)
+        c.traverse()
+        c.wait()
+        self.assertIsNone(self.db.file_get_by_path(paths[0]))
+        self.assertIsNone(self.db.file_get_by_path(paths[1]))
+        f = self.db.file_get_by_path(renamed)
+        self.assertIsNotNone(f)
+        self.assertEqual(f.content, "word0x1 is in file 1 of folder 0\n")
+        self.assertIn(f.fid, [x.fid for x in self.db.search("word0x1")])
+        for path in paths[2:]:
+            self.assertIsNotNone(self.db.file_get_by_path(path), path)
+
+    def test_05_orphans(self) -> None:
+        """Test that a shared File whose blob has gone missing is not written
+        without its text, but extracted again."""
+        root = os.path.join(self.tmpdir.name, "tree5")
+        paths = make_tree(root, 1, 2)
+        for path in paths:
+            with open(path, "a", encoding="utf-8") as fh:
+                fh.write("orphan\n")
+        fldr = Folder(path=root)
+        with self.db:
+            self.db.folder_add(fldr)
+
+        def orphan(path: str) -> File:
+            f = File(path, {"folder_id": fldr.fid, "shared": True})
+            f.set_stat(os.stat(path))
+            f.compute_hash()
+            return f
+
+        c = self.crawl(root)
+        buf = WriteBuffer(c.pool)
+        f = orphan(paths[0])
+        buf.put(f)
+        buf.flush()
+        self.assertEqual(buf.orphans, [f])
+        self.assertIsNone(self.db.file_get_by_path(f.path))
+
+        c.start()
+        c.resultq.put(orphan(paths[1]))
+        c.drain()
+        f = self.db.file_get_by_path(paths[1])
+        self.assertIsNotNone(f)
+        self.assertEqual(f.content, "word0x1 is in file 1 of folder 0\norphan\n")
+        self.assertIsNotNone(self.db.blob_get_meta(f.hash))
+
+    def test_06_blacklist(self) -> None:
+        """Test that blacklisted files are skipped, and the hits are counted
+        once the walk is done."""
+        root = os.path.join(self.tmpdir.name, "tree6")
+        paths = make_tree(root, 2, 2)
+        for path in paths:
+            os.rename(path, path + ".bak")
+        c = self.crawl(root)
+        c.blacklist = Blacklist(BlacklistItem("[.]bak$"), BlacklistItem("^nope$"))
+        c.traverse()
+        c.wait()
+        self.assertEqual([p.cnt for p in c.blacklist.patterns], [len(paths), 0])
+        for path in paths:
+            self.assertIsNone(self.db.file_get_by_path(path + ".bak"))
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-# Time-stamp: <2024-02-24 15:24:39 krylon>
+# Time-stamp: <2026-10-18 07:49:10 krylon>
 #
 # /data/code/python/pythia/test_database.py
 # created on 23. 02. 2024
@@ -18,15 +18,19 @@ pythia.test_database
 """
 
 import os
+import pickle
 import sqlite3
 import unittest
 from datetime import datetime
-from typing import Final
+from threading import Thread
+from typing import Final, Iterator
+from unittest import mock
 
 from krylib import isdir
 
-from pythia import common, database
-from pythia.data import File, FileType, Folder
+from pythia import common, database, profiler
+from pythia.data import (Checkpoint, Failure, FailureKind, File, FileType,
+                         Folder, ProfileKind)
 
 TEST_ROOT: str = "/tmp/"
 
@@ -126,6 +130,457 @@ class DatabaseTest(unittest.TestCase):
             with self.assertRaises(sqlite3.IntegrityError):
                 db.file_add(f2)
 
+    def test_06_file_search(self) -> None:
+        """Try searching the full text index, and check that it follows
+        updates and deletions of files."""
+        db = self.__get_db()
+        f = File("/home/capybara/Documents/fables.txt",
+                 {"folder_id": 1,
+                  "content_type": FileType.Text,
+                  "meta": {"author": "Aesop"},
+                  "content": "The quick brown fox jumps over the lazy dog.",
+                  })
+        with db:
+            db.file_add(f)
+
+        results = db.search("fox")
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].fid, f.fid)
+        self.assertEqual(results[0].meta["author"], "Aesop")
+        self.assertEqual(len(db.search("aesop")), 1)
+        self.assertEqual(len(db.search("capybara")), 2)
+        self.assertEqual(len(db.search("wombat")), 0)
+
+        f.content = "The tortoise and the hare"
+        with db:
+            db.file_update(f)
+        self.assertEqual(len(db.search("fox")), 0)
+        self.assertEqual(len(db.search("tortoise")), 1)
+
+        with db:
+            db.file_delete(f)
+        self.assertEqual(len(db.search("tortoise")), 0)
+
+    def test_07_file_add_many(self) -> None:
+        """Try adding and updating Files in bulk."""
+        db = self.__get_db()
+        files: list[File] = [File(f"/home/capybara/Documents/note{i:03d}.txt",
+                                  {"folder_id": 1,
+                                   "content_type": FileType.Text,
+                                   "content": f"Note number {i}",
+                                   }) for i in range(100)]
+        with db:
+            db.file_add_many(files)
+
+        for f in files:
+            self.assertNotEqual(f.fid, 0)
+            self.assertEqual(db.file_get_by_id(f.fid).path, f.path)
+
+        for f in files:
+            f.content = "Nevermind"
+        with db:
+            db.file_update_many(files)
+        self.assertEqual(len(db.search("nevermind", limit=1000)), len(files))
+
+    def test_08_file_get_stat_by_folder(self) -> None:
+        """Try loading the stat data for a Folder."""
+        db = self.__get_db()
+        folder = db.folder_get_by_path("/home/capybara/Documents")
+        self.assertIsNotNone(folder)
+        stat = db.file_get_stat_by_folder(folder)
+        self.assertEqual(len(stat), 101)
+        path: Final[str] = "/home/capybara/Documents/sunset.jpg"
+        self.assertIn(path, stat)
+        f = db.file_get_by_path(path)
+        self.assertEqual(stat[path],
+                         (f.fid, int(datetime(2024, 2, 7, 18, 21, 14).timestamp()), 0))
+
+    def test_09_file_delete_by_prefix(self) -> None:
+        """Try removing all Files below a directory."""
+        db = self.__get_db()
+        files: list[File] = [File(p, {"folder_id": 1}) for p in (
+            "/home/capybara/Music/Jazz/one.mp3",
+            "/home/capybara/Music/Jazz/Bebop/two.mp3",
+            "/home/capybara/Music/Jazzrock/three.mp3",
+        )]
+        with db:
+            db.file_add_many(files)
+            db.file_delete_by_prefix("/home/capybara/Music/Jazz/")
+        ids = db.file_get_ids(f.path for f in files)
+        self.assertEqual(list(ids), ["/home/capybara/Music/Jazzrock/three.mp3"])
+
+    def test_10_blob(self) -> None:
+        """Try storing Files with identical content."""
+        db = self.__get_db()
+        files: list[File] = [File(p, {"folder_id": 1,
+                                      "content_type": FileType.PDF,
+                                      "meta": {"Author": "Arthur Dent"},
+                                      "content": "Mostly harmless",
+                                      "hash": "0123456789abcdef"}) for p in (
+            "/home/capybara/Documents/guide.pdf",
+            "/home/capybara/Downloads/guide.pdf",
+            "/home/capybara/Backup/guide.pdf",
+        )]
+        self.assertIsNone(db.blob_get_meta("0123456789abcdef"))
+        with db:
+            db.file_add(files[0])
+            db.file_add_many(files[1:])
+        self.assertEqual(db.blob_get_meta("0123456789abcdef"), {"Author": "Arthur Dent"})
+
+        cnt = db.db.execute("SELECT COUNT(*) FROM file WHERE hash IS NOT NULL AND content <> ''").fetchone()[0]
+        self.assertEqual(cnt, 0)
+        self.assertEqual(len(db.search("harmless")), 3)
+        f = db.file_get_by_path("/home/capybara/Backup/guide.pdf")
+        self.assertEqual(f.content, "Mostly harmless")
+        self.assertEqual(f.hash, "0123456789abcdef")
+
+        # Updating the Files removes the old blob once nobody uses it.
+        for f in files:
+            f.content = "Share and enjoy"
+            f.hash = "fedcba9876543210"
+        with db:
+            db.file_update(files[0])
+        self.assertIsNotNone(db.blob_get_meta("0123456789abcdef"))
+        with db:
+            db.file_update_many(files[1:])
+        self.assertIsNone(db.blob_get_meta("0123456789abcdef"))
+        self.assertEqual(len(db.search("harmless")), 0)
+        self.assertEqual(len(db.search("enjoy")), 3)
+
+        with db:
+            db.file_delete(files[0])
+            self.assertEqual(db.blob_purge(), 0)
+            db.file_delete_by_path(f.path for f in files[1:])
+            self.assertEqual(db.blob_purge(), 1)
+        self.assertEqual(len(db.search("enjoy")), 0)
+
+        # A shared File does not bring its content, it never creates a blob.
+        f = File("/home/capybara/Documents/guide.pdf",
+                 {"folder_id": 1, "hash": "0123456789abcdef", "shared": True})
+        self.assertEqual(db.blob_get_missing([f.hash]), {f.hash})
+        with db:
+            db.file_add(f)
+        self.assertIsNone(db.blob_get_meta(f.hash))
+        with db:
+            db.file_delete(f)
+
+    def test_11_failure(self) -> None:
+        """Try recording Failures."""
+        db = self.__get_db()
+        failures: list[Failure] = [
+            Failure(path="/home/capybara/Documents/broken.pdf",
+                    kind=FailureKind.Crash,
+                    timestamp=datetime(2024, 2, 24, 15, 2, 22)),
+            Failure(path="/home/capybara/Documents/huge.pdf",
+                    kind=FailureKind.Timeout,
+                    message="Deadline exceeded",
+                    timestamp=datetime(2024, 2, 25, 15, 2, 22)),
+        ]
+        with db:
+            db.failure_add_many(failures)
+        recent = db.failure_get_recent(1)
+        self.assertEqual(len(recent), 1)
+        self.assertEqual(recent[0], failures[1])
+
+    def test_12_search_snippets(self) -> None:
+        """Try searching for snippets with the matches marked."""
+        db = self.__get_db()
+        words = " ".join(f"word{i}" for i in range(1000))
+        f = File("/home/capybara/Documents/haystack.txt",
+                 {"folder_id": 1,
+                  "content_type": FileType.Text,
+                  "content": f"{words} needle {words}",
+                  })
+        with db:
+            db.file_add(f)
+
+        hits = db.search_snippets("needle", size=10)
+        self.assertEqual(len(hits), 1)
+        hit = hits[0]
+        self.assertEqual(hit.fid, f.fid)
+        self.assertEqual(hit.path, f.path)
+        self.assertEqual(hit.path_matches, [])
+        self.assertLess(len(hit.snippet), 200)
+        self.assertEqual(len(hit.matches), 1)
+        start, end = hit.matches[0]
+        self.assertEqual(hit.snippet[start:end], "needle")
+
+        hits = db.search_snippets("haystack OR word500")
+        self.assertEqual(len(hits), 1)
+        start, end = hits[0].path_matches[0]
+        self.assertEqual(hits[0].path[start:end], "haystack")
+        self.assertIn("word500", hits[0].snippet)
+
+    def test_13_lazy_loading(self) -> None:
+        """Test that Files loaded from the database fetch their metadata and
+        text only when needed."""
+        db = self.__get_db()
+        path = "/home/capybara/Documents/haystack.txt"
+        f = db.file_get_by_path(path)
+        self.assertIsNotNone(f)
+        self.assertIsNone(f._content)  # pylint: disable-msg=W0212
+        self.assertIsNone(f._meta)  # pylint: disable-msg=W0212
+        self.assertIn("needle", f.content)
+        self.assertEqual(f.meta, {})
+
+        f = db.file_get_by_path(path)
+        copy = pickle.loads(pickle.dumps(f))
+        self.assertIsNone(copy.loader)
+        self.assertEqual(copy.content, f.content)
+
+        headers = list(db.file_get_headers_by_folder(1))
+        files = db.file_iter_by_folder(1)
+        self.assertIsInstance(files, Iterator)
+        self.assertEqual([h.path for h in headers], [f.path for f in files])
+        self.assertIn(path, [h.path for h in headers])
+
+    def test_14_pool(self) -> None:
+        """Test the DatabasePool's read/write split."""
+        pool = database.DatabasePool(common.path.db())
+        reader = pool.reader()
+        self.assertIs(pool.reader(), reader)
+        with self.assertRaises(sqlite3.OperationalError):
+            with reader:
+                reader.folder_add(Folder(path="/home/capybara/Pictures"))
+
+        others: list[database.Database] = []
+        thr = Thread(target=lambda: others.append(pool.reader()))
+        thr.start()
+        thr.join()
+        self.assertIsNot(others[0], reader)
+
+        f = File("/home/capybara/Documents/pool.txt", {"folder_id": 1, "content": "Splash"})
+        with pool.writer() as db:
+            db.file_add(f)
+        self.assertEqual(len(reader.search("splash")), 1)
+        pool.release()
+        self.assertIsNot(pool.reader(), reader)
+        pool.close()
+
+    def test_15_profile(self) -> None:
+        """Test profiling queries and storing the report."""
+        prof = profiler.enable(top_n=2)
+        self.addCleanup(profiler.disable)
+        db = database.Database(common.path.db())
+        for _ in range(3):
+            db.search("needle")
+        db.file_get_by_path("/home/capybara/Documents/haystack.txt")
+        for i, secs in enumerate((0.5, 3.0, 1.0)):
+            prof.file(f"/home/capybara/Documents/slow{i}.pdf", secs, "PDFExtractor")
+
+        report = prof.report(database.QUERY_TEXT)
+        files = [e for e in report if e.kind == ProfileKind.Extract]
+        self.assertEqual([e.seconds for e in files], [3.0, 1.0])
+        queries = {e.subject: e for e in report if e.kind == ProfileKind.Query}
+        self.assertIn("FileSearch", queries)
+        self.assertEqual(queries["FileSearch"].calls, 3)
+        self.assertIn("MATCH", queries["FileSearch"].detail)
+
+        with db:
+            db.profile_add_many(report)
+        saved = db.profile_get()
+        self.assertEqual([e.subject for e in saved[:2]], [e.subject for e in files])
+        self.assertEqual(len(saved), len(report))
+        db.close()
+
+    def test_16_delete_many(self) -> None:
+        """Test removing Files in bulk, along with their index entries."""
+        db = self.__get_db()
+        files = [File(f"/home/capybara/Documents/gone{i}.txt",
+                      {"folder_id": 1, "content": f"Ephemeral {i}"})
+                 for i in range(3)]
+        with db:
+            db.file_add_many(files)
+        self.assertEqual(len(db.search("ephemeral")), 3)
+        with db:
+            self.assertEqual(db.file_delete_many(f.fid for f in files[:2]), 2)
+        self.assertIsNone(db.file_get_by_id(files[0].fid))
+        self.assertEqual([f.path for f in db.search("ephemeral")], [files[2].path])
+
+    def test_17_checkpoint(self) -> None:
+        """Test saving and loading Checkpoints."""
+        db = self.__get_db()
+        folder = db.folder_get_by_path("/home/capybara/Documents")
+        self.assertIsNotNone(folder)
+        self.assertIsNone(db.checkpoint_get(folder))
+        frontier = ["/home/capybara/Documents/a", "/home/capybara/Documents/b"]
+        with db:
+            db.checkpoint_set(Checkpoint(folder=folder, frontier=frontier[:1]))
+            db.checkpoint_set(Checkpoint(folder=folder, frontier=frontier))
+        cp = db.checkpoint_get(folder)
+        self.assertIsNotNone(cp)
+        self.assertEqual(cp.frontier, frontier)
+        self.assertIs(cp.folder, folder)
+        with db:
+            db.checkpoint_delete(folder)
+        self.assertIsNone(db.checkpoint_get(folder))
+
+    def test_18_find(self) -> None:
+        """Test queries with filters, and paging through the results."""
+        db = self.__get_db()
+        files = [File(f"/home/capybara/Documents/music/track{i:02d}.mp3",
+                      {"folder_id": 1,
+                       "mtime": datetime(2024, i % 12 + 1, 1),
+                       "content_type": FileType.Other,
+                       "mime_type": "audio/mpeg",
+                       "meta": {"artist": "Miles Davis" if i % 2 == 0 else "John Coltrane",
+                                "album": "Kind of Blue"},
+                       "content": "draft" if i % 3 == 0 else ""})
+                 for i in range(14)]
+        with db:
+            db.file_add_many(files)
+
+        page = db.find('artist:"miles davis" kind* -draft modified:>2024-02 mime:audio/*')
+        self.assertEqual(sorted(f.path for f in page.files),
+                         [files[i].path for i in (2, 4, 8, 10)])
+        self.assertEqual(page.cursor, "")
+        self.assertEqual(len(db.find("artist:john* path:/home/capybara/Documents/music").files),
+                         7)
+
+        for q in ("kind", "path:/home/capybara/Documents/music"):
+            seen: list[str] = []
+            cursor = ""
+            while True:
+                page = db.find(q, limit=3, cursor=cursor)
+                seen.extend(f.path for f in page.files)
+                if page.cursor == "":
+                    break
+                cursor = page.cursor
+            self.assertEqual(sorted(seen), [f.path for f in files])
+
+    def test_19_promote(self) -> None:
+        """Test looking up Files by promoted metadata keys."""
+        db = self.__get_db()
+        self.assertEqual(db.promoted["Title"], "meta_title")
+        self.assertEqual(db.facet("artist"), [("John Coltrane", 7), ("Miles Davis", 7)])
+        plan = db.db.execute("EXPLAIN QUERY PLAN SELECT id FROM file WHERE meta_album = ?",
+                             ("kind of blue", )).fetchall()
+        self.assertIn("file_meta_album_idx", plan[0][3])
+        self.assertEqual(len(db.find("album:kind*").files), 14)
+
+        with db:
+            db.file_add(File("/home/capybara/Documents/taocp.pdf",
+                             {"folder_id": 1,
+                              "content_type": FileType.PDF,
+                              "meta": {"Author": "Donald Knuth", "Title": "TAOCP"}}))
+        self.assertEqual(db.facet("author"), [("Donald Knuth", 1)])
+        self.assertEqual([f.path for f in db.find("title:taocp").files],
+                         ["/home/capybara/Documents/taocp.pdf"])
+        self.assertEqual([f.path for f in db.find("type:pdf").files],
+                         ["/home/capybara/Documents/taocp.pdf"])
+        self.assertEqual(len(db.find("-type:pdf album:kind*").files), 14)
+        self.assertEqual(len(db.find("type:text album:kind*").files), 0)
+
+        db.promote({"creator": ["artist", "Author"]})
+        self.assertEqual(db.facet("creator")[0], ("Donald Knuth", 1))
+        with self.assertRaises(ValueError):
+            db.facet("artist")
+        db.promote(database.PROMOTED)
+        self.assertEqual(len(db.facet("artist")), 2)
+
+    def test_20_delete_unseen(self) -> None:
+        """Test removing the Files of a Folder that were not marked as seen."""
+        db = self.__get_db()
+        with db:
+            folder = Folder(path="/home/capybara/Pictures")  # pylint: disable-msg=E1125
+            db.folder_add(folder)
+            old = [File(f"/home/capybara/Pictures/old{i}.jpg",
+                        {"folder_id": folder.fid, "time_scanned": datetime(2024, 1, 1)})
+                   for i in range(3)]
+            db.file_add_many(old)
+            new = File("/home/capybara/Pictures/new.jpg", {"folder_id": folder.fid})
+            db.file_add(new)
+        stat = db.file_get_stat_by_paths([old[0].path, "/home/capybara/Pictures/nope.jpg"])
+        self.assertEqual(list(stat), [old[0].path])
+        self.assertEqual(stat[old[0].path][0], old[0].fid)
+
+        with db:
+            db.file_seen_clear(folder)
+            db.file_seen_add(folder, [old[0].fid])
+            db.file_seen_add(folder, [old[0].fid, old[1].fid])
+            self.assertEqual(db.file_delete_unseen(folder, datetime(2025, 1, 1)), 1)
+        self.assertIsNone(db.file_get_by_path(old[2].path))
+        for f in (old[0], old[1], new):
+            self.assertIsNotNone(db.file_get_by_path(f.path))
+
+    def test_21_failed_migration(self) -> None:
+        """Test that a migration that fails halfway is rolled back as a whole."""
+        path: Final[str] = os.path.join(self.folder, "migrate.db")
+        database.Database(path).close()
+        with sqlite3.connect(path) as conn:
+            conn.execute(f"PRAGMA user_version = {database.SCHEMA_VERSION - 1}")
+        conn.close()
+
+        broken = database.MIGRATIONS[:-1] + [["CREATE TABLE canary (id INTEGER)",
+                                              "THIS IS NOT SQL"]]
+        with mock.patch("pythia.database.MIGRATIONS", broken):
+            with self.assertRaises(sqlite3.OperationalError):
+                database.Database(path)
+
+        conn = sqlite3.connect(path)
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0],
+                         database.SCHEMA_VERSION - 1)
+        self.assertIsNone(conn.execute("SELECT name FROM sqlite_master WHERE name = 'canary'")
+                          .fetchone())
+        conn.close()
+
+        db = database.Database(path)
+        self.assertEqual(db.db.execute("PRAGMA user_version").fetchone()[0],
+                         database.SCHEMA_VERSION)
+        db.close()
+
+    def test_22_promote_on_open(self) -> None:
+        """Test that opening a database changes the promoted columns only
+        when asked to, or when the schema is migrated."""
+        path: Final[str] = os.path.join(self.folder, "promote.db")
+        database.Database(path).close()
+        spec: Final[dict[str, list[str]]] = {"creator": ["artist", "Author"]}
+        with mock.patch("pythia.database.promoted", return_value=spec):
+            db = database.Database(path)
+            self.assertEqual(db.promoted["artist"], "meta_artist")
+            db.close()
+
+            db = database.Database(path, promote=spec)
+            self.assertEqual(db.promoted["artist"], "meta_creator")
+            self.assertNotIn("Title", db.promoted)
+            db.close()
+
+        with sqlite3.connect(path) as conn:
+            conn.execute(f"PRAGMA user_version = {database.SCHEMA_VERSION - 1}")
+        conn.close()
+        db = database.Database(path)
+        self.assertEqual(db.promoted["Title"], "meta_title")
+        db.db.execute("SELECT meta_artist, meta_title FROM file").fetchall()
+        db.close()
+
+    def test_23_nested_transaction(self) -> None:
+        """Test that a nested transaction does not commit the outer one, and
+        can be rolled back on its own."""
+        db = self.__get_db()
+        paths: Final[list[str]] = [f"/home/capybara/Nested/file{i}.txt" for i in range(3)]
+        with db:
+            db.file_add(File(paths[0], {"folder_id": 1}))
+            with db:
+                db.file_add(File(paths[1], {"folder_id": 1}))
+            self.assertTrue(db.db.in_transaction)
+            with self.assertRaises(sqlite3.IntegrityError):
+                with db:
+                    db.file_add(File(paths[2], {"folder_id": 1}))
+                    db.file_add(File(paths[0], {"folder_id": 1}))
+            self.assertTrue(db.db.in_transaction)
+        self.assertFalse(db.db.in_transaction)
+        self.assertIsNotNone(db.file_get_by_path(paths[0]))
+        self.assertIsNotNone(db.file_get_by_path(paths[1]))
+        self.assertIsNone(db.file_get_by_path(paths[2]))
+
+        with self.assertRaises(ValueError):
+            with db:
+                db.file_add(File(paths[2], {"folder_id": 1}))
+                with db:
+                    raise ValueError("Nope")
+        self.assertFalse(db.db.in_transaction)
+        self.assertIsNone(db.file_get_by_path(paths[2]))
+
 # Local Variables: #
 # python-indent: 4 #
 # End: #
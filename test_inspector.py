@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:52:01 krylon>
+#
+# /data/code/python/pythia/test_inspector.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.test_inspector
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pythia.data import FailureKind, File
+from pythia.extractor.base import Extractor
+from pythia.inspector import Inspector, Registry, Timeout
+
+
+class DummyExtractor(Extractor):  # pylint: disable-msg=R0903
+    """Base for the Extractors we use to test the Registry."""
+
+    def __init__(self) -> None:  # pylint: disable-msg=W0231
+        self.name = self.__class__.__name__
+
+    def process(self, f: File) -> bool:
+        return True
+
+
+class GifExtractor(DummyExtractor):  # pylint: disable-msg=R0903
+    """Pretends to handle GIF images."""
+    suffixes = ("gif", )
+    mime_types = ("image/gif", )
+    magic = (b"GIF87a", b"GIF89a")
+
+
+class ZipExtractor(DummyExtractor):  # pylint: disable-msg=R0903
+    """Pretends to handle zip archives."""
+    suffixes = ("zip", "bin")
+    magic = (b"PK\x03\x04", )
+
+
+class ElfExtractor(DummyExtractor):  # pylint: disable-msg=R0903
+    """Pretends to handle executables."""
+    suffixes = ("bin", )
+    magic = (b"\x7fELF", )
+
+
+class RegistryTest(unittest.TestCase):
+    """Tests for the extractor Registry."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable-msg=R1732
+        files = {
+            "image.gif": b"GIF89a...",
+            "image": b"GIF87a...",
+            "archive.bin": b"PK\x03\x04...",
+            "program.bin": b"\x7fELF...",
+            "notes": b"Nothing to see here",
+            "image.giff": b"GIF89a...",
+        }
+        for name, data in files.items():
+            with open(os.path.join(cls.tmpdir.name, name), "wb") as fh:
+                fh.write(data)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmpdir.cleanup()
+
+    def test_lookup(self) -> None:
+        """Test finding the right Extractor for a file."""
+        reg = Registry(GifExtractor, ZipExtractor, ElfExtractor)
+        test_cases = (
+            ("image.gif", GifExtractor),
+            ("image", GifExtractor),
+            ("archive.bin", ZipExtractor),
+            ("program.bin", ElfExtractor),
+            ("notes", None),
+            ("image.giff", None),
+            ("missing.gif", GifExtractor),
+            ("missing", None),
+        )
+
+        for c in test_cases:
+            f = File(os.path.join(self.tmpdir.name, c[0]), {})
+            self.assertIs(reg.lookup(f), c[1], c[0])
+
+    def test_instances(self) -> None:
+        """Test that Extractors are instantiated only once."""
+        reg = Registry(GifExtractor, ZipExtractor)
+        f1 = File(os.path.join(self.tmpdir.name, "image.gif"), {})
+        f2 = File(os.path.join(self.tmpdir.name, "image"), {})
+        ex = reg.get(f1)
+        self.assertIsInstance(ex, GifExtractor)
+        self.assertIs(reg.get(f2), ex)
+        self.assertIsNone(reg.get(File(os.path.join(self.tmpdir.name, "notes"), {})))
+
+    def test_dedup(self) -> None:
+        """Test that only expensive Extractors look for copies of a file."""
+        class CheapExtractor(GifExtractor):  # pylint: disable-msg=R0903
+            """Not worth hashing the file for."""
+
+        class CostlyExtractor(GifExtractor):  # pylint: disable-msg=R0903
+            """Worth hashing the file for."""
+            dedup = True
+
+        db = mock.Mock()
+        db.blob_get_meta.return_value = {"Title": "Seen before"}
+        insp = Inspector(db)
+        path: str = os.path.join(self.tmpdir.name, "image.gif")
+
+        with mock.patch.object(insp, "get_extractor", return_value=CheapExtractor()):
+            f = File(path, {})
+            self.assertIsNone(insp.inspect(f))
+            self.assertEqual(f.hash, "")
+            self.assertFalse(f.shared)
+            db.blob_get_meta.assert_not_called()
+
+        with mock.patch.object(insp, "get_extractor", return_value=CostlyExtractor()):
+            f = File(path, {})
+            self.assertIsNone(insp.inspect(f))
+            self.assertNotEqual(f.hash, "")
+            self.assertTrue(f.shared)
+            self.assertEqual(f.meta, {"Title": "Seen before"})
+            db.blob_get_meta.assert_called_once_with(f.hash)
+
+    def test_timeout(self) -> None:
+        """Test that an Extractor cannot swallow a Timeout by accident."""
+        class SloppyExtractor(GifExtractor):  # pylint: disable-msg=R0903
+            """Catches everything it can."""
+
+            def process(self, f: File) -> bool:
+                try:
+                    raise Timeout()
+                except Exception:  # pylint: disable-msg=W0718
+                    return True
+
+        insp = Inspector()
+        with mock.patch.object(insp, "get_extractor", return_value=SloppyExtractor()):
+            failure = insp.inspect(File(os.path.join(self.tmpdir.name, "image.gif"), {}))
+        self.assertIsNotNone(failure)
+        self.assertEqual(failure.kind, FailureKind.Timeout)
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
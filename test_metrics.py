@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 06:45:16 krylon>
+#
+# /data/code/python/pythia/test_metrics.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.test_metrics
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from pythia import metrics
+
+
+class MetricsTest(unittest.TestCase):
+    """Tests for the metrics Registry."""
+
+    def test_01_disabled(self) -> None:
+        """Test that a disabled Registry hands out the dummy metric."""
+        reg = metrics.Registry()
+        self.assertIs(reg.counter("c", "A counter"), metrics.NULL)
+        self.assertIs(reg.histogram("h", "A histogram"), metrics.NULL)
+        reg.counter("c", "A counter").inc()
+        self.assertEqual(reg.snapshot()["metrics"], {})
+
+    def test_02_snapshot(self) -> None:
+        """Test collecting metrics and taking a snapshot."""
+        reg = metrics.Registry(True)
+        reg.counter("files_total", "Files").inc()
+        reg.counter("files_total", "Files").inc(2)
+        reg.counter("failures_total", "Failures", kind="Crash").inc()
+        reg.gauge("depth", "Queue depth", lambda: 42, queue="files")
+        hist = reg.histogram("seconds", "Durations", (0.1, 1.0), extractor="PDF")
+        for v in (0.05, 0.5, 0.5, 5.0):
+            hist.observe(v)
+
+        snap = reg.snapshot()["metrics"]
+        self.assertEqual(snap["files_total"]["samples"], [{"labels": {}, "value": 3}])
+        self.assertEqual(snap["failures_total"]["samples"][0]["labels"], {"kind": "Crash"})
+        self.assertEqual(snap["depth"]["samples"][0]["value"], 42)
+        h = snap["seconds"]["samples"][0]["value"]
+        self.assertEqual(h["count"], 4)
+        self.assertAlmostEqual(h["sum"], 6.05)
+        self.assertEqual(h["buckets"], {"0.1": 1, "1": 3, "+Inf": 4})
+
+        with self.assertRaises(TypeError):
+            reg.histogram("files_total", "Files")
+
+    def test_03_export(self) -> None:
+        """Test the Prometheus and JSON exports."""
+        reg = metrics.Registry(True)
+        reg.counter("files_total", "Files").inc(7)
+        reg.histogram("seconds", "Durations", (1.0, ), extractor='a"b').observe(0.5)
+
+        text = reg.to_prometheus()
+        self.assertIn("# TYPE files_total counter\nfiles_total 7\n", text)
+        self.assertIn('seconds_bucket{extractor="a\\"b",le="1"} 1\n', text)
+        self.assertIn('seconds_bucket{extractor="a\\"b",le="+Inf"} 1\n', text)
+        self.assertIn('seconds_count{extractor="a\\"b"} 1\n', text)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "pythia.json")
+            reg.write(path)
+            with open(path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+            self.assertEqual(data["metrics"]["files_total"]["samples"][0]["value"], 7)
+            self.assertEqual(os.listdir(tmp), ["pythia.json"])
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:54:53 krylon>
+#
+# /data/code/python/pythia/test_office.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.test_office
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import tempfile
+import unittest
+import zipfile
+
+from pythia.data import File, FileType
+from pythia.extractor.odt import ODTExtractor
+from pythia.extractor.base import truncate
+from pythia.extractor.ooxml import OOXMLExtractor
+from pythia.extractor.xmltext import TextBuffer
+
+ODT_CONTENT = """<?xml version="1.0" encoding="UTF-8"?>
+<office:document-content
+  xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"
+  xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+  xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0">
+ <office:body><office:text>
+  <text:h>Chapter<text:s/>One</text:h>
+  <text:p>It was a <text:span>dark</text:span> and stormy night.<text:line-break/>Really.</text:p>
+  <text:p>Hidden<office:annotation><text:p>A comment</text:p></office:annotation> notes</text:p>
+  <table:table><table:table-row>
+   <table:table-cell><text:p>Cell 1</text:p></table:table-cell>
+   <table:table-cell><text:p>Cell 2</text:p></table:table-cell>
+  </table:table-row></table:table>
+ </office:text></office:body>
+</office:document-content>
+"""
+
+ODT_META = """<?xml version="1.0" encoding="UTF-8"?>
+<office:document-meta
+  xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"
+  xmlns:meta="urn:oasis:names:tc:opendocument:xmlns:meta:1.0"
+  xmlns:dc="http://purl.org/dc/elements/1.1/">
+ <office:meta>
+  <dc:title>Stormy</dc:title>
+  <dc:creator>Snoopy</dc:creator>
+  <meta:keyword>dog</meta:keyword>
+  <meta:keyword>novel</meta:keyword>
+  <meta:document-statistic meta:page-count="1" meta:word-count="12"/>
+  <meta:user-defined meta:name="Status">Draft</meta:user-defined>
+ </office:meta>
+</office:document-meta>
+"""
+
+DOCX_DOCUMENT = """<?xml version="1.0" encoding="UTF-8"?>
+<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">
+ <w:body>
+  <w:p><w:r><w:t>Hello</w:t></w:r><w:r><w:tab/><w:t>World</w:t></w:r></w:p>
+  <w:p><w:r><w:instrText>PAGE</w:instrText></w:r><w:r><w:t>Second paragraph</w:t></w:r></w:p>
+ </w:body>
+</w:document>
+"""
+
+DOCX_CORE = """<?xml version="1.0" encoding="UTF-8"?>
+<cp:coreProperties
+  xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties"
+  xmlns:dc="http://purl.org/dc/elements/1.1/">
+ <dc:title>Greeting</dc:title>
+ <dc:creator>Linus</dc:creator>
+</cp:coreProperties>
+"""
+
+XLSX_STRINGS = """<?xml version="1.0" encoding="UTF-8"?>
+<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+ <si><t>Revenue</t></si>
+ <si><r><t>Cost </t></r><r><t>of goods</t></r></si>
+</sst>
+"""
+
+PPTX_SLIDE = """<?xml version="1.0" encoding="UTF-8"?>
+<p:sld xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main"
+       xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main">
+ <p:cSld><p:spTree><p:sp><p:txBody><a:p><a:r><a:t>Slide {}</a:t></a:r></a:p></p:txBody></p:sp>
+ </p:spTree></p:cSld>
+</p:sld>
+"""
+
+
+class OfficeTest(unittest.TestCase):
+    """Tests for the ODF and OOXML Extractors."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable-msg=R1732
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmpdir.cleanup()
+
+    def __archive(self, name: str, members: dict[str, str]) -> File:
+        path = os.path.join(self.tmpdir.name, name)
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for member, data in members.items():
+                zf.writestr(member, data)
+        return File(path, {})
+
+    def test_odt(self) -> None:
+        """Test extracting text and metadata from an ODF text document."""
+        f = self.__archive("novel.odt", {
+            "mimetype": "application/vnd.oasis.opendocument.text",
+            "content.xml": ODT_CONTENT,
+            "meta.xml": ODT_META,
+        })
+        self.assertTrue(ODTExtractor().process(f))
+        self.assertEqual(f.content_type, FileType.Document)
+        self.assertEqual(f.content.split("\n"), [
+            "Chapter One",
+            "It was a dark and stormy night.",
+            "Really.",
+            "Hidden notes",
+            "Cell 1",
+            "Cell 2",
+        ])
+        self.assertEqual(f.meta["title"], "Stormy")
+        self.assertEqual(f.meta["creator"], "Snoopy")
+        self.assertEqual(f.meta["keyword"], ["dog", "novel"])
+        self.assertEqual(f.meta["page-count"], "1")
+        self.assertEqual(f.meta["Status"], "Draft")
+
+    def test_odt_limit(self) -> None:
+        """Test that we stop extracting text at the size limit."""
+        f = self.__archive("limit.odt", {"content.xml": ODT_CONTENT})
+        self.assertTrue(ODTExtractor(20).process(f))
+        self.assertEqual(f.meta["truncated"], "bytes")
+        self.assertLessEqual(len(f.content.encode("utf-8")), 20)
+
+    def test_text_buffer(self) -> None:
+        """Test that the size limit counts bytes, not characters, and that
+        characters are not cut in half."""
+        buf = TextBuffer(10)
+        self.assertTrue(buf.add("ääää"))
+        self.assertFalse(buf.add("ää"))
+        self.assertEqual(buf.text(), "ääää\n")
+        self.assertEqual(truncate("Äpfel", 2), "Ä")
+        self.assertEqual(truncate("Äpfel", 1), "")
+
+    def test_ooxml(self) -> None:
+        """Test extracting text from OOXML documents."""
+        test_cases = (
+            ("greeting.docx",
+             {"word/document.xml": DOCX_DOCUMENT, "docProps/core.xml": DOCX_CORE},
+             "Hello\tWorld\nSecond paragraph"),
+            ("numbers.xlsx",
+             {"xl/sharedStrings.xml": XLSX_STRINGS, "xl/workbook.xml": "<workbook/>"},
+             "Revenue\nCost of goods"),
+            ("talk.pptx",
+             {f"ppt/slides/slide{i}.xml": PPTX_SLIDE.format(i) for i in (10, 2, 1)},
+             "Slide 1\nSlide 2\nSlide 10"),
+        )
+
+        for c in test_cases:
+            f = self.__archive(c[0], c[1])
+            self.assertTrue(OOXMLExtractor().process(f), c[0])
+            self.assertEqual(f.content, c[2], c[0])
+
+        f = self.__archive("greeting.docx", test_cases[0][1])
+        OOXMLExtractor().process(f)
+        self.assertEqual(f.meta["title"], "Greeting")
+        self.assertEqual(f.meta["creator"], "Linus")
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:54:53 krylon>
+#
+# /data/code/python/pythia/test_pdf.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.test_pdf
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import tempfile
+import unittest
+
+from pythia.data import File, FileType
+from pythia.extractor.pdf import PDFExtractor
+
+PAGES: list[str] = [f"This is page number {i}" for i in range(1, 6)]
+
+
+def _pdf(title: str, pages: list[str]) -> bytes:
+    """Build a minimal PDF document with one line of text per page, like
+    the ones the benchmark generates, only longer."""
+    cnt: int = len(pages)
+    # Objects 1 and 2 are the catalog and the page tree, 3 the font, 4 the
+    # info dictionary, followed by a page and its contents for each page.
+    kids: str = " ".join(f"{5 + 2 * i} 0 R" for i in range(cnt))
+    objects: list[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {cnt} >>".encode("latin-1"),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        f"<< /Title ({title}) /Author (Pythia) >>".encode("latin-1"),
+    ]
+    for i, text in enumerate(pages):
+        stream = f"BT /F1 10 Tf 36 756 Td ({text}) Tj ET".encode("latin-1")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] " +
+                       b"/Contents %d 0 R /Resources << /Font << /F1 3 0 R >> >> >>" % (6 + 2 * i))
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    out: bytes = b"%PDF-1.4\n"
+    offsets: list[int] = []
+    for num, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (num, obj)
+    xref: int = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R /Info 4 0 R >>\n" % (len(objects) + 1)
+    out += b"startxref\n%d\n%%%%EOF\n" % xref
+    return out
+
+
+class PDFTest(unittest.TestCase):
+    """Tests for the PDF Extractor and its limits."""
+
+    tmpdir: tempfile.TemporaryDirectory
+    path: str
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable-msg=R1732
+        cls.path = os.path.join(cls.tmpdir.name, "pages.pdf")
+        with open(cls.path, "wb") as fh:
+            fh.write(_pdf("Five Pages", PAGES))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmpdir.cleanup()
+
+    def extract(self, ex: PDFExtractor) -> File:
+        """Run the Extractor on our document."""
+        f = File(self.path, {})
+        self.assertTrue(ex.process(f))
+        self.assertEqual(f.content_type, FileType.PDF)
+        self.assertEqual(f.meta["Title"], "Five Pages")
+        return f
+
+    def test_complete(self) -> None:
+        """Test extracting the whole document."""
+        f = self.extract(PDFExtractor())
+        self.assertNotIn("truncated", f.meta)
+        for text in PAGES:
+            self.assertIn(text, f.content)
+
+    def test_max_pages(self) -> None:
+        """Test that we stop after the maximum number of pages."""
+        f = self.extract(PDFExtractor(max_pages=2))
+        self.assertEqual(f.meta["truncated"], "pages")
+        for text in PAGES[:2]:
+            self.assertIn(text, f.content)
+        for text in PAGES[2:]:
+            self.assertNotIn(text, f.content)
+
+    def test_max_bytes(self) -> None:
+        """Test that the text is cut off at the maximum size."""
+        f = self.extract(PDFExtractor(max_bytes=40))
+        self.assertEqual(f.meta["truncated"], "bytes")
+        self.assertEqual(len(f.content.encode("utf-8")), 40)
+        self.assertTrue(f.content.startswith(PAGES[0]))
+        self.assertNotIn(PAGES[2], f.content)
+
+    def test_max_time(self) -> None:
+        """Test that we stop when we run out of time."""
+        f = self.extract(PDFExtractor(max_time=-1.0))
+        self.assertEqual(f.meta["truncated"], "time")
+        self.assertEqual(f.content, "")
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 06:59:03 krylon>
+#
+# /data/code/python/pythia/test_query.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.test_query
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import unittest
+from datetime import datetime
+
+from pythia.data import FileType
+from pythia.query import (And, Filter, Not, Or, Plan, QueryError, Term,
+                          parse)
+
+
+class QueryTest(unittest.TestCase):
+    """Tests for the query parser and compiler."""
+
+    def test_parse(self) -> None:
+        """Test parsing queries."""
+        cases = [
+            ("", None),
+            ("blue", Term(text="blue")),
+            ("kind*", Term(text="kind", prefix=True)),
+            ('"kind of blue"', Term(text="kind of blue")),
+            ("-draft", Not(node=Term(text="draft"))),
+            ("NOT draft", Not(node=Term(text="draft"))),
+            ("a b", And(nodes=[Term(text="a"), Term(text="b")])),
+            ("a AND b", And(nodes=[Term(text="a"), Term(text="b")])),
+            ("a OR b c", Or(nodes=[Term(text="a"),
+                                   And(nodes=[Term(text="b"), Term(text="c")])])),
+            ("(a OR b) c", And(nodes=[Or(nodes=[Term(text="a"), Term(text="b")]),
+                                      Term(text="c")])),
+            ("e-mail", Term(text="e-mail")),
+            ('artist:"Miles Davis"', Filter(key="artist", op="=", value="Miles Davis")),
+            ("modified:>=2024-01", Filter(key="modified", op=">=", value="2024-01")),
+            ("-type:pdf", Not(node=Filter(key="type", op="=", value="pdf"))),
+        ]
+        for text, expected in cases:
+            with self.subTest(query=text):
+                self.assertEqual(parse(text), expected)
+
+    def test_errors(self) -> None:
+        """Test that invalid queries are rejected."""
+        for text in ('"blue', "(a", "a)", "OR", "k*nd", "type:mp3",
+                     "modified:2024-13", "size:>1..2", "mime:>a", 'x ""'):
+            with self.subTest(query=text):
+                with self.assertRaises(QueryError):
+                    Plan(text)
+
+    def test_plan(self) -> None:
+        """Test that the full text index and the filters are separated, and
+        the filters are ordered by cost."""
+        plan = Plan('artist:"Miles Davis" kind* -draft mime:application/* type:pdf')
+        self.assertEqual(plan.match, '(("kind"*)) NOT ("draft")')
+        self.assertEqual([c[2] for c in plan.clauses],
+                         [[FileType.PDF.value],
+                          ["application/", "application0"],
+                          ['$."artist"', "Miles Davis"]])
+
+        plan = Plan("-draft modified:2024")
+        self.assertEqual(plan.match, "")
+        self.assertEqual(plan.clauses[0][2], [int(datetime(2024, 1, 1).timestamp()),
+                                              int(datetime(2025, 1, 1).timestamp())])
+        self.assertIn("NOT (f.id IN", plan.clauses[1][1])
+
+        plan = Plan('artist:"Miles Davis" album:kind*', {"artist": "meta_artist"})
+        self.assertEqual([c[1] for c in plan.clauses],
+                         ["f.meta_artist = ?", "json_extract(f.meta, ?) LIKE ? ESCAPE '\\'"])
+
+        plan = Plan("blue OR size:>1k")
+        self.assertEqual(plan.match, "")
+        self.assertEqual(plan.clauses[0][2], [1025, '"blue"'])
+
+    def test_cursor(self) -> None:
+        """Test that a cursor carries the position of a row."""
+        plan = Plan("blue")
+        cursor = plan.cursor((42, 1, "/a", 0, 0, 0, 0, 1, "text/plain", None, -1.5))
+        _, params = plan.sql(10, cursor)
+        self.assertEqual(params, ['("blue")', -1.5, 42, 10])
+        with self.assertRaises(QueryError):
+            Plan("type:pdf").sql(10, cursor)
+        with self.assertRaises(QueryError):
+            plan.sql(10, "garbage")
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:54:53 krylon>
+#
+# /data/code/python/pythia/test_text.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.test_text
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import tempfile
+import unittest
+
+from pythia.data import File
+from pythia.extractor import text
+from pythia.extractor.text import TextExtractor
+
+
+class TextTest(unittest.TestCase):
+    """Tests for the TextExtractor."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable-msg=R1732
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmpdir.cleanup()
+
+    def __extract(self, name: str, data: bytes, max_bytes: int = text.MAX_BYTES) -> File:
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "wb") as fh:
+            fh.write(data)
+        f = File(path, {})
+        self.assertTrue(TextExtractor(max_bytes).process(f))
+        return f
+
+    def test_looks_like_text(self) -> None:
+        """Test telling text from binary data."""
+        test_cases = (
+            (b"Hello, world!\n", True),
+            ("Grüße aus Köln\r\n".encode("utf-8"), True),
+            ("Grüße".encode("utf-16"), True),
+            (b"\x7fELF\x02\x01\x01\0\0\0", False),
+            (bytes(range(1, 32)) * 4, False),
+            (b"", True),
+        )
+
+        for c in test_cases:
+            self.assertEqual(text.looks_like_text(c[0]), c[1], c[0])
+
+    def test_encoding(self) -> None:
+        """Test decoding files in various encodings."""
+        test_cases = (
+            ("utf8.txt", "Grüße aus Köln".encode("utf-8"), "utf-8"),
+            ("bom.txt", "\ufeffGrüße aus Köln".encode("utf-8"), "utf-8-sig"),
+            ("utf16.txt", "Grüße aus Köln".encode("utf-16"), "utf-16"),
+            ("latin1.txt", "Grüße aus Köln".encode("cp1252"), "cp1252"),
+        )
+
+        for c in test_cases:
+            f = self.__extract(c[0], c[1])
+            self.assertEqual(f.meta["encoding"], c[2], c[0])
+            self.assertEqual(f.content, "Grüße aus Köln", c[0])
+
+    def test_chunks(self) -> None:
+        """Test that characters split between chunks survive, and that we stop
+        at the size limit."""
+        line = "Äpfel und Birnen\n"
+        data = (line * (2 * text.CHUNK_SIZE // len(line))).encode("utf-8")
+        f = self.__extract("chunks.txt", data)
+        self.assertEqual(f.content, data.decode("utf-8"))
+        self.assertNotIn("truncated", f.meta)
+
+        f = self.__extract("limit.txt", data, text.CHUNK_SIZE + 1)
+        self.assertEqual(f.meta["truncated"], "bytes")
+        self.assertTrue(data.decode("utf-8").startswith(f.content))
+        self.assertGreaterEqual(len(f.content.encode("utf-8")), text.CHUNK_SIZE)
+        self.assertLessEqual(len(f.content.encode("utf-8")), text.CHUNK_SIZE + 1)
+
+    def test_binary(self) -> None:
+        """Test that binary files are left alone."""
+        f = self.__extract("program", b"\x7fELF\x02\x01\x01\0" * 100)
+        self.assertEqual(f.content, "")
+        self.assertTrue(f.meta["binary"])
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
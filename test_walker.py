@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:53:55 krylon>
+#
+# /data/code/python/pythia/test_walker.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.test_walker
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import tempfile
+import time
+import unittest
+from threading import Lock, current_thread
+
+from pythia.data import Blacklist
+from pythia.walker import Entry, Walker
+
+
+class WalkerTest(unittest.TestCase):
+    """Tests for the Walker."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable-msg=R1732
+        cls.expected = set()
+        for i in range(5):
+            for j in range(4):
+                folder = os.path.join(cls.tmpdir.name, f"d{i}", f"e{j}")
+                os.makedirs(folder)
+                for k in range(3):
+                    path = os.path.join(folder, f"f{k}.txt")
+                    with open(path, "w", encoding="utf-8") as fh:
+                        fh.write("x" * k)
+                    cls.expected.add(path)
+        junk = os.path.join(cls.tmpdir.name, "d0", ".git")
+        os.makedirs(junk)
+        with open(os.path.join(junk, "HEAD"), "w", encoding="utf-8") as fh:
+            fh.write("ref: refs/heads/master\n")
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.tmpdir.cleanup()
+
+    def test_walk(self) -> None:
+        """Test that each file is visited exactly once, with its stat data,
+        no matter how many threads walk the tree."""
+        for threads in (1, 4):
+            lock = Lock()
+            seen: list[str] = []
+            folders: list[str] = []
+            finished: list[str] = []
+
+            def visit(folder: str, files: list[Entry]) -> None:
+                with lock:  # pylint: disable-msg=W0640
+                    folders.append(folder)  # pylint: disable-msg=W0640
+                    for entry, st in files:
+                        self.assertEqual(st.st_size, int(entry.name[1]))
+                        seen.append(entry.path)  # pylint: disable-msg=W0640
+
+            Walker(Blacklist("^[.]git$"), threads).walk(
+                self.tmpdir.name,
+                visit,
+                done=lambda: finished.append(current_thread().name))  # pylint: disable-msg=W0640
+            self.assertEqual(len(seen), len(self.expected))
+            self.assertEqual(set(seen), self.expected)
+            self.assertEqual(len(folders), 1 + 5 + 20)
+            # Only the helper threads clean up, the caller's thread lives on.
+            self.assertEqual(sorted(finished), [f"walker-{i}" for i in range(1, threads)])
+
+    def test_stop(self) -> None:
+        """Test that the walk stops when it is told to."""
+        folders: list[str] = []
+        Walker(Blacklist(), 4).walk(self.tmpdir.name,
+                                    lambda folder, _: folders.append(folder),
+                                    lambda: len(folders) < 3)
+        self.assertLess(len(folders), 26)
+
+    def test_resume(self) -> None:
+        """Test that resuming a walk from a checkpoint visits the
+        directories the walk had not finished."""
+        visited: list[str] = []
+        checkpoints: list[tuple[int, list[str]]] = []
+        w = Walker(Blacklist("^[.]git$"),
+                   1,
+                   lambda frontier: checkpoints.append((len(visited), frontier)),
+                   0)
+        w.walk(self.tmpdir.name, lambda folder, _: visited.append(folder))
+        self.assertEqual(len(visited), 26)
+        self.assertGreater(len(checkpoints), 0)
+
+        done, frontier = checkpoints[len(checkpoints) // 2]
+        resumed: list[str] = []
+        Walker(Blacklist("^[.]git$"), 4).walk(
+            self.tmpdir.name,
+            lambda folder, _: resumed.append(folder),
+            resume=frontier)
+        self.assertEqual(set(visited[:done]) | set(resumed), set(visited))
+        self.assertEqual(len(resumed), len(visited) - done)
+
+    def test_frontier(self) -> None:
+        """Test that a checkpoint taken while directories are being visited
+        does not hold a directory along with its subdirectories, which would
+        be walked twice on resume."""
+        checkpoints: list[list[str]] = []
+
+        def visit(_folder: str, _files: list[Entry]) -> None:
+            time.sleep(0.01)
+
+        Walker(Blacklist("^[.]git$"), 4, checkpoints.append, 0).walk(self.tmpdir.name, visit)
+        self.assertGreater(len(checkpoints), 0)
+        for frontier in checkpoints:
+            for d in frontier:
+                self.assertFalse(any(p.startswith(d + os.sep) for p in frontier),
+                                 f"{d} in the frontier along with its subdirectories")
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
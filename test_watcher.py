@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:53:10 krylon>
+#
+# /data/code/python/pythia/test_watcher.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.test_watcher
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import tempfile
+import time
+import unittest
+from typing import Callable, Optional
+from unittest import mock
+
+from pythia import common, database, watcher
+from pythia.crawler import Crawler
+
+# How long we wait for a change to show up in the database.
+TIMEOUT: float = 15.0
+
+
+def write(path: str, text: str) -> None:
+    """Create a file with the given text."""
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(text)
+
+
+@unittest.skipUnless(watcher.AVAILABLE, "inotify is not available")
+class WatcherTest(unittest.TestCase):
+    """Tests for the Watcher, on a real directory tree."""
+
+    tmpdir: tempfile.TemporaryDirectory
+    db: database.Database
+    root: str
+    outside: str
+    crawler: Crawler
+    watcher: watcher.Watcher
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.tmpdir = tempfile.TemporaryDirectory()  # pylint: disable-msg=R1732
+        common.set_basedir(os.path.join(cls.tmpdir.name, "base"))
+        cls.db = database.Database(common.path.db())
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.db.close()
+        cls.tmpdir.cleanup()
+
+    def setUp(self) -> None:
+        patch = mock.patch("pythia.watcher.SETTLE_TIME", 0.1)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        self.root = tempfile.mkdtemp(dir=self.tmpdir.name)
+        self.outside = tempfile.mkdtemp(dir=self.tmpdir.name)
+        for i in range(2):
+            os.mkdir(os.path.join(self.root, f"d{i}"))
+            for j in range(3):
+                write(os.path.join(self.root, f"d{i}", f"f{j}.txt"),
+                      f"Original file {j} in folder {i}\n")
+
+        self.crawler = Crawler(self.root, procs=1)
+        self.addCleanup(self.crawler.pool.close)
+        self.crawler.traverse()
+        self.crawler.wait()
+        self.watcher = watcher.Watcher(self.crawler)
+        self.watcher.start()
+        self.addCleanup(self.watcher.stop)
+        # Give the Watcher a moment to set up its watches.
+        self.wait_for(lambda: len(self.watcher.watches) == 3)
+
+    def wait_for(self, cond: Callable[[], bool]) -> None:
+        """Wait for cond to become true, fail if it does not in time."""
+        deadline: float = time.monotonic() + TIMEOUT
+        while not cond():
+            if time.monotonic() > deadline:
+                self.fail("Timed out waiting for the Watcher")
+            time.sleep(0.1)
+
+    def content(self, path: str) -> Optional[str]:
+        """Return the text of the File at path, or None if there is none."""
+        f = self.db.file_get_by_path(path)
+        return f.content if f is not None else None
+
+    def test_01_files(self) -> None:
+        """Test creating, modifying, and deleting files."""
+        new = os.path.join(self.root, "d0", "new.txt")
+        write(new, "Brand new\n")
+        self.wait_for(lambda: self.content(new) == "Brand new\n")
+
+        changed = os.path.join(self.root, "d0", "f0.txt")
+        write(changed, "Changed\n")
+        self.wait_for(lambda: self.content(changed) == "Changed\n")
+
+        gone = os.path.join(self.root, "d1", "f1.txt")
+        os.remove(gone)
+        self.wait_for(lambda: self.db.file_get_by_path(gone) is None)
+        self.assertIsNotNone(self.db.file_get_by_path(os.path.join(self.root, "d1", "f0.txt")))
+
+    def test_02_folders(self) -> None:
+        """Test moving directories into and out of a watched tree."""
+        src = os.path.join(self.outside, "incoming")
+        os.makedirs(os.path.join(src, "sub"))
+        write(os.path.join(src, "sub", "a.txt"), "Moved in\n")
+        dst = os.path.join(self.root, "incoming")
+        os.rename(src, dst)
+        moved_in = os.path.join(dst, "sub", "a.txt")
+        self.wait_for(lambda: self.content(moved_in) == "Moved in\n")
+
+        # The new directories are watched, too.
+        later = os.path.join(dst, "sub", "b.txt")
+        write(later, "Created later\n")
+        self.wait_for(lambda: self.content(later) == "Created later\n")
+
+        os.rename(os.path.join(self.root, "d1"), os.path.join(self.outside, "d1"))
+        self.wait_for(lambda: all(self.db.file_get_by_path(
+            os.path.join(self.root, "d1", f"f{j}.txt")) is None for j in range(3)))
+        self.assertIsNotNone(self.db.file_get_by_path(os.path.join(self.root, "d0", "f0.txt")))
+
+    def test_03_overflow(self) -> None:
+        """Test that lost events cause one rescan, not one per overflow."""
+        with mock.patch.object(Crawler, "traverse") as traverse, \
+             mock.patch.object(Crawler, "is_walking", return_value=True) as walking:
+            handle = self.watcher._Watcher__handle  # pylint: disable-msg=W0212
+            handle(-1, watcher.IN_Q_OVERFLOW, "")
+            handle(-1, watcher.IN_Q_OVERFLOW, "")
+            time.sleep(2 * watcher.POLL_INTERVAL)
+            traverse.assert_not_called()
+            walking.return_value = False
+            self.wait_for(lambda: traverse.call_count > 0)
+            time.sleep(2 * watcher.POLL_INTERVAL)
+            traverse.assert_called_once()
+
+    def test_04_stop(self) -> None:
+        """Test that changes noted before the Watcher is stopped are written
+        to the database."""
+        new = os.path.join(self.root, "d0", "last.txt")
+        with mock.patch("pythia.watcher.SETTLE_TIME", 60.0):
+            write(new, "Last minute\n")
+            self.wait_for(lambda: new in self.watcher.pending)
+            self.watcher.stop()
+        self.assertEqual(self.content(new), "Last minute\n")
+        self.assertFalse(self.crawler.writer.is_alive())
+
+    def test_05_unchanged(self) -> None:
+        """Test that a file that is written to without changing it is not
+        processed again."""
+        same = os.path.join(self.root, "d0", "f1.txt")
+        changed = os.path.join(self.root, "d0", "f2.txt")
+        with mock.patch.object(Crawler, "enqueue") as enqueue:
+            with open(same, "a", encoding="utf-8"):
+                pass
+            write(changed, "Changed, too\n")
+            self.wait_for(lambda: enqueue.call_count > 0)
+            time.sleep(2 * watcher.POLL_INTERVAL)
+        self.assertEqual([c.args[0].path for c in enqueue.call_args_list], [changed])
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
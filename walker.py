@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:53:55 krylon>
+#
+# /data/code/python/pythia/walker.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.walker
+
+(c) 2026 Benjamin Walkenhorst
+
+Walk a directory tree with several threads.
+
+Most of the time spent walking a tree is spent waiting for the file system,
+especially on network file systems, so several threads can walk a tree a lot
+faster than one, even with the GIL.
+"""
+
+import logging
+import os
+import time
+from collections import deque
+from threading import Condition, Thread
+from typing import Callable, Final, Optional, Sequence
+
+from pythia import common, metrics
+from pythia.data import Blacklist
+
+# The default number of threads per tree.
+WALK_THREADS: Final[int] = 4
+# How long an idle thread waits before it looks for work again, in seconds.
+IDLE_WAIT: Final[float] = 0.05
+# How often the Walker reports its frontier, in seconds.
+CHECKPOINT_INTERVAL: Final[float] = 60.0
+
+# A file found by the Walker, along with the result of stat(2).
+Entry = tuple[os.DirEntry, os.stat_result]
+# The Walker calls this for each directory, with the directory's path and
+# the regular files in it.
+Visitor = Callable[[str, list[Entry]], None]
+# The Walker periodically calls this with the directories that have not been
+# walked completely, so an interrupted walk can be resumed from there.
+CheckpointFn = Callable[[list[str]], None]
+
+
+class Walker:  # pylint: disable-msg=R0902
+    """Walker walks a directory tree using several threads.
+
+    Each thread has a queue of directories. It takes directories from the end
+    of its own queue, so it walks its part of the tree depth-first, which
+    keeps the queues short. When its queue is empty, it steals a directory from
+    the front of another thread's queue, which is one close to the root, so it
+    most likely gets a big chunk of work.
+
+    Files are stat'ed once, by the Walker, and handed to the visitor along with
+    their DirEntry, so nobody down the line has to do it again. Since the
+    visitor is called from all threads, it has to be thread-safe.
+
+    errors counts the directories that could not be read, so the caller can
+    tell if it has seen the whole tree.
+
+    If the Walker has a checkpoint function, it calls it every interval
+    seconds with the frontier of the walk: The directories waiting in the
+    queues, and those being processed right now. All other directories the
+    walk has come across are done, i.e. they have been visited, and their
+    subdirectories are in the frontier. A directory's subdirectories are only
+    queued once it is done, so the frontier never holds a directory along
+    with its subdirectories."""
+
+    __slots__ = [
+        "log",
+        "blacklist",
+        "threads",
+        "queues",
+        "current",
+        "cond",
+        "pending",
+        "errors",
+        "checkpoint",
+        "interval",
+        "last_checkpoint",
+        "entries",
+        "skipped",
+        "steals",
+    ]
+
+    log: logging.Logger
+    blacklist: Blacklist
+    threads: int
+    queues: list[deque[str]]
+    current: list[str]
+    cond: Condition
+    pending: int
+    errors: int
+    checkpoint: Optional[CheckpointFn]
+    interval: float
+    last_checkpoint: float
+    entries: metrics.MetricHandle
+    skipped: metrics.MetricHandle
+    steals: metrics.MetricHandle
+
+    def __init__(self,
+                 blacklist: Blacklist,
+                 threads: int = WALK_THREADS,
+                 checkpoint: Optional[CheckpointFn] = None,
+                 interval: float = CHECKPOINT_INTERVAL) -> None:
+        self.log = common.get_logger("walker")
+        self.blacklist = blacklist
+        self.threads = max(threads, 1)
+        self.queues = []
+        self.current = []
+        self.cond = Condition()
+        self.pending = 0
+        self.errors = 0
+        self.checkpoint = checkpoint
+        self.interval = interval
+        self.last_checkpoint = 0.0
+        self.entries = metrics.registry.counter("pythia_walk_entries_total",
+                                                "Directory entries looked at")
+        self.skipped = metrics.registry.counter(
+            "pythia_walk_blacklisted_total",
+            "Directory entries skipped because of the Blacklist")
+        self.steals = metrics.registry.counter("pythia_walk_steals_total",
+                                               "Directories taken from another thread's queue")
+
+    def walk(self,  # pylint: disable-msg=R0913
+             root: str,
+             visit: Visitor,
+             active: Callable[[], bool] = lambda: True,
+             resume: Sequence[str] = (),
+             done: Optional[Callable[[], None]] = None) -> None:
+        """Walk the tree below root, call visit for each directory.
+
+        The calling thread takes part in the walk. The walk stops early if
+        active returns False. To resume an interrupted walk, pass the frontier
+        from the last checkpoint as resume. If visit keeps per-thread state,
+        e.g. a database connection, done is called by each of the helper
+        threads before it finishes, so it can clean up."""
+        self.queues = [deque() for _ in range(self.threads)]
+        self.queues[0].extend(resume if len(resume) > 0 else (root, ))
+        self.current = [""] * self.threads
+        self.pending = len(self.queues[0])
+        self.errors = 0
+        self.last_checkpoint = time.monotonic()
+        helpers: list[Thread] = [Thread(target=self.__help,
+                                        args=(i, visit, active, done),
+                                        name=f"walker-{i}")
+                                 for i in range(1, self.threads)]
+        for t in helpers:
+            t.start()
+        try:
+            self.__run(0, visit, active)
+        finally:
+            for t in helpers:
+                t.join()
+
+    def __next(self, idx: int, active: Callable[[], bool]) -> str:
+        """Return the next directory for thread idx to process, or an empty
+        string if we are done."""
+        with self.cond:
+            while active():
+                folder: str = self.__take(idx)
+                if folder != "":
+                    self.current[idx] = folder
+                    return folder
+                if self.pending == 0:
+                    return ""
+                self.cond.wait(IDLE_WAIT)
+        return ""
+
+    def __take(self, idx: int) -> str:
+        """Take a directory from our own queue, or steal one from another
+        thread. The caller must hold the lock."""
+        own: deque[str] = self.queues[idx]
+        if len(own) > 0:
+            return own.pop()
+        for i in range(1, self.threads):
+            victim: deque[str] = self.queues[(idx + i) % self.threads]
+            if len(victim) > 0:
+                self.steals.inc()
+                return victim.popleft()
+        return ""
+
+    def __frontier(self) -> Optional[list[str]]:
+        """Return the frontier of the walk if a checkpoint is due. The caller
+        must hold the lock."""
+        if self.checkpoint is None or self.pending == 0:
+            return None
+        now: float = time.monotonic()
+        if now - self.last_checkpoint < self.interval:
+            return None
+        self.last_checkpoint = now
+        frontier: list[str] = [d for d in self.current if d != ""]
+        for q in self.queues:
+            frontier.extend(q)
+        return frontier
+
+    def __help(self,
+               idx: int,
+               visit: Visitor,
+               active: Callable[[], bool],
+               done: Optional[Callable[[], None]]) -> None:
+        try:
+            self.__run(idx, visit, active)
+        finally:
+            if done is not None:
+                done()
+
+    def __run(self, idx: int, visit: Visitor, active: Callable[[], bool]) -> None:
+        while (folder := self.__next(idx, active)) != "":
+            try:
+                self.__process(idx, folder, visit)
+            except Exception as err:  # pylint: disable-msg=W0718
+                self.log.error("Error walking %s: %s - %s",
+                               folder,
+                               err.__class__.__name__,
+                               err)
+                with self.cond:
+                    self.errors += 1
+            finally:
+                with self.cond:
+                    self.current[idx] = ""
+                    self.pending -= 1
+                    if self.pending == 0:
+                        self.cond.notify_all()
+                    frontier = self.__frontier()
+                if frontier is not None:
+                    assert self.checkpoint is not None
+                    self.checkpoint(frontier)
+
+    def __process(self, idx: int, folder: str, visit: Visitor) -> None:
+        """Read a directory, queue its subdirectories, and visit its files."""
+        dirs: list[str] = []
+        files: list[os.DirEntry] = []
+        seen: int = 0
+        skipped: int = 0
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    seen += 1
+                    if self.blacklist.match(entry.name):
+                        skipped += 1
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        files.append(entry)
+        except OSError as err:
+            self.log.error("Cannot read folder %s: %s", folder, err)
+            with self.cond:
+                self.errors += 1
+        self.entries.inc(seen)
+        self.skipped.inc(skipped)
+
+        # Looking at files in the order of their inode numbers comes close to
+        # the order they are stored on disk, which saves a lot of seeking on
+        # spinning disks.
+        files.sort(key=os.DirEntry.inode)
+        found: list[Entry] = []
+        for entry in files:
+            try:
+                found.append((entry, entry.stat(follow_symlinks=False)))
+            except OSError as err:
+                self.log.error("Cannot stat %s: %s", entry.path, err)
+        try:
+            visit(folder, found)
+        finally:
+            # The subdirectories are queued only once the directory has been
+            # visited. Until then, the directory is in the frontier, and its
+            # subdirectories must not be, or resuming from a checkpoint taken
+            # in the meantime would walk them twice.
+            if len(dirs) > 0:
+                # The subdirectories have to be counted before anyone can take
+                # them, or the walk might seem to be finished too early.
+                with self.cond:
+                    self.pending += len(dirs)
+                    self.queues[idx].extend(dirs)
+                    self.cond.notify(len(dirs))
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
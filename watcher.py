@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-18 07:53:10 krylon>
+#
+# /data/code/python/pythia/watcher.py
+# created on 18. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/agpl-3.0
+
+"""
+pythia.watcher
+
+(c) 2026 Benjamin Walkenhorst
+
+Use inotify to keep the index up to date while the file system changes,
+without walking the whole directory trees again.
+"""
+
+import ctypes
+import errno
+import logging
+import os
+import select
+import stat
+import struct
+import time
+from enum import Enum, auto
+from threading import Lock, Thread
+from typing import Final, Optional
+
+from pythia import common
+from pythia.crawler import Crawler, unchanged
+from pythia.data import File, Folder
+
+# Constants from <sys/inotify.h>
+IN_MODIFY: Final[int] = 0x00000002
+IN_CLOSE_WRITE: Final[int] = 0x00000008
+IN_MOVED_FROM: Final[int] = 0x00000040
+IN_MOVED_TO: Final[int] = 0x00000080
+IN_CREATE: Final[int] = 0x00000100
+IN_DELETE: Final[int] = 0x00000200
+IN_DELETE_SELF: Final[int] = 0x00000400
+IN_Q_OVERFLOW: Final[int] = 0x00004000
+IN_IGNORED: Final[int] = 0x00008000
+IN_ONLYDIR: Final[int] = 0x01000000
+IN_DONT_FOLLOW: Final[int] = 0x02000000
+IN_EXCL_UNLINK: Final[int] = 0x04000000
+IN_ISDIR: Final[int] = 0x40000000
+
+WATCH_MASK: Final[int] = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | \
+    IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK
+
+# struct inotify_event is followed by a NUL-padded name of len bytes.
+EVENT_HEADER: Final[struct.Struct] = struct.Struct("iIII")
+READ_SIZE: Final[int] = 64 * 1024
+
+# Events are collected per path until there were no new events for that path
+# for SETTLE_TIME seconds, but no longer than MAX_DELAY seconds. A file that
+# is being written to, e.g. a download, will cause lots of events, but we
+# want to process it only once.
+SETTLE_TIME: Final[float] = 1.0
+MAX_DELAY: Final[float] = 10.0
+# How long to wait for events at most, so we notice when we are told to stop.
+POLL_INTERVAL: Final[float] = 0.5
+
+# inotify is specific to Linux, on other systems the Watcher is not available.
+AVAILABLE: bool = True
+
+try:
+    _libc = ctypes.CDLL(None, use_errno=True)
+    _inotify_init1 = _libc.inotify_init1
+    _inotify_init1.argtypes = [ctypes.c_int]
+    _inotify_init1.restype = ctypes.c_int
+    _inotify_add_watch = _libc.inotify_add_watch
+    _inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    _inotify_add_watch.restype = ctypes.c_int
+except AttributeError:
+    AVAILABLE = False
+
+
+class Change(Enum):
+    """Change identifies what happened to a path."""
+    Modified = auto()
+    Deleted = auto()
+    FolderDeleted = auto()
+
+
+class Watcher:  # pylint: disable-msg=R0902
+    """Watcher watches the Crawler's directory trees for changes and feeds
+    the affected files to the Crawler's pipeline."""
+
+    __slots__ = [
+        "log",
+        "crawler",
+        "fd",
+        "watches",
+        "pending",
+        "lock",
+        "active",
+        "rescan",
+        "thread",
+    ]
+
+    log: logging.Logger
+    crawler: Crawler
+    fd: int
+    watches: dict[int, tuple[str, Folder]]
+    pending: dict[str, tuple[Change, Folder, float, float]]
+    lock: Lock
+    active: bool
+    rescan: bool
+    thread: Optional[Thread]
+
+    def __init__(self, crawler: Crawler) -> None:
+        if not AVAILABLE:
+            raise OSError(errno.ENOSYS, "inotify is not available on this system")
+        self.log = common.get_logger("watcher")
+        self.crawler = crawler
+        self.fd = -1
+        self.watches = {}
+        self.pending = {}
+        self.lock = Lock()
+        self.active = False
+        self.rescan = False
+        self.thread = None
+
+    def is_active(self) -> bool:
+        """Returns the Watcher's active flag."""
+        with self.lock:
+            return self.active
+
+    def start(self) -> None:
+        """Start watching in a separate thread."""
+        with self.lock:
+            self.active = True
+            self.thread = Thread(target=self.run, name="watcher")
+            self.thread.start()
+
+    def stop(self) -> None:
+        """Tell the Watcher to stop, and wait for it to finish."""
+        with self.lock:
+            self.active = False
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self) -> None:
+        """Watch the directory trees until stop() is called."""
+        with self.lock:
+            self.active = True
+        self.fd = _inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+
+        try:
+            self.crawler.start()
+            pool = self.crawler.pool
+            for tree in self.crawler.folders:
+                folder = pool.reader().folder_get_by_path(tree)
+                if folder is None:
+                    folder = Folder(path=tree)
+                    with pool.writer() as db:
+                        db.folder_add(folder)
+                self.__watch_tree(tree, folder, False)
+            self.log.info("Watching %d directories", len(self.watches))
+
+            poller = select.poll()
+            poller.register(self.fd, select.POLLIN)
+            while self.is_active():
+                timeout: float = POLL_INTERVAL
+                if len(self.pending) > 0:
+                    timeout = min(timeout, SETTLE_TIME)
+                if len(poller.poll(timeout * 1000)) > 0:
+                    self.__read_events()
+                self.__flush(False)
+                self.__rescan()
+            self.__flush(True)
+        finally:
+            os.close(self.fd)
+            self.fd = -1
+            self.watches.clear()
+            self.crawler.pool.release()
+            # Files we just handed to the Crawler still have to be written.
+            self.crawler.drain()
+
+    def __rescan(self) -> None:
+        """Walk the directory trees again if we lost events, unless a walk is
+        still in progress. In that case, we try again once it is finished,
+        so any number of overflows cause one walk at a time."""
+        if self.rescan and not self.crawler.is_walking():
+            self.rescan = False
+            self.log.warning("Rescan the directory trees after lost events")
+            self.crawler.traverse()
+
+    def __watch_tree(self, tree: str, folder: Folder, scan: bool) -> None:
+        """Add watches for a directory and all its subdirectories.
+
+        If scan is True, the directory just appeared, so the files in it are
+        noted as modified."""
+        stack: list[str] = [tree]
+        while len(stack) > 0:
+            path = stack.pop()
+            if not self.__add_watch(path, folder):
+                continue
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if self.crawler.blacklist.match(entry.name):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif scan and entry.is_file(follow_symlinks=False):
+                            self.__note(entry.path, Change.Modified, folder)
+            except OSError as err:
+                self.log.error("Cannot read folder %s: %s", path, err)
+
+    def __add_watch(self, path: str, folder: Folder) -> bool:
+        """Add a watch for a single directory."""
+        wd: int = _inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                self.log.error("Cannot watch %s: Limit of inotify watches reached, " +
+                               "consider raising fs.inotify.max_user_watches",
+                               path)
+            else:
+                self.log.error("Cannot watch %s: %s", path, os.strerror(err))
+            return False
+        # If a directory is moved, we get the same watch descriptor again,
+        # but we need to update its path.
+        self.watches[wd] = (path, folder)
+        return True
+
+    def __read_events(self) -> None:
+        """Read all pending events from the inotify file descriptor."""
+        while True:
+            try:
+                data: bytes = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                return
+            offset: int = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset+length].rstrip(b"\0"))
+                offset += length
+                self.__handle(wd, mask, name)
+
+    def __handle(self, wd: int, mask: int, name: str) -> None:
+        """Process a single inotify event."""
+        if mask & IN_Q_OVERFLOW:
+            # We lost events, so we have to look at everything again. Thanks
+            # to the stat data in the database, this is relatively cheap.
+            self.log.warning("inotify event queue overflowed")
+            self.rescan = True
+            return
+        if mask & IN_IGNORED:
+            self.watches.pop(wd, None)
+            return
+        if name == "" or wd not in self.watches:
+            return
+        if self.crawler.blacklist.match(name):
+            return
+
+        folder_path, folder = self.watches[wd]
+        path: str = os.path.join(folder_path, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self.__watch_tree(path, folder, True)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self.__note(path, Change.FolderDeleted, folder)
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+            self.__note(path, Change.Deleted, folder)
+        else:
+            self.__note(path, Change.Modified, folder)
+
+    def __note(self, path: str, change: Change, folder: Folder) -> None:
+        """Remember a change to a path. The last change wins."""
+        now: float = time.monotonic()
+        first: float = now
+        if path in self.pending:
+            first = self.pending[path][2]
+        self.pending[path] = (change, folder, first, now)
+
+    def __flush(self, force: bool) -> None:
+        """Process the changes that have settled."""
+        pool = self.crawler.pool
+        now: float = time.monotonic()
+        deleted: list[str] = []
+        folders: list[str] = []
+        modified: list[tuple[str, Folder]] = []
+
+        for path, (change, folder, first, last) in self.pending.items():
+            if not (force or now - last >= SETTLE_TIME or now - first >= MAX_DELAY):
+                continue
+            match change:
+                case Change.Modified:
+                    modified.append((path, folder))
+                case Change.Deleted:
+                    deleted.append(path)
+                case Change.FolderDeleted:
+                    folders.append(path)
+
+        if len(deleted) + len(folders) + len(modified) == 0:
+            return
+        for path in deleted + folders:
+            del self.pending[path]
+        for path, _ in modified:
+            del self.pending[path]
+
+        if len(deleted) > 0 or len(folders) > 0:
+            self.log.debug("Remove %d files and %d folders from the index",
+                           len(deleted),
+                           len(folders))
+            with pool.writer() as db:
+                db.file_delete_by_path(deleted)
+                for path in folders:
+                    db.file_delete_by_prefix(path)
+                blobs: int = db.blob_purge()
+            self.log.debug("Removed %d unused blobs", blobs)
+
+        if len(modified) > 0:
+            # Opening a file for writing and closing it again, or touching
+            # it, causes events, too, but there is no point in extracting the
+            # same content again.
+            known: dict[str, tuple[int, int, int]] = \
+                pool.reader().file_get_stat_by_paths(p for p, _ in modified)
+            for path, folder in modified:
+                try:
+                    st = os.stat(path, follow_symlinks=False)
+                except OSError:
+                    # It's gone again, we will get an event for that.
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                prev = known.get(path)
+                if unchanged(st, prev):
+                    self.crawler.stats.unchanged.inc()
+                    continue
+                f = File(path, {"folder_id": folder.fid})
+                f.set_stat(st)
+                f.fid = prev[0] if prev is not None else 0
+                self.crawler.enqueue(f)
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #